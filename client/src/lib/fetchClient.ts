@@ -1,9 +1,12 @@
-const BASE_URL = 'http://localhost:5000'; // Allow dynamic base URL from environment variables
+import { WIRE_MIME, decodeState } from './wire';
+
+export const BASE_URL = 'http://localhost:5000'; // Allow dynamic base URL from environment variables
 
 interface FetchClientOptions {
   method?: string;
   headers?: Record<string, string>;
-  body?: Record<string, unknown>;
+  body?: Record<string, unknown> | Uint8Array;
+  binary?: boolean;
 }
 
 /**
@@ -11,19 +14,23 @@ interface FetchClientOptions {
  *
  * @param {string} endpoint - The API endpoint.
  * @param {FetchClientOptions} options - Optional configuration for the request (e.g., method, headers, body).
- * @returns {Promise<any>} The parsed JSON response.
+ *   With `binary`, the game state is requested in the compact wire encoding and a
+ *   Uint8Array body is sent as is.
+ * @returns {Promise<any>} The parsed JSON (or decoded binary) response.
  */
 export async function fetchClient(endpoint: string, options: FetchClientOptions = {}): Promise<any> {
-  const { method = 'GET', headers = {}, body } = options;
+  const { method = 'GET', headers = {}, body, binary = false } = options;
+  const rawBody = body instanceof Uint8Array;
 
   // Default headers, extendable by passing custom headers.
   const config: RequestInit = {
     method,
     headers: {
-      'Content-Type': 'application/json',
+      'Content-Type': rawBody ? WIRE_MIME : 'application/json',
+      ...(binary && { Accept: WIRE_MIME }),
       ...headers,
     },
-    ...(body && { body: JSON.stringify(body) }),
+    ...(body && { body: rawBody ? body : JSON.stringify(body) }),
   };
 
   try {
@@ -37,6 +44,10 @@ export async function fetchClient(endpoint: string, options: FetchClientOptions
       );
     }
 
+    if (response.headers.get('Content-Type')?.startsWith(WIRE_MIME)) {
+      return decodeState(await response.arrayBuffer());
+    }
+
     // If response is JSON, return the parsed object
     return await response.json();
   } catch (error: unknown) {
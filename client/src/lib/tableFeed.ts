@@ -0,0 +1,111 @@
+import { io, type Socket } from 'socket.io-client';
+import { BASE_URL } from './fetchClient';
+
+type Path = (string | number)[];
+
+/**
+ * Ops sent by the server, applied in order:
+ * ["set", path, value], ["del", path] and ["push", path, values].
+ */
+type Op = ['set', Path, unknown] | ['del', Path] | ['push', Path, unknown[]];
+
+type Delta = {
+  table_id: string;
+  epoch: string;
+  base: number;
+  version: number;
+  ops: Op[];
+};
+
+type Snapshot = {
+  table_id: string;
+  epoch: string;
+  version: number;
+  state: Record<string, any>;
+};
+
+/**
+ * Applies a list of delta ops to a (normalized) table state in place.
+ */
+export function applyOps(state: Record<string, any>, ops: Op[]) {
+  for (const op of ops) {
+    const path = op[1];
+    let target = state;
+    for (const key of path.slice(0, -1)) {
+      target = target[key];
+    }
+    const last = path[path.length - 1];
+
+    if (op[0] === 'set') {
+      target[last] = op[2];
+    } else if (op[0] === 'del') {
+      delete target[last];
+    } else {
+      target[last].push(...op[2]);
+    }
+  }
+}
+
+/**
+ * The server keys players by seat; turn them back into the seat ordered list
+ * the rest of the client uses.
+ */
+function denormalize(state: Record<string, any>) {
+  return {
+    ...state,
+    players: state.order.map((seat: string) => state.players[seat]),
+  };
+}
+
+/**
+ * Subscribes to a table's state. A full snapshot is only requested on (re)connect,
+ * after that the server pushes versioned deltas. If a delta doesn't start at the
+ * version we have, we ask the server to catch us up from that version. Versions
+ * only compare within an epoch: a table that was recreated or recovered has a
+ * new one, and we start over from a snapshot.
+ *
+ * @param {string} tableId - The table to watch.
+ * @param {(state: any) => void} onState - Called with the full state after every change.
+ * @returns {Socket} The socket, call `disconnect()` to stop.
+ */
+export function watchTable(tableId: string, onState: (state: any) => void): Socket {
+  const socket = io(BASE_URL);
+  let state: Record<string, any> | null = null;
+  let version: number | null = null;
+  let epoch: string | null = null;
+
+  socket.on('connect', () => {
+    version = null;
+    socket.emit('sync', { table_id: tableId, version });
+  });
+
+  socket.on('snapshot', (snapshot: Snapshot) => {
+    state = snapshot.state;
+    epoch = snapshot.epoch;
+    version = snapshot.version;
+    onState(denormalize(state));
+  });
+
+  socket.on('delta', (delta: Delta) => {
+    if (state === null || version === null) {
+      return;
+    }
+    if (delta.epoch !== epoch) {
+      socket.emit('sync', { table_id: tableId, version: null });
+      return;
+    }
+    if (delta.version <= version) {
+      return;
+    }
+    if (delta.base !== version) {
+      socket.emit('sync', { table_id: tableId, version, epoch });
+      return;
+    }
+
+    applyOps(state, delta.ops);
+    version = delta.version;
+    onState(denormalize(state));
+  });
+
+  return socket;
+}
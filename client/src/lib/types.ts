@@ -27,6 +27,7 @@ type Action = {
 type GameTurn = {
     player: Player;
     actions: Action[];
+    preflopEquity?: number;
 }
 
 type Winner = {
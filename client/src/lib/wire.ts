@@ -0,0 +1,175 @@
+import type { Action, Card, Player } from './types';
+
+/**
+ * Binary counterpart of the JSON game state, see pokedex/src/wire.py for the layout.
+ * Requested with `Accept: application/x-poker`.
+ */
+export const WIRE_MIME = 'application/x-poker';
+const WIRE_VERSION = 1;
+
+const HAS_WINNER = 1;
+const HAS_EQUITY = 2;
+const NO_FRACTION = 0xffff;
+const FRACTION_SCALE = 0xfffe;
+
+const STAGES = ['PREFLOP', 'FLOP', 'TURN', 'RIVER', 'ROUND_OVER'];
+const ACTION_TYPES = ['FOLD', 'CALL', 'RAISE', 'CHECK', 'BET', 'SMALL_BLIND', 'BIG_BLIND'];
+
+// byte = rank * 4 + suit, same order as the server's table
+const BYTE_TO_CARD: Card[] = [];
+for (const rank of '23456789TJQKA') {
+  for (const suit of 'shdc') {
+    BYTE_TO_CARD.push(rank + suit);
+  }
+}
+
+class Reader {
+  private pos = 0;
+  private text = new TextDecoder();
+
+  constructor(private data: Uint8Array) {}
+
+  u8(): number {
+    return this.data[this.pos++];
+  }
+
+  varint(): number {
+    let value = 0;
+    let scale = 1;
+    for (;;) {
+      const byte = this.u8();
+      value += (byte & 0x7f) * scale;
+      if (byte < 0x80) {
+        return value;
+      }
+      scale *= 128;
+    }
+  }
+
+  str(): string {
+    const length = this.varint();
+    const value = this.text.decode(this.data.subarray(this.pos, this.pos + length));
+    this.pos += length;
+    return value;
+  }
+
+  cards(): Card[] {
+    const count = this.u8();
+    const cards = Array.from(this.data.subarray(this.pos, this.pos + count), (byte) => BYTE_TO_CARD[byte]);
+    this.pos += count;
+    return cards;
+  }
+
+  fraction(): number | undefined {
+    const value = this.data[this.pos] | (this.data[this.pos + 1] << 8);
+    this.pos += 2;
+    return value === NO_FRACTION ? undefined : value / FRACTION_SCALE;
+  }
+
+  action(): Action {
+    const flags = this.u8();
+    return {
+      type: ACTION_TYPES[flags & 0x7],
+      amount: flags & 0x10 ? this.varint() : undefined,
+      amountToCall: flags & 0x20 ? this.varint() : undefined,
+      allIn: Boolean(flags & 0x08),
+    };
+  }
+
+  player(): Player {
+    const player: Player = { name: this.str(), stack: this.varint(), hand: this.cards() };
+    if (this.u8()) {
+      player.action = this.action();
+    }
+    return player;
+  }
+}
+
+/**
+ * Decodes a binary state into the same shape as the JSON responses.
+ *
+ * @param {ArrayBuffer} buffer - The response body.
+ * @returns {any} The game state.
+ */
+export function decodeState(buffer: ArrayBuffer): any {
+  const reader = new Reader(new Uint8Array(buffer));
+  if (reader.u8() !== WIRE_VERSION) {
+    throw new Error('Unsupported wire version');
+  }
+
+  const state: any = { stage: STAGES[reader.u8()], pot: { amount: reader.varint() } };
+  state.community_cards = reader.cards();
+  const tableId = reader.str();
+  if (tableId) {
+    state.table_id = tableId;
+  }
+
+  const playerCount = reader.varint();
+  state.players = Array.from({ length: playerCount }, () => reader.player());
+
+  const turnPlayer = { name: reader.str(), stack: reader.varint(), hand: reader.cards() };
+  const actionCount = reader.varint();
+  state.turn = {
+    player: turnPlayer,
+    actions: Array.from({ length: actionCount }, () => reader.action()),
+  };
+  const preflopEquity = reader.fraction();
+  if (preflopEquity !== undefined) {
+    state.turn.preflopEquity = preflopEquity;
+  }
+
+  const flags = reader.u8();
+  if (flags & HAS_WINNER) {
+    const winnerCount = reader.varint();
+    const players = Array.from({ length: winnerCount }, () => reader.player());
+    const hand = reader.cards();
+    state.winner = { players, hand, rank: reader.str() || undefined };
+  }
+  if (flags & HAS_EQUITY) {
+    const count = reader.varint();
+    const players = Array.from({ length: count }, () => ({
+      name: reader.str(),
+      win: reader.fraction(),
+      tie: reader.fraction(),
+      equity: reader.fraction(),
+    }));
+    state.equity = { players, trials: reader.varint(), margin: reader.fraction() };
+  }
+
+  return state;
+}
+
+function writeVarint(out: number[], value: number) {
+  while (value >= 0x80) {
+    out.push((value % 128) | 0x80);
+    value = Math.floor(value / 128);
+  }
+  out.push(value);
+}
+
+function writeStr(out: number[], value: string) {
+  const bytes = new TextEncoder().encode(value);
+  writeVarint(out, bytes.length);
+  out.push(...bytes);
+}
+
+/**
+ * Encodes a /next_turn request body: table id, player name and the action.
+ */
+export function encodeTurnRequest(tableId: string, playerName: string, action: Action): Uint8Array {
+  const out: number[] = [];
+  writeStr(out, tableId);
+  writeStr(out, playerName);
+
+  const hasAmount = action.amount !== undefined && action.amount !== null;
+  const hasToCall = action.amountToCall !== undefined && action.amountToCall !== null;
+  out.push(ACTION_TYPES.indexOf(action.type.toUpperCase()) | (action.allIn ? 0x08 : 0) | (hasAmount ? 0x10 : 0) | (hasToCall ? 0x20 : 0));
+  if (hasAmount) {
+    writeVarint(out, action.amount!);
+  }
+  if (hasToCall) {
+    writeVarint(out, action.amountToCall!);
+  }
+
+  return new Uint8Array(out);
+}
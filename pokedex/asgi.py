@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import socketio
+
+from src.player import Action
+from src.history import HandHistoryWriter
+from src.store import TableStore
+from src.service import TableService, NoRound, DEFAULT_TABLE
+from src.tables import TableRegistry, TableExists, TableNotFound
+from src import wire
+
+# ASGI entry point with the same /start_game, /next_round and /next_turn
+# operations as server.py. Idle sockets cost a coroutine, not a thread; table
+# operations run on a small thread pool so they never block the event loop.
+#
+#   uvicorn asgi:app --port 5000
+
+ORIGINS = ["http://localhost:5173"]
+
+# set STATE_DB to a SQLite file to keep every table and hand result there and restore them on restart
+store = TableStore(os.environ["STATE_DB"]) if os.environ.get("STATE_DB") else None
+# set TABLE_JOURNAL to a directory to journal every table there and recover them on restart
+registry = TableRegistry(journal_dir=os.environ.get("TABLE_JOURNAL"), store=store)
+executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="table")
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins=ORIGINS)
+loop = None
+
+
+def push_delta(table_id, delta):
+    # called from a table thread, the emit itself happens on the event loop
+    asyncio.run_coroutine_threadsafe(sio.emit("delta", delta, to=table_id), loop)
+
+
+# set HAND_HISTORY to a file path to append every finished hand to it
+history = HandHistoryWriter(os.environ["HAND_HISTORY"]) if os.environ.get("HAND_HISTORY") else None
+
+def watched(table_id):
+    # anyone in the table's room, tables nobody watches skip building deltas
+    return bool(sio.manager.rooms.get("/", {}).get(table_id))
+
+
+service = TableService(registry, on_delta=push_delta, history=history, watched=watched)
+
+
+async def run(fn, *args):
+    # every table operation comes through here, so push_delta has the loop
+    # whether or not the server sent lifespan events
+    global loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_response(send, status, body, content_type="application/json", origin=None):
+    headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    if origin in ORIGINS:
+        headers += [
+            (b"access-control-allow-origin", origin.encode()),
+            (b"access-control-allow-headers", b"content-type, accept"),
+            (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+        ]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def missing_field(data):
+    # the first field a JSON /next_turn body lacks, None if it has them all
+    for field in ("player_name", "action"):
+        if field not in data:
+            return field
+    for field in ("type", "amount", "amountToCall"):
+        if field not in data["action"]:
+            return f"action.{field}"
+    return None
+
+
+async def http_app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if store is not None:
+                    registry.restore()
+                    store.start()
+                # journals are never behind the store, they win for tables in both
+                if registry.journal_dir:
+                    registry.recover()
+                registry.start_evictor()
+                if history is not None:
+                    history.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                executor.shutdown(wait=False)
+                if history is not None:
+                    history.close()
+                if store is not None:
+                    store.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "websocket":
+        # only socket.io's path takes websockets, closing before the accept makes the server answer 403
+        await receive()
+        await send({"type": "websocket.close", "code": 1008})
+        return
+
+    headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+    origin = headers.get("origin")
+    path, method = scope["path"].rstrip("/"), scope["method"]
+    query = {key: values[0] for key, values in parse_qs(scope["query_string"].decode()).items()}
+    body = await read_body(receive)
+    binary = wire.MIME in headers.get("accept", "")
+
+    if method == "OPTIONS":
+        await send_response(send, 204, b"", origin=origin)
+        return
+
+    try:
+        if path == "/start_game" and method == "GET":
+            replace = query.get("replace", "").lower() in ("1", "true")
+            result = await run(service.start_game, query.get("table_id"), binary, replace)
+        elif path == "/next_round" and method == "POST":
+            data = json.loads(body) if body else {}
+            result = await run(service.next_round, data.get("table_id") or query.get("table_id"), binary)
+        elif path == "/store" and method == "GET" and store is not None:
+            result = (store.lag(), None)
+        elif path == "/next_turn" and method == "POST":
+            if headers.get("content-type", "").startswith(wire.MIME):
+                table_id, player_name, action = wire.decode_turn_request(body)
+            else:
+                data = json.loads(body)
+                missing = missing_field(data)
+                if missing is not None:
+                    await send_response(send, 400, json.dumps({"error": f"Missing {missing}"}).encode(), origin=origin)
+                    return
+                table_id = data.get("table_id") or query.get("table_id") or DEFAULT_TABLE
+                player_name = data["player_name"]
+                action = Action.dict_to_action(data["action"])
+            result = await run(service.next_turn, table_id, action, player_name, binary)
+        else:
+            await send_response(send, 404, json.dumps({"error": "Not found"}).encode(), origin=origin)
+            return
+    except TableNotFound as e:
+        await send_response(send, 404, json.dumps({"error": f"Table {e.args[0]} not found"}).encode(), origin=origin)
+        return
+    except (NoRound, TableExists) as e:
+        await send_response(send, 409, json.dumps({"error": str(e)}).encode(), origin=origin)
+        return
+    except ValueError as e:
+        await send_response(send, 400, json.dumps({"error": str(e)}).encode(), origin=origin)
+        return
+
+    game_state, encoded = result
+    if encoded is not None:
+        await send_response(send, 200, encoded, wire.MIME, origin)
+    else:
+        await send_response(send, 200, json.dumps(game_state).encode(), origin=origin)
+
+
+@sio.on("sync")
+async def sync(sid, data):
+    # same protocol as server.py: snapshot on (re)connect, deltas after that
+    table_id = data.get("table_id") or DEFAULT_TABLE
+    # in the room before the snapshot is taken, so no delta falls between the two
+    await sio.enter_room(sid, table_id)
+    try:
+        event, payload = await run(service.sync, table_id, data.get("version"), data.get("epoch"))
+    except TableNotFound:
+        await sio.leave_room(sid, table_id)
+        await sio.emit("error", {"error": f"Table {table_id} not found"}, to=sid)
+        return
+
+    await sio.emit(event, payload, to=sid)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=http_app)
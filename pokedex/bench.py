@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from src.deck import Deck
+from src.hand import HandEvaluator, hand_cache
+from src.player import Player
+from src.pot import Pot
+from src.simulate import six_max, passive_strategy
+from src import wire
+
+# Micro benchmarks for the hot paths. Every metric is seconds per call, the
+# best of `repeat` runs of `number` calls, so a busy machine can only make a
+# run look slower, never faster.
+#
+#   python bench.py                          print the metrics
+#   python bench.py save [baseline]          write them to a baseline (data/bench.json)
+#   python bench.py compare [baseline] [threshold]
+#                                            exit 1 if any metric is more than threshold
+#                                            (default 0.25, i.e. 25%) slower than the baseline
+#
+# Baselines are only comparable on the machine they were recorded on.
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench.json")
+THRESHOLD = 0.25
+
+
+def measure(fn, number, repeat=7, setup=None):
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        seconds = (time.perf_counter() - start) / number
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def bench_evaluator(results):
+    # distinct seven card hands: cold runs score every hand, warm runs are all cache hits
+    evaluator = HandEvaluator()
+    hands = []
+    for seed in range(2000):
+        cards = Deck(seed).draw(7)
+        hands.append((cards[:2], cards[2:]))
+    it = iter(())
+
+    def evaluate():
+        nonlocal it
+        hand, board = next(it)
+        evaluator.best_hand_rank_eval(hand, board)
+
+    def cold():
+        nonlocal it
+        hand_cache.clear()
+        it = iter(hands)
+
+    def warm():
+        nonlocal it
+        it = iter(hands)
+
+    results["best_hand_rank_eval"] = measure(evaluate, len(hands), setup=cold)
+    results["best_hand_rank_eval_cached"] = measure(evaluate, len(hands), setup=warm)
+
+
+def bench_split_pot(results):
+    # nine players, eight of them all-in for different amounts
+    players = [Player(f"Player {i}", 100 * (i + 1)) for i in range(9)]
+    pot = Pot(20)
+    for player in players:
+        amount = player.stack
+        player.make_bet(amount)
+        pot.add(player, amount)
+        if player is not players[-1]:
+            player.rp.all_in = True
+            pot.all_in(player)
+    players[0].fold()
+
+    results["split_pot"] = measure(lambda: pot.split_pot(final=True), 20_000)
+    results["final_pots"] = measure(pot.final_pots, 20_000)
+
+
+def bench_round(results):
+    # new_round, deal, blinds, actions and distribute_winnings at a six handed table
+    simulator = six_max(seed=0)
+    results["round_lifecycle"] = measure(simulator.play_hand, 500, setup=hand_cache.clear)
+    simulator = six_max([passive_strategy] * 6, seed=0)
+    results["round_lifecycle_showdown"] = measure(simulator.play_hand, 500, setup=hand_cache.clear)
+
+
+def bench_server(results):
+    # the Flask endpoints through its test client, one hand per call played
+    # with passive actions; the server's tables print as they play
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+
+        client = server.app.test_client()
+        client.get("/start_game")
+        table = server.service.find_table(None)
+        rng = random.Random(0)
+
+        def play(binary):
+            headers = {"Accept": wire.MIME} if binary else {}
+            table.poker.set_stacks(1000)
+            client.post("/next_round", json={}, headers=headers)
+            round = table.poker.round
+            while not round.betting_round_over():
+                player, actions = round.get_current_player_and_actions()
+                action = passive_strategy(round, player, actions)
+                if binary:
+                    client.post("/next_turn", data=wire.encode_turn_request(None, player.name, action),
+                                content_type=wire.MIME, headers=headers)
+                else:
+                    client.post("/next_turn", json={"player_name": player.name, "action": action.to_dict()})
+
+        results["server_start_game"] = measure(lambda: client.get("/start_game"), 200)
+        # start_game replaced the table
+        table = server.service.find_table(None)
+        results["server_hand_json"] = measure(lambda: play(False), 20)
+        results["server_hand_binary"] = measure(lambda: play(True), 20)
+        results["server_preflop"] = measure(lambda: client.get(f"/preflop/{rng.randint(1, 5)}"), 200)
+
+
+def run():
+    results = {}
+    for bench in (bench_evaluator, bench_split_pot, bench_round, bench_server):
+        bench(results)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    # (name, baseline, current, ratio, regressed) for every metric in both
+    rows = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        rows.append((name, baseline[name], seconds, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_results(results):
+    for name, seconds in results.items():
+        print(f"{name:28} {seconds * 1e6:12.2f} us")
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    path = sys.argv[2] if len(sys.argv) > 2 else BASELINE
+    results = run()
+
+    if mode == "save":
+        with open(path, "w") as file:
+            json.dump(results, file, indent=2)
+        print_results(results)
+        print(f"saved {path}")
+    elif mode == "compare":
+        threshold = float(sys.argv[3]) if len(sys.argv) > 3 else THRESHOLD
+        with open(path) as file:
+            baseline = json.load(file)
+
+        rows = compare(results, baseline, threshold)
+        for name, before, after, ratio, regressed in rows:
+            print(f"{name:28} {before * 1e6:12.2f} us {after * 1e6:12.2f} us {ratio:6.2f}x"
+                  + ("  REGRESSED" if regressed else ""))
+        for name in baseline.keys() - results.keys():
+            print(f"{name:28} missing")
+
+        if any(row[4] for row in rows):
+            sys.exit(1)
+    else:
+        print_results(results)
@@ -0,0 +1,217 @@
+import contextlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from src.histogram import LatencyHistogram
+
+# Load generator: every table is played by its seated virtual players, who
+# start a game, deal hands and act in turn with a random legal action from the
+# `turn.actions` of the last response, waiting a think time before each
+# action. One thread drives each table, so the server sees as many concurrent
+# requests as there are tables.
+#
+#   python loadtest.py [tables] [seconds] [think] [url]
+#
+# think: 0, constant:0.1, uniform:0.05,0.5, exp:0.2 (mean) or lognormal:mu,sigma
+# url:   a running server, e.g. http://localhost:5000; by default the Flask app
+#        runs in this process through its test client. The in-process mode
+#        shares one GIL between the client threads and the server, so with
+#        many tables its tail latencies measure the generator as much as the
+#        server; point it at a url for server numbers.
+
+BIG_BLIND = 20
+
+
+def think_time(spec):
+    # a function of a random.Random that returns seconds to wait
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",")] if args else []
+    if kind in ("0", "none"):
+        return lambda rng: 0.0
+    if kind == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(*values)
+    raise ValueError(f"Invalid think time {spec}")
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, url, timeout=10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class VirtualTable:
+    table_id: str
+    latencies: dict[str, LatencyHistogram]
+    errors: dict[str, int]
+    hands: int
+
+    def __init__(self, client, table_id, think, seed):
+        self.client = client
+        self.table_id = table_id
+        self.think = think
+        self.rng = random.Random(seed)
+        self.latencies = {}
+        self.errors = {}
+        self.hands = 0
+
+    def call(self, method, endpoint, body=None, query=""):
+        path = f"{endpoint}?table_id={self.table_id}{query}" if method == "GET" else endpoint
+        start = time.perf_counter()
+        try:
+            status, state = self.client.request(method, path, body)
+        except Exception:
+            # refused or reset connections and timeouts count against the endpoint, the table starts over
+            status, state = None, None
+        seconds = time.perf_counter() - start
+
+        if endpoint not in self.latencies:
+            self.latencies[endpoint] = LatencyHistogram()
+            self.errors[endpoint] = 0
+        self.latencies[endpoint].record(seconds)
+        if status != 200:
+            self.errors[endpoint] += 1
+            return None
+        return state
+
+    def action(self, state):
+        # a random legal action the player can afford
+        turn = state["turn"]
+        actions = [action for action in turn["actions"]
+                   if action["type"] not in ("BET", "RAISE") or action["amount"] <= turn["player"]["stack"]]
+        return turn["player"]["name"], self.rng.choice(actions or turn["actions"])
+
+    def play(self, deadline):
+        state = None
+        while time.monotonic() < deadline:
+            if state is None:
+                # a new game: the first time, after an error, or once someone can't post the blinds
+                state = self.call("GET", "/start_game", query="&replace=1")
+            elif "winner" in state:
+                self.hands += 1
+                # stacks are from before the payout, anyone short who didn't win can't post the blinds
+                winners = {player["name"] for player in state["winner"]["players"]}
+                if any(player["stack"] < BIG_BLIND and player["name"] not in winners for player in state["players"]):
+                    state = None
+                else:
+                    state = self.call("POST", "/next_round", {"table_id": self.table_id})
+            else:
+                name, action = self.action(state)
+                time.sleep(self.think(self.rng))
+                state = self.call("POST", "/next_turn", {"table_id": self.table_id, "player_name": name, "action": action})
+
+
+class LoadReport:
+    tables: int
+    players: int
+    seconds: float
+    hands: int
+    latencies: dict[str, LatencyHistogram]
+    errors: dict[str, int]
+
+    def __init__(self, tables: list[VirtualTable], players, seconds):
+        self.tables = len(tables)
+        self.players = players
+        self.seconds = seconds
+        self.hands = sum(table.hands for table in tables)
+        self.latencies = {}
+        self.errors = {}
+        for table in tables:
+            for endpoint, histogram in table.latencies.items():
+                self.latencies.setdefault(endpoint, LatencyHistogram()).merge(histogram)
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + table.errors[endpoint]
+
+    def to_dict(self):
+        return {
+            "tables": self.tables,
+            "players": self.players,
+            "seconds": self.seconds,
+            "hands": self.hands,
+            "endpoints": {
+                endpoint: {
+                    **histogram.to_dict(),
+                    "errors": self.errors[endpoint],
+                    "throughput": histogram.count / self.seconds,
+                }
+                for endpoint, histogram in self.latencies.items()
+            },
+        }
+
+    def __repr__(self):
+        res = f"{self.tables} tables, {self.players} players, {self.hands} hands in {self.seconds:.1f}s\n"
+        res += f"{'endpoint':14} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}\n"
+        for endpoint, histogram in sorted(self.latencies.items()):
+            res += (f"{endpoint:14} {histogram.count:9} {self.errors[endpoint]:7} {histogram.count / self.seconds:9.1f} "
+                    f"{histogram.percentile(50) * 1e3:8.2f} {histogram.percentile(99) * 1e3:8.2f} "
+                    f"{histogram.percentile(99.9) * 1e3:8.2f} {histogram.max * 1e3:8.2f}\n")
+        return res
+
+
+def run(tables=100, seconds=10.0, think="0", url=None, seed=0) -> LoadReport:
+    if url is None:
+        # the server's tables print as they play, errors are counted in the report instead of logged
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+            server.app.logger.disabled = True
+            try:
+                return _run(lambda: InProcessClient(server.app), tables, seconds, think, seed)
+            finally:
+                server.app.logger.disabled = False
+    return _run(lambda: HttpClient(url), tables, seconds, think, seed)
+
+
+def _run(client, tables, seconds, think, seed, warmup=1.0) -> LoadReport:
+    # the server builds its lookup tables on first use, keep that out of the numbers
+    VirtualTable(client(), f"load-{seed}-warmup", think_time("0"), seed).play(time.monotonic() + warmup)
+
+    think = think_time(think)
+    virtual = [VirtualTable(client(), f"load-{seed}-{i}", think, f"{seed}/{i}") for i in range(tables)]
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=table.play, args=(start + seconds,), daemon=True) for table in virtual]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # start_game seats the server's default players
+    from src.service import default_players
+    return LoadReport(virtual, tables * len(default_players()), time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    tables = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    think = sys.argv[3] if len(sys.argv) > 3 else "0"
+    url = sys.argv[4] if len(sys.argv) > 4 else None
+    print(run(tables, seconds, think, url))
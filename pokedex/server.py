@@ -1,5 +1,9 @@
-from flask import Flask, request, jsonify
-from flask_socketio import SocketIO
+import os
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify, abort, make_response, g
+from flask_socketio import SocketIO, emit, join_room
 from treys import Card, Deck
 from enum import Enum
 
@@ -7,11 +11,18 @@ from enum import Enum
 from src.poker import Poker, Round, GameStage
 from src.player import Player, Action
 from src.hand import Hand
+from src.equity import EquityCalculator
+from src.preflop import preflop_table
+from src.tables import TableRegistry, TableExists, TableNotFound
+from src.service import TableService, NoRound, DEFAULT_TABLE
+from src.history import HandHistoryWriter
+from src.store import TableStore
+from src import metrics, wire
 from flask_cors import CORS
 
 app = Flask(__name__)
 # app.config['SECRET_KEY'] = 'poker-secret'
-# socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins=["http://localhost:5173"])
 # CORS(app)
 CORS(app, resources={
     r"/*": {
@@ -19,94 +30,201 @@ CORS(app, resources={
     }
 })
 
-# Game state (preset for prototyping)
-game = None
+# set STATE_DB to a SQLite file to keep every table and hand result there and restore them on restart
+store = TableStore(os.environ["STATE_DB"]) if os.environ.get("STATE_DB") else None
+# set TABLE_JOURNAL to a directory to journal every table there and recover them on restart
+registry = TableRegistry(journal_dir=os.environ.get("TABLE_JOURNAL"), store=store)
+equity_calculator = EquityCalculator()
+
+def push_delta(table_id, delta):
+    socketio.emit("delta", delta, to=table_id)
+
+# set HAND_HISTORY to a file path to append every finished hand to it
+history = HandHistoryWriter(os.environ["HAND_HISTORY"]) if os.environ.get("HAND_HISTORY") else None
+
+def watched(table_id):
+    # anyone in the table's room, tables nobody watches skip building deltas
+    return bool(socketio.server.manager.rooms.get("/", {}).get(table_id))
+
+service = TableService(registry, on_delta=push_delta, history=history, watched=watched)
+
+# Metrics are recorded from the first scrape of /metrics on (or from startup with
+# METRICS=1), until then the instrumented code runs uninstrumented. METRICS=0
+# turns the endpoint off.
+metrics.Gauge("poker_tables_active", "Tables in the registry", lambda: len(registry))
+request_latencies = {}
+request_latencies_lock = threading.Lock()
+
+def request_latency(endpoint):
+    histogram = request_latencies.get(endpoint)
+    if histogram is None:
+        with request_latencies_lock:
+            if endpoint not in request_latencies:
+                request_latencies[endpoint] = metrics.Histogram(
+                    "poker_http_request_seconds", "HTTP request latency", {"endpoint": endpoint})
+            histogram = request_latencies[endpoint]
+    return histogram
+
+@app.before_request
+def start_timer():
+    if metrics.REGISTRY.enabled:
+        g.start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.pop("start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        request_latency(endpoint).observe(time.perf_counter() - start)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def scrape_metrics():
+    if os.environ.get("METRICS") == "0":
+        abort(404)
+    if not metrics.REGISTRY.enabled:
+        metrics.REGISTRY.enable()
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+def request_table_id():
+    data = request.get_json(silent=True) or {}
+    return data.get("table_id") or request.args.get("table_id") or DEFAULT_TABLE
+
+def find_table(table_id):
+    try:
+        return service.find_table(table_id)
+    except TableNotFound:
+        abort(make_response(jsonify({"error": f"Table {table_id} not found"}), 404))
+
+@app.errorhandler(NoRound)
+@app.errorhandler(TableExists)
+def conflict(e):
+    return jsonify({"error": str(e)}), 409
+
+def replace_requested():
+    return request.args.get("replace", "").lower() in ("1", "true")
+
+def wants_binary():
+    # only an explicit Accept of the wire type switches encoding, not */*
+    return any(mimetype == wire.MIME for mimetype, _ in request.accept_mimetypes)
+
+def respond(result):
+    game_state, binary = result
+    if binary is not None:
+        return Response(binary, mimetype=wire.MIME)
+    return jsonify(game_state)
 
 @app.route('/start_game', methods=['GET'])
 def start_game():
-    global game
-
-    # Define three players with preset names and stacks
-    # players = [
-    #     Player("Harry Potter", 1000),
-    #     Player("Cho Chang", 750),
-    #     Player("Luna Lovegood", 200),
-    # ]
-    players = [
-        Player("Tyson the Conqueror", 1000),
-        Player("Lord Voldemort", 1000),
-        Player("Cho Chang", 250),
-        Player("Luna Lovegood", 320),
-    ]
-    
-    # Initialize a poker game with small blind of 10
-    poker = Poker(players=players, small_blind=10)
-    # poker.set_stacks(1000)
-    
-    # Deal cards and setup the round
-    round = poker.new_round()
-    round.deal()
-    round.post_blinds()
-    # round.set_stage(GameStage.FLOP)
-
-    game = poker
-    # Prepare the game state to return
-    game_state = round.to_dict()
-
-    # Save the game for later interactions
-
-    return jsonify(game_state)
+    # the default table is dealt over every time, a named one only with ?replace=1
+    return respond(service.start_game(request.args.get("table_id"), wants_binary(), replace_requested()))
 
 @app.route('/next_round', methods=['POST'])
 def next_round():
-    global game
-    
-    # Deal cards and setup the round
-    round = game.new_round()
-    round.deal()
-    round.post_blinds()
+    table = find_table(request_table_id())
 
-    # Prepare the game state to return
-    game_state = round.to_dict()
-
-
-    return jsonify(game_state)
+    return respond(service.next_round(table.table_id, wants_binary()))
 
 
 @app.route('/next_turn', methods=['POST'])
 def next_turn():
-    global game
-    round = game.round
-
-    # Get the current player
-
     # Get the action from the request
-    action = request.json["action"]
-    player_name = request.json["player_name"]
-
-    # player verification
-
-    action = Action.dict_to_action(action)
-
-    # Perform the action
-    round.player_action(action)
-
-    # Prepare the game state to return
-    game_state = round.to_dict()
-
-    if round.betting_round_over():
-        players, hand, rank = round.reveal()
-        game_state["winner"] = {
-            "players": [player.to_dict() for player in players],
-            "hand": Hand.ints_to_str(hand),
-            "rank": rank
-        }
-
-        round.distribute_winnings()
-
-
-    return jsonify(game_state)
+    if request.mimetype == wire.MIME:
+        table_id, player_name, action = wire.decode_turn_request(request.get_data())
+    else:
+        table_id = request_table_id()
+        try:
+            action = Action.dict_to_action(request.json["action"])
+            player_name = request.json["player_name"]
+        except KeyError as e:
+            return jsonify({"error": f"Missing {e.args[0]}"}), 400
+
+    table = find_table(table_id)
+
+    return respond(service.next_turn(table.table_id, action, player_name, wants_binary()))
+
+@app.route('/equity', methods=['GET'])
+def equity():
+    table = find_table(request_table_id())
+    hands, board, deck, players = service.round_snapshot(table.table_id)
+
+    # sampling runs outside the lock so the table keeps playing
+    result = equity_calculator.equity(hands, board, deck)
+
+    return jsonify(result.to_dict(players))
+
+@app.route('/tables', methods=['POST'])
+def create_table():
+    data = request.get_json(silent=True) or {}
+    players = [Player(player["name"], player.get("stack", 1000)) for player in data.get("players", [])]
+
+    table = registry.create(players, small_blind=data.get("small_blind", 10))
+
+    return jsonify(table.to_dict()), 201
+
+@app.route('/tables', methods=['GET'])
+def list_tables():
+    return jsonify([table.to_dict() for table in registry.all()])
+
+@app.route('/tables/<table_id>/join', methods=['POST'])
+def join_table(table_id):
+    table = find_table(table_id)
+    data = request.get_json(silent=True) or {}
+
+    with table.lock:
+        try:
+            table.join(data["name"], data.get("stack", 1000))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(table.to_dict())
+
+@app.route('/preflop/<int:opponents>', methods=['GET'])
+def preflop(opponents):
+    table = preflop_table()
+    if table is None:
+        return jsonify({"error": "Preflop table has not been built"}), 404
+    if not 1 <= opponents <= table.max_opponents:
+        return jsonify({"error": f"Opponents must be between 1 and {table.max_opponents}"}), 400
+
+    return jsonify({
+        "opponents": opponents,
+        "heatmap": table.heatmap(opponents),
+    })
+
+@app.route('/store', methods=['GET'])
+def store_lag():
+    if store is None:
+        return jsonify({"error": "No state database configured"}), 404
+    return jsonify(store.lag())
+
+@socketio.on('sync')
+def sync(data):
+    # clients send the last version they applied: on (re)connect with none, or
+    # whenever a delta's base doesn't match what they have
+    table_id = data.get("table_id") or DEFAULT_TABLE
+    try:
+        service.find_table(table_id)
+    except TableNotFound:
+        emit("error", {"error": f"Table {table_id} not found"})
+        return
+
+    join_room(table_id)
+
+    event, payload = service.sync(table_id, data.get("version"), data.get("epoch"))
+    emit(event, payload)
 
 if __name__ == '__main__':
-    # socketio.run(app, debug=True)
-    app.run(debug=True)
\ No newline at end of file
+    if os.environ.get("METRICS") == "1":
+        metrics.REGISTRY.enable()
+    if store is not None:
+        registry.restore()
+        store.start()
+    # journals are never behind the store, they win for tables in both
+    if registry.journal_dir:
+        registry.recover()
+    registry.start_evictor()
+    if history is not None:
+        history.start()
+    equity_calculator.warm()
+    socketio.run(app, debug=True)
\ No newline at end of file
@@ -0,0 +1,338 @@
+import time
+
+import numpy as np
+
+from .deck import FULL_DECK, draw_many
+from .lookup import seven_card_lookup
+from .player import Action, ActionType, Player
+from .poker import GameStage, Round
+from .simulate import SimulationResult, affordable
+
+# Plays `tables` independent hands in lockstep, every table's state held in
+# numpy arrays with one row per table (and one column per seat, in blind
+# order). Each step applies one decision per unfinished table. The betting
+# rules are Round.get_current_player_and_actions, Round.player_action,
+# Pot.set_last_bet_raise and Pot.split_pot, quirks included, and
+# cross_check replays sampled tables through a real Round to prove it.
+#
+# Legal actions are a (tables, 5) mask and amounts indexed by ActionType
+# value: the amount to bet or raise to, or the amount to call.
+FOLD = ActionType.FOLD.value
+CALL = ActionType.CALL.value
+RAISE = ActionType.RAISE.value
+CHECK = ActionType.CHECK.value
+BET = ActionType.BET.value
+ACTIONS = 5
+
+PREFLOP = GameStage.PREFLOP.value
+RIVER = GameStage.RIVER.value
+ROUND_OVER = GameStage.ROUND_OVER.value
+
+NO_CAP = np.iinfo(np.int64).max
+NO_SCORE = np.iinfo(np.int64).max
+
+FULL_DECK_ARRAY = np.array(FULL_DECK, dtype=np.int64)
+
+
+def random_strategy(rng: np.random.Generator):
+    # uniform over the legal actions, the batch RandomStrategy
+    def choose(engine, legal, amounts):
+        return np.argmax(rng.random(legal.shape) * legal, axis=1)
+    return choose
+
+
+def passive_strategy(engine, legal, amounts):
+    # check or call, fold when neither is there
+    return np.where(legal[:, CHECK], CHECK, np.where(legal[:, CALL], CALL, np.argmax(legal, axis=1)))
+
+
+class ScriptedDeck:
+    # deals a batch table's board to the Round it is cross-checked against
+    def __init__(self, cards):
+        self.cards = list(cards)
+
+    def draw(self, n=1):
+        drawn = self.cards[:n]
+        del self.cards[:n]
+        return drawn
+
+
+class BatchEngine:
+    tables: int
+    seats: int
+    small_blind: int
+    big_blind: int
+    stack: int
+    hands: int
+
+    def __init__(self, tables, seats=6, small_blind=10, stack=1000, seed=None, check=0):
+        if seats < 2:
+            raise ValueError("Not enough players to start a round")
+        if stack < 2 * small_blind:
+            raise ValueError("Stacks must cover the big blind")
+
+        self.tables = tables
+        self.seats = seats
+        self.small_blind = small_blind
+        self.big_blind = 2 * small_blind
+        self.stack = stack
+        # tables per hand replayed through Round by cross_check
+        self.check = check
+        self.rng = np.random.default_rng(seed)
+        self.lookup = seven_card_lookup()
+        self.hands = 0
+        self.rows = np.arange(tables)
+        self.columns = np.arange(seats)
+        self.players = [Player(f"Seat {i + 1}", stack) for i in range(seats)]
+
+    def deal(self):
+        # every table starts from `stack` with the blinds posted, like Round.deal and post_blinds
+        tables, seats = self.tables, self.seats
+        cards = draw_many(self.rng, FULL_DECK_ARRAY, tables, 2 * seats + 5)
+        self.hole_cards = cards[:, :2 * seats].reshape(tables, seats, 2)
+        self.board = cards[:, 2 * seats:]
+
+        self.stacks = np.full((tables, seats), self.stack, dtype=np.int64)
+        self.bets = np.zeros((tables, seats), dtype=np.int64)
+        self.folded = np.zeros((tables, seats), dtype=bool)
+        self.all_in = np.zeros((tables, seats), dtype=bool)
+        self.complete = np.zeros((tables, seats), dtype=bool)
+
+        self.stage = np.zeros(tables, dtype=np.int64)
+        self.seat = np.full(tables, 2 if seats > 2 else 0, dtype=np.int64)
+        self.bb_acted = np.zeros(tables, dtype=bool)
+
+        # Pot: last_bet_raise amount, min_raise_amount, last_full_raise, betting_started
+        self.call_amount = np.full(tables, self.big_blind, dtype=np.int64)
+        self.min_raise = np.full(tables, self.big_blind, dtype=np.int64)
+        self.last_full_raise = np.full(tables, self.big_blind, dtype=np.int64)
+        self.betting_started = np.ones(tables, dtype=bool)
+
+        self.stacks[:, 0] -= self.small_blind
+        self.stacks[:, 1] -= self.big_blind
+        self.bets[:, 0] = self.small_blind
+        self.bets[:, 1] = self.big_blind
+        self.contributions = self.bets.copy()
+        self.pot = np.full(tables, self.small_blind + self.big_blind, dtype=np.int64)
+
+        self.checked = self.rng.choice(tables, min(self.check, tables), replace=False) if self.check else []
+        self.log = {int(t): [] for t in self.checked}
+
+    def active(self):
+        return self.stage != ROUND_OVER
+
+    def legal_actions(self):
+        # (legal, amounts) for the player to act at every table, affordable actions only
+        rows, seat = self.rows, self.seat
+        bet = self.bets[rows, seat]
+        stack = self.stacks[rows, seat]
+        to_call = self.call_amount - bet
+
+        started = self.betting_started
+        bb_option = started & (to_call == 0) & (seat == 1) & (self.stage == PREFLOP) & ~self.bb_acted
+        facing = started & ~bb_option & (to_call > 0)
+        open_action = ~started | (started & ~bb_option & (to_call <= 0))
+
+        legal = np.zeros((self.tables, ACTIONS), dtype=bool)
+        amounts = np.zeros((self.tables, ACTIONS), dtype=np.int64)
+        raise_to = self.min_raise + self.call_amount
+
+        legal[:, FOLD] = facing
+        legal[:, CALL] = facing
+        amounts[:, CALL] = to_call
+        legal[:, CHECK] = open_action | bb_option
+        legal[:, BET] = open_action & (self.big_blind <= stack)
+        amounts[:, BET] = self.big_blind
+        legal[:, RAISE] = (bb_option | (facing & (to_call < stack) & (bet != self.last_full_raise))) & (raise_to <= stack)
+        amounts[:, RAISE] = raise_to
+
+        legal &= self.active()[:, None]
+        return legal, amounts
+
+    def step(self, actions, legal, amounts):
+        # apply one action per unfinished table
+        active = self.active()
+        if not np.all(legal[self.rows[active], actions[active]]):
+            raise ValueError("Invalid action")
+
+        for t in self.log:
+            if active[t]:
+                self.log[t].append((int(self.seat[t]), legal[t].copy(), amounts[t].copy(), int(actions[t])))
+
+        rows, seat = self.rows[active], self.seat[active]
+        action = actions[active]
+        bet = self.bets[rows, seat]
+        stack = self.stacks[rows, seat]
+
+        fold = action == FOLD
+        self.folded[rows[fold], seat[fold]] = True
+
+        # call: all in when the call covers the stack
+        call = action == CALL
+        to_call = self.call_amount[rows] - bet
+        call_all_in = call & (to_call >= stack)
+        paid = np.where(call, np.minimum(to_call, stack), 0)
+
+        # bet: the minimum bet, raise: to the minimum raise, all in when amount == stack
+        bet_action = action == BET
+        raise_action = action == RAISE
+        amount = np.where(bet_action, self.big_blind, amounts[rows, RAISE])
+        aggressive = bet_action | raise_action
+        paid = np.where(bet_action, amount, np.where(raise_action, amount - bet, paid))
+        aggressive_all_in = aggressive & (amount == stack)
+
+        self.stacks[rows, seat] -= paid
+        self.bets[rows, seat] += paid
+        self.contributions[rows, seat] += paid
+        self.pot[rows] += paid
+        self.betting_started[rows] |= call | aggressive
+        self.all_in[rows, seat] |= call_all_in | aggressive_all_in
+
+        # Pot.set_last_bet_raise
+        raise_amount = amount - self.call_amount[rows]
+        full = aggressive & (raise_amount >= self.min_raise[rows])
+        self.min_raise[rows[full]] = raise_amount[full]
+        self.last_full_raise[rows[full]] = amount[full]
+        self.call_amount[rows[aggressive]] = amount[aggressive]
+
+        # Round.add_action: a bet or raise reopens the action for everyone not all in
+        reopened = rows[aggressive]
+        self.complete[reopened] = self.all_in[reopened]
+        done = action == CHECK
+        done |= call
+        done |= aggressive
+        self.complete[rows[done], seat[done]] = True
+        self.bb_acted[rows] |= (seat == 1) & (self.stage[rows] == PREFLOP)
+
+        self._advance(rows)
+
+    def _advance(self, rows):
+        in_hand = ~self.folded[rows]
+        players = in_hand.sum(axis=1)
+        all_ins = (self.all_in[rows] & in_hand).sum(axis=1)
+        complete = self.complete[rows].sum(axis=1)
+
+        # everyone else folded, or nobody left to act: deal the rest of the board and finish
+        over = (players == 1) | (players == all_ins) | ((players == complete) & (players - all_ins == 1))
+        self.stage[rows[over]] = ROUND_OVER
+
+        street_over = ~over & (complete == players)
+        last_street = street_over & (self.stage[rows] == RIVER)
+        self.stage[rows[last_street]] = ROUND_OVER
+        next_street = rows[street_over & ~last_street]
+        if len(next_street):
+            self.stage[next_street] += 1
+            self.bets[next_street] = 0
+            self.complete[next_street] = self.all_in[next_street]
+            self.call_amount[next_street] = 0
+            self.min_raise[next_street] = 0
+            self.betting_started[next_street] = False
+            # first seat still in the hand that is not all in, if there is one
+            can_act = ~self.folded[next_street] & ~self.all_in[next_street]
+            first = np.where(can_act.any(axis=1), np.argmax(can_act, axis=1), np.argmax(~self.folded[next_street], axis=1))
+            self.seat[next_street] = first
+
+        moving = rows[~over & ~street_over]
+        if len(moving):
+            can_act = ~self.folded[moving] & ~self.all_in[moving]
+            distance = (self.columns[None, :] - self.seat[moving][:, None] - 1) % self.seats
+            self.seat[moving] = np.argmin(np.where(can_act, distance, self.seats), axis=1)
+
+    def payout(self, result: SimulationResult = None):
+        # Pot.split_pot(final=True) and Round.distribute_winnings for every table
+        in_hand = ~self.folded
+        showdown = in_hand.sum(axis=1) > 1
+
+        scores = np.zeros((self.tables, self.seats), dtype=np.int64)
+        if showdown.any():
+            cards = np.concatenate([
+                self.hole_cards[showdown],
+                np.broadcast_to(self.board[showdown][:, None, :], (int(showdown.sum()), self.seats, 5)),
+            ], axis=2)
+            scores[showdown] = self.lookup.score_batch(cards.reshape(-1, 7)).reshape(-1, self.seats)
+
+        caps = np.sort(np.where(self.all_in & in_hand, self.contributions, NO_CAP), axis=1)
+        low = np.zeros(self.tables, dtype=np.int64)
+        layered = np.zeros(self.tables, dtype=np.int64)
+        pots_won = np.zeros(self.seats, dtype=np.int64)
+
+        def pay(amount, eligible):
+            best = np.where(eligible, scores, NO_SCORE).min(axis=1)
+            winners = eligible & (scores == best[:, None])
+            count = winners.sum(axis=1)
+            share = np.where(count > 0, amount // np.maximum(count, 1), 0)
+            odd = amount - share * count
+            self.stacks += winners * share[:, None] + (winners & (winners.cumsum(axis=1) <= odd[:, None]))
+            pots_won[:] += (winners & (amount > 0)[:, None]).sum(axis=0)
+
+        for k in range(self.seats):
+            cap = caps[:, k]
+            layer = cap != NO_CAP
+            if not layer.any():
+                break
+            cap = np.where(layer, cap, low)
+            amount = np.clip(self.contributions - low[:, None], 0, (cap - low)[:, None]).sum(axis=1)
+            amount = np.where(layer, amount, 0)
+            pay(amount, in_hand & (self.contributions >= cap[:, None]) & layer[:, None])
+            layered += amount
+            low = cap
+
+        pay(self.pot - layered, in_hand & (self.contributions > low[:, None]))
+
+        if result is not None:
+            # seat i is player (i + hand) % seats, Poker moves the small blind one seat each hand
+            order = (self.columns + self.hands) % self.seats
+            deltas = (self.stacks - self.stack).sum(axis=0)
+            result.hands += self.tables
+            result.showdowns += int(showdown.sum())
+            for seat, player in enumerate(order):
+                name = self.players[player].name
+                result.chip_deltas[name] += int(deltas[seat])
+                result.pots_won[name] += int(pots_won[seat])
+                result.showdowns_seen[name] += int((in_hand[:, seat] & showdown).sum())
+
+    def play_hand(self, strategy, result: SimulationResult = None):
+        self.deal()
+        while self.active().any():
+            legal, amounts = self.legal_actions()
+            self.step(np.asarray(strategy(self, legal, amounts)), legal, amounts)
+        self.payout(result)
+        for t in self.log:
+            self.cross_check(t)
+        self.hands += 1
+
+    def run(self, hands, strategy) -> SimulationResult:
+        result = SimulationResult(self.players)
+
+        start = time.perf_counter()
+        for _ in range(hands):
+            self.play_hand(strategy, result)
+        result.seconds = time.perf_counter() - start
+
+        return result
+
+    def cross_check(self, table):
+        # replay one table's hand through Round and compare every turn and the payout
+        players = [Player(f"Seat {i + 1}", self.stack) for i in range(self.seats)]
+        round = Round(players, self.small_blind, verbose=False)
+        round.deck = ScriptedDeck(self.board[table].tolist())
+        for player, cards in zip(players, self.hole_cards[table].tolist()):
+            player.set_cards(cards)
+        round.post_blinds()
+
+        for seat, legal, amounts, action in self.log[table]:
+            player, actions = round.get_current_player_and_actions()
+            expected = {(int(a), int(amounts[a]) if a in (CALL, BET, RAISE) else 0) for a in np.flatnonzero(legal)}
+            found = {(a.action_type.value, (a.amount_to_call if a.action_type == Action.CALL else a.amount) or 0)
+                     for a in affordable(player, actions)}
+            if player is not players[seat] or found != expected:
+                raise ValueError(f"Table {table}: batch engine offers {sorted(expected)} to seat {seat}, "
+                                 f"Round offers {sorted(found)} to {player.name}")
+            round.player_action(Action(ActionType(action), int(amounts[action]) if action in (BET, RAISE) else None))
+
+        if not round.betting_round_over():
+            raise ValueError(f"Table {table}: batch engine finished the hand, Round did not")
+        round.distribute_winnings()
+        stacks = [player.stack for player in players]
+        if stacks != self.stacks[table].tolist():
+            raise ValueError(f"Table {table}: batch engine stacks {self.stacks[table].tolist()}, Round stacks {stacks}")
@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+from treys import Deck as TreysDeck
+
+# treys card ints in treys full deck order
+FULL_DECK = TreysDeck.GetFullDeck()
+
+MASK = (1 << 64) - 1
+
+
+def mix_seed(seed, n):
+    # splitmix64 of (seed, n): independent 64 bit seeds for hand n of a table
+    z = (seed + (n + 1) * 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+class Deck:
+    # Stands in for treys.Deck where Round uses it: draw(n) and `cards`, the
+    # cards still in the deck. Nothing is shuffled up front, each draw swaps a
+    # random remaining card to the end and pops it (a partial Fisher-Yates), so
+    # a hand costs one random() per card dealt. The same seed always deals the
+    # same cards; `rng` lets a table reuse one generator for all its decks.
+    __slots__ = ("seed", "cards", "rng")
+
+    def __init__(self, seed=None, rng: random.Random = None):
+        self.seed = seed
+        self.cards = list(FULL_DECK)
+        self.rng = rng if rng is not None else random.Random()
+        if seed is not None:
+            self.rng.seed(seed)
+
+    def draw(self, n=1) -> list[int]:
+        cards = self.cards
+        rand = self.rng.random
+        drawn = []
+        for _ in range(n):
+            i = int(rand() * len(cards))
+            cards[i], cards[-1] = cards[-1], cards[i]
+            drawn.append(cards.pop())
+        return drawn
+
+    def dealt(self):
+        return len(FULL_DECK) - len(self.cards)
+
+
+def draw_many(rng: np.random.Generator, cards, decks, n) -> np.ndarray:
+    # (decks, n) array: the first n cards of `decks` independent shuffles of `cards`
+    cards = np.asarray(cards, dtype=np.int64)
+    return cards[np.argpartition(rng.random((decks, len(cards))), n - 1, axis=1)[:, :n]]
@@ -0,0 +1,409 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from collections import deque
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+import numpy as np
+from treys import Deck
+
+from .deck import FULL_DECK, draw_many
+from .lookup import seven_card_lookup, SUITS
+
+
+class Equity:
+    wins: list[float]
+    ties: list[float]
+    equity: list[float]
+    trials: int
+    margin: float
+
+    def __init__(self, wins, ties, equity, trials, margin):
+        self.wins = wins
+        self.ties = ties
+        self.equity = equity
+        self.trials = trials
+        self.margin = margin
+
+    def to_dict(self, players):
+        return {
+            "players": [
+                {
+                    "name": player.name,
+                    "win": self.wins[i],
+                    "tie": self.ties[i],
+                    "equity": self.equity[i],
+                }
+                for i, player in enumerate(players)
+            ],
+            "trials": self.trials,
+            "margin": self.margin,
+        }
+
+    def __repr__(self):
+        return f"Equity({[round(e, 4) for e in self.equity]}, trials={self.trials})"
+
+
+def _init_worker():
+    # build the lookup tables once per worker instead of on the first chunk
+    seven_card_lookup()
+
+
+def _simulate_chunk(hands, board, deck, trials, seed, chunk):
+    # wins, ties, equity share and equity share squared summed over `trials` runouts
+    rng = np.random.default_rng([seed, chunk])
+    lookup = seven_card_lookup()
+
+    players = len(hands)
+    missing = 5 - len(board)
+    runouts = draw_many(rng, deck, trials, missing)
+
+    cards = np.empty((players, trials, 7), dtype=np.int64)
+    cards[:, :, :2] = np.asarray(hands, dtype=np.int64)[:, None, :]
+    cards[:, :, 2:2 + len(board)] = board
+    cards[:, :, 2 + len(board):] = runouts[None, :, :]
+
+    scores, _, _ = lookup.evaluate_batch(cards.reshape(-1, 7))
+    return _tally(scores.reshape(players, trials))
+
+
+def _tally(scores):
+    # scores: (players, runouts) -> wins, ties, equity share and share squared per player
+    winners = scores == scores.min(axis=0)
+    counts = winners.sum(axis=0)
+    shares = winners / counts
+
+    return (
+        (winners & (counts == 1)).sum(axis=1),
+        (winners & (counts > 1)).sum(axis=1),
+        shares.sum(axis=1),
+        (shares ** 2).sum(axis=1),
+        scores.shape[1],
+    )
+
+
+@lru_cache(maxsize=8)
+def _runout_indices(deck_size, missing):
+    return np.array(list(combinations(range(deck_size), missing)), dtype=np.intp).reshape(comb(deck_size, missing), missing)
+
+
+def _enumerate(hands, board, deck):
+    # every runout is combined into one prime product and four suit masks that
+    # all players share; each hand then only adds its two cards and looks up
+    lookup = seven_card_lookup()
+    board = np.asarray(board, dtype=np.int64)
+    deck = np.asarray(deck, dtype=np.int64)
+    runouts = deck[_runout_indices(len(deck), 5 - len(board))]
+
+    cards = np.concatenate([np.broadcast_to(board, (len(runouts), len(board))), runouts], axis=1)
+    primes = np.prod(cards & 0xFF, axis=1)
+    suits = (cards >> 12) & 0xF
+    rank_bits = cards >> 16
+    board_masks = [np.bitwise_or.reduce(np.where(suits == suit, rank_bits, 0), axis=1) for suit in SUITS]
+
+    scores = np.empty((len(hands), len(runouts)), dtype=np.int32)
+    for i, hand in enumerate(hands):
+        hand_masks = [0] * len(SUITS)
+        for card in hand:
+            hand_masks[SUITS.index((card >> 12) & 0xF)] |= card >> 16
+        masks = [board_mask | hand_mask for board_mask, hand_mask in zip(board_masks, hand_masks)]
+        scores[i] = lookup.score_keys(primes * ((hand[0] & 0xFF) * (hand[1] & 0xFF)), masks)
+
+    return _tally(scores)
+
+
+# card -> index in FULL_DECK, through a search of the sorted card ints
+SORTED_DECK = np.sort(np.asarray(FULL_DECK, dtype=np.int64))
+# live combo pairs x runouts compared at once when enumerating two ranges
+RANGE_BLOCK = 4_000_000
+
+
+def _card_bits(cards):
+    # one bit per card, OR-ed over the last axis
+    cards = np.asarray(cards, dtype=np.int64)
+    return np.bitwise_or.reduce(np.left_shift(1, np.searchsorted(SORTED_DECK, cards)), axis=-1)
+
+
+def _range_scores(lookup, combos, primes, board_masks, runout_bits):
+    # (combos, runouts) scores and whether the combo is live on each runout
+    combo_primes = (combos[:, 0] & 0xFF) * (combos[:, 1] & 0xFF)
+    live = (_card_bits(combos)[:, None] & runout_bits[None, :]) == 0
+    # a combo sharing a card with the runout is scored on any valid key and ignored
+    keys = np.where(live, combo_primes[:, None] * primes[None, :], lookup.unsuited_keys[0])
+
+    suits = (combos >> 12) & 0xF
+    masks = []
+    for suit, board_mask in zip(SUITS, board_masks):
+        hand_mask = np.bitwise_or.reduce(np.where(suits == suit, combos >> 16, 0), axis=1)
+        masks.append(hand_mask[:, None] | board_mask[None, :])
+    return lookup.score_keys(keys, masks), live
+
+
+def _enumerate_ranges(first, second, board, deck, start, stop):
+    # weighted wins, ties and matchups of the first range over runouts[start:stop]
+    lookup = seven_card_lookup()
+    board = np.asarray(board, dtype=np.int64)
+    deck = np.asarray(deck, dtype=np.int64)
+    runouts = deck[_runout_indices(len(deck), 5 - len(board))[start:stop]]
+
+    cards = np.concatenate([np.broadcast_to(board, (len(runouts), len(board))), runouts], axis=1)
+    primes = np.prod(cards & 0xFF, axis=1)
+    suits = (cards >> 12) & 0xF
+    rank_bits = cards >> 16
+    board_masks = [np.bitwise_or.reduce(np.where(suits == suit, rank_bits, 0), axis=1) for suit in SUITS]
+    runout_bits = _card_bits(runouts)
+
+    (combos_a, weights_a), (combos_b, weights_b) = first, second
+    scores_a, live_a = _range_scores(lookup, combos_a, primes, board_masks, runout_bits)
+    scores_b, live_b = _range_scores(lookup, combos_b, primes, board_masks, runout_bits)
+
+    wins = np.zeros((len(combos_a), len(combos_b)))
+    ties = np.zeros((len(combos_a), len(combos_b)))
+    block = max(1, RANGE_BLOCK // (len(combos_a) * len(combos_b)))
+    for i in range(0, len(runouts), block):
+        a, b = scores_a[:, None, i:i + block], scores_b[None, :, i:i + block]
+        live = live_a[:, None, i:i + block] & live_b[None, :, i:i + block]
+        wins += (live & (a < b)).sum(axis=2)
+        ties += (live & (a == b)).sum(axis=2)
+    matchups = live_a.astype(np.float64) @ live_b.T.astype(np.float64)
+
+    weights = weights_a[:, None] * weights_b[None, :] * ((_card_bits(combos_a)[:, None] & _card_bits(combos_b)[None, :]) == 0)
+    return (weights * wins).sum(), (weights * ties).sum(), (weights * matchups).sum(), int((matchups * (weights > 0)).sum())
+
+
+def _sample_ranges_chunk(ranges, board, deck, trials, seed, chunk):
+    # one combo per range by weight and a runout per trial, trials where any
+    # two of them share a card are dropped
+    rng = np.random.default_rng([seed, chunk])
+    lookup = seven_card_lookup()
+
+    holes = np.stack([combos[rng.choice(len(combos), trials, p=weights / weights.sum())] for combos, weights in ranges])
+    missing = 5 - len(board)
+    runouts = draw_many(rng, deck, trials, missing) if missing else np.empty((trials, 0), dtype=np.int64)
+
+    used = np.sort(np.searchsorted(SORTED_DECK, np.concatenate([holes.transpose(1, 0, 2).reshape(trials, -1), runouts], axis=1)), axis=1)
+    valid = (np.diff(used, axis=1) != 0).all(axis=1)
+    holes, runouts = holes[:, valid], runouts[valid]
+    if not len(runouts):
+        return (*(np.zeros(len(ranges)) for _ in range(4)), 0)
+
+    cards = np.empty((len(ranges), len(runouts), 7), dtype=np.int64)
+    cards[:, :, :2] = holes
+    cards[:, :, 2:2 + len(board)] = board
+    cards[:, :, 2 + len(board):] = runouts[None, :, :]
+
+    scores = lookup.score_batch(cards.reshape(-1, 7))
+    return _tally(scores.reshape(len(ranges), len(runouts)))
+
+
+class EquityCalculator:
+    trials: int
+    time_budget: float
+    margin: float
+    chunk_size: int
+    workers: int
+    seed: int
+    exact_hands: int
+    exact_ranges: int
+
+    # z score for a 95% confidence interval
+    Z = 1.96
+
+    def __init__(self, trials=20_000, time_budget=0.05, margin=0.005,
+                 chunk_size=1_000, workers=None, seed=0, exact_hands=20_000, exact_ranges=100_000_000):
+        self.trials = trials
+        self.time_budget = time_budget
+        self.margin = margin
+        self.chunk_size = chunk_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.seed = seed
+        # enumerate instead of sampling when there are at most this many hands to score
+        self.exact_hands = exact_hands
+        # enumerate two ranges when there are at most this many (combo, combo, runout) matchups
+        self.exact_ranges = exact_ranges
+        self.executor = None
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        return self.executor
+
+    def warm(self):
+        # start the workers and build their lookup tables now rather than on the
+        # first query, and this process's for a first chunk run here
+        seven_card_lookup()
+        if self.workers > 1:
+            executor = self._executor()
+            for _ in range(self.workers):
+                executor.submit(_init_worker)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def round_equity(self, round) -> Equity:
+        hands = [player.hand() for player in round.players]
+        return self.equity(hands, round.board, round.deck.cards)
+
+    def equity(self, hands, board, deck) -> Equity:
+        if len(hands) < 2:
+            raise ValueError("Need at least two hands to calculate equity")
+        if len(board) > 5:
+            raise ValueError("Board can have at most 5 cards")
+
+        if self.exact_hands is not None and runouts(len(deck), len(board)) * len(hands) <= self.exact_hands:
+            return enumerate_equity(hands, board, deck)
+
+        return self._sample(_simulate_chunk, (hands, list(board), list(deck)), len(hands))
+
+    def round_range_equity(self, round, ranges, dead=()) -> Equity:
+        return self.range_equity(ranges, round.board, dead)
+
+    def range_equity(self, ranges, board=(), dead=()) -> Equity:
+        # equity of each Range against the others, combos using a board or dead card are removed
+        if len(ranges) < 2:
+            raise ValueError("Need at least two ranges to calculate equity")
+        if len(board) > 5:
+            raise ValueError("Board can have at most 5 cards")
+
+        known = set(board) | set(dead)
+        ranges = [hand_range.without(known) for hand_range in ranges]
+        for hand_range in ranges:
+            if not len(hand_range):
+                raise ValueError(f"Range {hand_range.name} has no combos left")
+
+        deck = [card for card in FULL_DECK if card not in known]
+        arrays = [(np.asarray(hand_range.combos, dtype=np.int64), np.asarray(hand_range.weights, dtype=np.float64))
+                  for hand_range in ranges]
+
+        # preflop the index array alone is C(48, 5) rows, always sample there
+        if (len(ranges) == 2 and self.exact_ranges is not None and len(board) >= 3
+                and runouts(len(deck), len(board)) * len(ranges[0]) * len(ranges[1]) <= self.exact_ranges):
+            return self._enumerate_ranges(arrays, list(board), deck)
+
+        return self._sample(_sample_ranges_chunk, (arrays, list(board), deck), len(ranges))
+
+    def _enumerate_ranges(self, arrays, board, deck) -> Equity:
+        total = runouts(len(deck), len(board))
+        if self.workers <= 1:
+            results = [_enumerate_ranges(*arrays, board, deck, 0, total)]
+        else:
+            bounds = [total * i // self.workers for i in range(self.workers + 1)]
+            results = list(self._executor().map(_enumerate_ranges, *zip(*[(*arrays, board, deck, start, stop)
+                                                                         for start, stop in zip(bounds, bounds[1:])])))
+
+        wins, ties, matchups, trials = (sum(values) for values in zip(*results))
+        if not matchups:
+            raise ValueError("The ranges have no matchups without shared cards")
+        losses = matchups - wins - ties
+        return Equity([float(wins / matchups), float(losses / matchups)], [float(ties / matchups)] * 2,
+                      [float((wins + ties / 2) / matchups), float((losses + ties / 2) / matchups)], trials, 0.0)
+
+    def _sample(self, fn, args, players) -> Equity:
+        # runs fn(*args, size, seed, chunk) over chunks of trials until the
+        # trial count, time budget or margin is reached
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        totals = [np.zeros(players) for _ in range(4)]
+        trials = 0
+
+        def add(result):
+            nonlocal trials
+            for total, value in zip(totals, result[:4]):
+                total += value
+            trials += result[4]
+
+        def done():
+            if trials >= self.trials or time.perf_counter() >= deadline:
+                return True
+            return trials > 0 and self._margin(totals[2], totals[3], trials) <= self.margin
+
+        chunks = range((self.trials + self.chunk_size - 1) // self.chunk_size)
+        sizes = [min(self.chunk_size, self.trials - i * self.chunk_size) for i in chunks]
+        if self.workers <= 1:
+            for chunk, size in enumerate(sizes):
+                add(fn(*args, size, self.seed, chunk))
+                if done():
+                    break
+        else:
+            # results are merged in chunk order, so a given seed and trial count
+            # always produce the same numbers regardless of scheduling
+            executor = self._executor()
+            pending = deque()
+            next_chunk = 0
+            while not done():
+                while next_chunk < len(sizes) and len(pending) < self.workers:
+                    pending.append(executor.submit(fn, *args, sizes[next_chunk], self.seed, next_chunk))
+                    next_chunk += 1
+                if not pending:
+                    break
+                try:
+                    add(pending[0].result(timeout=max(deadline - time.perf_counter(), 0)))
+                except TimeoutError:
+                    if not trials:
+                        # workers still starting: run the first chunk here so there is something to report
+                        add(fn(*args, sizes[0], self.seed, 0))
+                    break
+                pending.popleft()
+
+            for future in pending:
+                future.cancel()
+
+        return self._result(*totals, trials)
+
+    def _margin(self, shares, squares, trials):
+        mean = shares / trials
+        variance = np.maximum(squares / trials - mean ** 2, 0)
+        return float(np.max(self.Z * np.sqrt(variance / trials)))
+
+    def _result(self, wins, ties, shares, squares, trials):
+        return Equity(
+            (wins / trials).tolist(),
+            (ties / trials).tolist(),
+            (shares / trials).tolist(),
+            trials,
+            self._margin(shares, squares, trials),
+        )
+
+
+def runouts(deck_size, board_size):
+    return comb(deck_size, 5 - board_size)
+
+
+def enumerate_equity(hands, board, deck) -> Equity:
+    if len(hands) < 2:
+        raise ValueError("Need at least two hands to calculate equity")
+    if len(board) > 5:
+        raise ValueError("Board can have at most 5 cards")
+
+    wins, ties, shares, _, trials = _enumerate(hands, list(board), list(deck))
+    return Equity((wins / trials).tolist(), (ties / trials).tolist(), (shares / trials).tolist(), trials, 0.0)
+
+
+def round_exact_equity(round) -> Equity:
+    hands = [player.hand() for player in round.players]
+    return enumerate_equity(hands, round.board, round.deck.cards)
+
+
+def random_opponents_equity(hand, opponents, trials, seed=0):
+    # equity of one known hand against `opponents` random hands over random boards
+    rng = np.random.default_rng([seed, opponents])
+    lookup = seven_card_lookup()
+
+    deck = np.array([card for card in Deck.GetFullDeck() if card not in hand], dtype=np.int64)
+    dealt = 2 * opponents + 5
+    draws = draw_many(rng, deck, trials, dealt)
+    board = draws[:, :5]
+
+    cards = np.empty((opponents + 1, trials, 7), dtype=np.int64)
+    cards[:, :, 2:] = board[None, :, :]
+    cards[0, :, :2] = hand
+    for i in range(opponents):
+        cards[i + 1, :, :2] = draws[:, 5 + 2 * i:7 + 2 * i]
+
+    scores, _, _ = lookup.evaluate_batch(cards.reshape(-1, 7))
+    wins, ties, shares, _, _ = _tally(scores.reshape(opponents + 1, trials))
+    return float(shares[0] / trials)
@@ -0,0 +1,104 @@
+import uuid
+from collections import deque
+
+# ops applied in order on the client:
+#   ["set", path, value]    replace the value at path
+#   ["del", path]           remove the key at path
+#   ["push", path, values]  append values to the list at path
+PUSH = "push"
+SET = "set"
+DELETE = "del"
+
+
+def changes(old, state, seats, changed):
+    # (ops, new normalized state). Players are keyed by seat and only sent for
+    # the seats the engine changed, seats[i] is the seat of state["players"][i];
+    # the rest of the state is a few small values compared at the top level
+    ops = []
+    old_players = old.get("players", {})
+    players = {}
+    for seat, player in zip(seats, state["players"]):
+        key = str(seat)
+        if changed >> seat & 1 or key not in old_players:
+            ops.append([SET, ["players", key], player])
+            players[key] = player
+        else:
+            players[key] = old_players[key]
+    for key in old_players:
+        if key not in players:
+            ops.append([DELETE, ["players", key]])
+
+    new = {"players": players, "order": list(players)}
+    if new["order"] != old.get("order"):
+        ops.append([SET, ["order"], new["order"]])
+
+    for key, value in state.items():
+        if key == "players":
+            continue
+        new[key] = value
+        if key not in old:
+            ops.append([SET, [key], value])
+        elif old[key] != value:
+            previous = old[key]
+            # the board only grows during a round
+            if isinstance(value, list) and isinstance(previous, list) and value[:len(previous)] == previous:
+                ops.append([PUSH, [key], value[len(previous):]])
+            else:
+                ops.append([SET, [key], value])
+    for key in old:
+        if key not in new:
+            ops.append([DELETE, [key]])
+    return ops, new
+
+
+class TableFeed:
+    # every table created or recovered gets a new feed, and with it a new
+    # epoch: versions only compare within one epoch
+    epoch: str
+    version: int
+    state: dict
+    # (state, seats) of the last change nobody was watching
+    held: tuple
+    history: deque
+
+    def __init__(self, history=256):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.state = {}
+        self.held = None
+        # (version, ops) for the last `history` changes, oldest first
+        self.history = deque(maxlen=history)
+
+    def publish(self, state, seats, changed):
+        # changed: the seats bitmask from Round.take_changed. Returns the ops
+        # that move version - 1 to version, or None if nothing changed
+        self.held = None
+        ops, self.state = changes(self.state, state, seats, changed)
+        if not ops:
+            return None
+
+        self.version += 1
+        self.history.append((self.version, ops))
+        return ops
+
+    def hold(self, state, seats):
+        # nobody is watching: only keep the state, publish it once someone is
+        self.held = (state, seats)
+
+    def since(self, version, epoch):
+        # ops since a client's acknowledged version, or None if it has to resync
+        if epoch != self.epoch:
+            return None
+        if version == self.version:
+            return []
+        if not self.history or version < self.history[0][0] - 1 or version > self.version:
+            return None
+
+        ops = []
+        for change_version, change_ops in self.history:
+            if change_version > version:
+                ops += change_ops
+        return ops
+
+    def snapshot(self):
+        return {"epoch": self.epoch, "version": self.version, "state": self.state}
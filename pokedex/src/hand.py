@@ -1,7 +1,12 @@
+import threading
+from collections import OrderedDict
 from treys import Evaluator
 from itertools import combinations
 from treys import Card
 
+from .lookup import seven_card_lookup
+from .metrics import timed, HAND_EVALUATIONS, HAND_EVALUATIONS_MANY
+
 class Hand:
     cards: list[int]
     rank: str
@@ -24,12 +29,126 @@ class Hand:
     def __repr__(self):
         return f"{self.cards} ({self.rank})"  
 
+class HandCache:
+    # process wide LRU of best_hand_rank_eval results, keyed on the sorted hole + board cards,
+    # shared by every server thread: writes hold the lock, a hit evicted by another
+    # thread halfway through get() counts as a miss
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        if self.maxsize <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self.lock:
+            self.maxsize = maxsize
+            while len(self.entries) > max(maxsize, 0):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+hand_cache = HandCache()
+
+_evaluator = None
+
+def shared_evaluator():
+    # treys builds its lookup tables on construction, so share one per process
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = Evaluator()
+    return _evaluator
+
 class HandEvaluator:
     def __init__(self):
-        self.evaluator = Evaluator()
-    
+        self.evaluator = shared_evaluator()
+        self.lookup = seven_card_lookup()
 
+    @timed(HAND_EVALUATIONS)
     def best_hand_rank_eval(self, hand, board):
+        cards = sorted(hand + board)
+        if len(cards) < 5:
+            return self.best_hand_rank_eval_combinations(hand, board)
+
+        key = tuple(cards)
+        entry = hand_cache.get(key)
+        if entry is None:
+            score, flush_suit = self.lookup.evaluate(cards)
+            best_hand = self.lookup.best_hand(cards, score, flush_suit)
+
+            rank = self.evaluator.get_rank_class(score)
+            entry = (tuple(best_hand), self.evaluator.class_to_string(rank), score)
+            hand_cache.put(key, entry)
+
+        best_hand, rank_str, score = entry
+        return list(best_hand), rank_str, score
+
+    @timed(HAND_EVALUATIONS_MANY)
+    def best_hand_rank_eval_many(self, hands, board):
+        # best_hand_rank_eval for several hands on one board, with cache misses scored in one batch
+        if len(board) + 2 < 5:
+            return [self.best_hand_rank_eval(hand, board) for hand in hands]
+
+        results = [None] * len(hands)
+        missing = []
+        for i, hand in enumerate(hands):
+            entry = hand_cache.get(tuple(sorted(hand + board)))
+            if entry is None:
+                missing.append(i)
+            else:
+                results[i] = entry
+
+        if missing:
+            cards = [hands[i] + board for i in missing]
+            scores, rank_classes, best_indices = self.best_hand_rank_eval_batch(cards)
+            for j, i in enumerate(missing):
+                best_hand = tuple(sorted(cards[j][k] for k in best_indices[j]))
+                entry = (best_hand, self.evaluator.class_to_string(int(rank_classes[j])), int(scores[j]))
+                hand_cache.put(tuple(sorted(cards[j])), entry)
+                results[i] = entry
+
+        return [(list(best_hand), rank_str, score) for best_hand, rank_str, score in results]
+
+    def best_hand_rank_eval_batch(self, cards):
+        # cards: (N, 5-7) array of treys ints -> (scores, rank classes, (N, 5) indices of the best hand)
+        return self.lookup.evaluate_batch(cards)
+
+    def best_hand_rank_eval_combinations(self, hand, board):
         cards = sorted(hand + board)
         minimum = 10_000
         best_hand = None
@@ -0,0 +1,62 @@
+import math
+
+
+class LatencyHistogram:
+    # Log bucketed latencies: bucket i holds values in [BASE * GROWTH ** i,
+    # BASE * GROWTH ** (i + 1)), so every percentile is within ~9% of the true
+    # value whatever the range. Not thread safe, give every thread its own and
+    # merge them.
+    BASE = 1e-6
+    GROWTH = 2 ** 0.125
+    BUCKETS = 320
+
+    counts: list[int]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        i = int(math.log(seconds / self.BASE, self.GROWTH)) if seconds > self.BASE else 0
+        self.counts[min(i, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile (0-100)
+        if not self.count:
+            return 0.0
+        rank = math.ceil(p / 100 * self.count)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.BASE * self.GROWTH ** (i + 1), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
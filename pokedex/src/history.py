@@ -0,0 +1,246 @@
+import mmap
+import os
+import struct
+import threading
+
+from treys import Card
+
+from .player import Action
+from .poker import GameStage, Round
+from .wire import Reader, write_action, write_cards, write_str, write_varint
+
+# Append-only hand history. The file starts with a 5 byte header, then one
+# record per completed round, each prefixed with its u32 length so a reader can
+# skip hands without decoding them. Integers, strings, cards and actions use the
+# wire.py encodings.
+#
+# header:  4s magic, u8 version
+# record:  u32 length, varint small_blind, varint deck_seed, varint seats, seat*, cards board,
+#          (varint actions, (u8 seat, action)*) for preflop, flop, turn and river,
+#          varint pots, (varint amount, u8 winners, u8 seat*)*
+# seat:    str name, varint starting stack, cards hand
+MAGIC = b"PKHH"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+LENGTH = struct.Struct("<I")
+
+STAGES = [GameStage.PREFLOP, GameStage.FLOP, GameStage.TURN, GameStage.RIVER]
+
+
+def encode_hand(round: Round, paid) -> bytes:
+    # paid: the (pot, winners) list returned by Round.distribute_winnings
+    seats = {player: i for i, player in enumerate(round.seats)}
+
+    out = bytearray()
+    write_varint(out, round.small_blind)
+    write_varint(out, round.deck_seed)
+    write_varint(out, len(round.seats))
+    for player in round.seats:
+        write_str(out, player.name)
+        # the stack the player sat down with for this hand
+        write_varint(out, player.stack - round.winnings.get(player, 0) + round.pot.contributions.get(player, 0))
+        write_cards(out, player.hand())
+    write_cards(out, round.board)
+
+    for stage in STAGES:
+        actions = round.round_actions[stage]
+        write_varint(out, len(actions))
+        for round_action in actions:
+            out.append(seats[round_action.player])
+            write_action(out, round_action.action)
+
+    write_varint(out, len(paid))
+    for pot, winners in paid:
+        write_varint(out, pot)
+        out.append(len(winners))
+        out += bytes(seats[player] for player in winners)
+
+    return LENGTH.pack(len(out)) + out
+
+
+class HandRecord:
+    small_blind: int
+    deck_seed: int
+    seats: list[dict]
+    board: list[int]
+    actions: dict[GameStage, list[tuple[str, Action]]]
+    pots: list[tuple[int, list[str]]]
+
+    def __init__(self, small_blind, deck_seed, seats, board, actions, pots):
+        self.small_blind = small_blind
+        self.deck_seed = deck_seed
+        self.seats = seats
+        self.board = board
+        self.actions = actions
+        self.pots = pots
+
+    def to_dict(self):
+        return {
+            "smallBlind": self.small_blind,
+            "deckSeed": self.deck_seed,
+            "seats": [{**seat, "hand": [Card.int_to_str(card) for card in seat["hand"]]} for seat in self.seats],
+            "board": [Card.int_to_str(card) for card in self.board],
+            "actions": {stage.name: [{"player": name, "action": action.to_dict()} for name, action in actions]
+                        for stage, actions in self.actions.items() if actions},
+            "pots": [{"amount": amount, "winners": winners} for amount, winners in self.pots],
+        }
+
+    def __repr__(self):
+        res = ""
+        for stage, actions in self.actions.items():
+            if not actions:
+                continue
+
+            res += f"{stage.name}\n"
+            for name, action in actions:
+                res += f"{name}: {action}\n"
+
+            res += "\n"
+
+        return res
+
+
+def decode_hand(reader: Reader) -> HandRecord:
+    small_blind = reader.varint()
+    deck_seed = reader.varint()
+    seats = [{"name": reader.str(), "stack": reader.varint(), "hand": reader.cards()} for _ in range(reader.varint())]
+    names = [seat["name"] for seat in seats]
+    board = reader.cards()
+
+    actions = {}
+    for stage in STAGES:
+        actions[stage] = [(names[reader.u8()], reader.action()) for _ in range(reader.varint())]
+
+    pots = []
+    for _ in range(reader.varint()):
+        amount = reader.varint()
+        pots.append((amount, [names[reader.u8()] for _ in range(reader.u8())]))
+
+    return HandRecord(small_blind, deck_seed, seats, board, actions, pots)
+
+
+class HandHistoryWriter:
+    # Rounds are encoded when they are appended (the Round is reused by the
+    # next hand) but only written in batches: by the background thread every
+    # `interval` seconds or once `batch_size` hands are waiting, or inline by
+    # append when no thread was started.
+    path: str
+    batch_size: int
+    interval: float
+    pending: list[bytes]
+    hands: int
+
+    def __init__(self, path, batch_size=512, interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.hands = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+        self.closed = False
+
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+            self.file.flush()
+
+    def append(self, round: Round, paid):
+        record = encode_hand(round, paid)
+        with self.lock:
+            self.pending.append(record)
+            self.hands += 1
+            full = len(self.pending) >= self.batch_size
+
+        if full:
+            if self.thread is None:
+                self.flush()
+            else:
+                self.ready.set()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if batch:
+                self.file.write(b"".join(batch))
+                self.file.flush()
+
+    def start(self):
+        def write():
+            while not self.closed:
+                self.ready.wait(self.interval)
+                self.ready.clear()
+                self.flush()
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=write, name="hand-history", daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.closed = True
+        if self.thread is not None:
+            self.ready.set()
+            self.thread.join()
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HandHistory:
+    # Memory mapped reader: iterating decodes one hand at a time, so the log
+    # can be far larger than memory. A record cut short by a crash ends the
+    # iteration.
+    path: str
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not a hand history")
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} hand history")
+
+    def offsets(self):
+        # byte offset of every complete record
+        pos = HEADER.size
+        end = len(self.data)
+        while pos + LENGTH.size <= end:
+            (length,) = LENGTH.unpack_from(self.data, pos)
+            if pos + LENGTH.size + length > end:
+                return
+            yield pos
+            pos += LENGTH.size + length
+
+    def read(self, offset) -> HandRecord:
+        reader = Reader(self.data)
+        reader.pos = offset + LENGTH.size
+        return decode_hand(reader)
+
+    def __iter__(self):
+        for offset in self.offsets():
+            yield self.read(offset)
+
+    def count(self):
+        return sum(1 for _ in self.offsets())
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
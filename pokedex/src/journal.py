@@ -0,0 +1,172 @@
+import json
+import os
+import struct
+
+from .history import HandRecord
+from .player import Action, Player
+from .poker import Poker, Round
+from .wire import Reader, write_action, write_str, write_varint
+
+# Event-sourced table state. A table's journal is a snapshot of its Poker
+# (players, blinds, deck seed, the current Round and Pot) plus an append-only
+# log of everything that happened since. Recovery loads the snapshot and
+# replays the log through the normal Poker/Round methods; a new snapshot is
+# taken every `snapshot_every` events and the log starts over, so recovery
+# replays at most that many events however long the table has run.
+#
+#   {path}.snapshot      json {"generation": n, "poker": Poker.to_snapshot()}
+#   {path}.{n}.log       u32 length, u8 event, payload  (wire.py encodings)
+#
+# events: ROUND   new_round, deal and post_blinds
+#         ACTION  action, a Round.player_action
+#         PAYOUT  Round.distribute_winnings
+#         JOIN    str name, varint stack, a player sitting down
+ROUND = 1
+ACTION = 2
+PAYOUT = 3
+JOIN = 4
+
+LENGTH = struct.Struct("<I")
+
+
+def deal_round(poker: Poker) -> Round:
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+    return round
+
+
+def apply_event(poker: Poker, reader: Reader, event: int):
+    if event == ROUND:
+        deal_round(poker)
+    elif event == ACTION:
+        poker.round.player_action(reader.action())
+    elif event == PAYOUT:
+        poker.round.distribute_winnings()
+    elif event == JOIN:
+        poker.add_player(Player(reader.str(), reader.varint()))
+    else:
+        raise ValueError(f"Unknown journal event {event}")
+
+
+def read_events(path):
+    # (event, reader) per complete record, a record cut short by a crash ends the log
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as file:
+        data = file.read()
+
+    pos = 0
+    while pos + LENGTH.size <= len(data):
+        (length,) = LENGTH.unpack_from(data, pos)
+        if pos + LENGTH.size + length > len(data):
+            return
+        reader = Reader(data)
+        reader.pos = pos + LENGTH.size
+        yield reader.u8(), reader
+        pos += LENGTH.size + length
+
+
+class TableJournal:
+    path: str
+    snapshot_every: int
+    generation: int
+    events: int
+
+    def __init__(self, path, poker: Poker, snapshot_every=256, generation=0):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.generation = generation
+        self.events = 0
+        self.file = None
+        self.snapshot(poker)
+
+    def log_path(self, generation):
+        return f"{self.path}.{generation}.log"
+
+    def snapshot(self, poker: Poker):
+        # write the new snapshot first: a crash before the old log is removed
+        # leaves a snapshot that already includes everything in it
+        generation = self.generation + 1 if self.file else self.generation
+        tmp = f"{self.path}.snapshot.tmp"
+        with open(tmp, "w") as file:
+            json.dump({"generation": generation, "poker": poker.to_snapshot()}, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, f"{self.path}.snapshot")
+
+        if self.file:
+            self.file.close()
+            os.remove(self.log_path(self.generation))
+        self.generation = generation
+        self.file = open(self.log_path(generation), "wb")
+        self.events = 0
+
+    def append(self, poker: Poker, event: int, payload=b""):
+        self.file.write(LENGTH.pack(1 + len(payload)) + bytes([event]) + payload)
+        self.file.flush()
+        self.events += 1
+        if self.events >= self.snapshot_every:
+            self.snapshot(poker)
+
+    def round(self, poker: Poker):
+        self.append(poker, ROUND)
+
+    def action(self, poker: Poker, action: Action):
+        out = bytearray()
+        write_action(out, action)
+        self.append(poker, ACTION, bytes(out))
+
+    def payout(self, poker: Poker):
+        self.append(poker, PAYOUT)
+
+    def join(self, poker: Poker, player: Player):
+        out = bytearray()
+        write_str(out, player.name)
+        write_varint(out, player.stack)
+        self.append(poker, JOIN, bytes(out))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def delete(self):
+        # the table is gone for good
+        self.close()
+        for path in (f"{self.path}.snapshot", self.log_path(self.generation)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def recover(cls, path, snapshot_every=256, verbose=True) -> tuple[Poker, "TableJournal"]:
+        # the table as it was after its last logged event, and a journal to carry on with
+        with open(f"{path}.snapshot") as file:
+            state = json.load(file)
+
+        poker = Poker.from_snapshot(state["poker"], verbose)
+        generation = state["generation"]
+        for event, reader in read_events(f"{path}.{generation}.log"):
+            apply_event(poker, reader, event)
+
+        stale = f"{path}.{generation}.log"
+        journal = cls(path, poker, snapshot_every, generation + 1)
+        if os.path.exists(stale):
+            os.remove(stale)
+        return poker, journal
+
+
+def replay_hand(record: HandRecord, verbose=False) -> Round:
+    # deal a logged hand again from its deck seed and feed its actions back
+    # through Round.player_action, e.g. to investigate a dispute
+    players = [Player(seat["name"], seat["stack"]) for seat in record.seats]
+    round = Round(players, record.small_blind, verbose, record.deck_seed)
+    round.deal()
+    round.post_blinds()
+
+    for actions in record.actions.values():
+        for _, action in actions:
+            if action.action_type not in (Action.SMALL_BLIND, Action.BIG_BLIND):
+                round.player_action(action)
+
+    return round
@@ -0,0 +1,172 @@
+import numpy as np
+from treys import Card
+from treys.lookup import LookupTable
+
+SUITS = (1, 2, 4, 8)
+
+
+class SevenCardLookup:
+    # unsuited: prime product of the ranks of 5-7 cards -> best non-flush score
+    # flush: 13 bit rank mask of 5-7 suited cards -> best flush score
+    # score_primes: score -> prime product of the ranks of the 5 cards that make it
+    unsuited: dict[int, int]
+    flush: list[int]
+    score_primes: list[int]
+
+    # numpy copies of the tables above for batch evaluation
+    unsuited_keys: np.ndarray
+    unsuited_scores: np.ndarray
+    flush_scores: np.ndarray
+    score_primes_array: np.ndarray
+    score_classes: np.ndarray
+
+    def __init__(self):
+        table = LookupTable()
+
+        self.unsuited = dict(table.unsuited_lookup)
+        self.flush = [0] * (1 << 13)
+        self.score_primes = [0] * (LookupTable.MAX_HIGH_CARD + 1)
+
+        for prime, score in table.unsuited_lookup.items():
+            self.score_primes[score] = prime
+        for prime, score in table.flush_lookup.items():
+            self.score_primes[score] = prime
+
+        # five card hands straight from treys, then grow them one card at a time:
+        # the best 5 of n cards is the best 5 of one of its (n - 1) card subsets
+        fives = list(table.unsuited_lookup.items())
+        sixes = self._grow(fives)
+        sevens = self._grow(sixes.items())
+        self.unsuited.update(sixes)
+        self.unsuited.update(sevens)
+
+        for mask in range(1 << 13):
+            if mask.bit_count() == 5:
+                self.flush[mask] = table.flush_lookup[Card.prime_product_from_rankbits(mask)]
+        for bits in (6, 7):
+            for mask in range(1 << 13):
+                if mask.bit_count() != bits:
+                    continue
+                best = LookupTable.MAX_HIGH_CARD
+                for rank in range(13):
+                    if mask & (1 << rank):
+                        best = min(best, self.flush[mask ^ (1 << rank)])
+                self.flush[mask] = best
+
+        keys = sorted(self.unsuited)
+        self.unsuited_keys = np.array(keys, dtype=np.int64)
+        self.unsuited_scores = np.array([self.unsuited[key] for key in keys], dtype=np.int32)
+        # masks with fewer than 5 suited cards can never beat a real score
+        self.flush_scores = np.array(self.flush, dtype=np.int32)
+        self.flush_scores[self.flush_scores == 0] = LookupTable.MAX_HIGH_CARD + 1
+        self.score_primes_array = np.array(self.score_primes, dtype=np.int64)
+        self.score_classes = np.zeros(LookupTable.MAX_HIGH_CARD + 1, dtype=np.int8)
+        lower = 0
+        for max_score, rank_class in sorted(LookupTable.MAX_TO_RANK_CLASS.items()):
+            self.score_classes[lower:max_score + 1] = rank_class
+            lower = max_score + 1
+
+    def _grow(self, hands):
+        grown = {}
+        for prime, score in hands:
+            for rank_prime in Card.PRIMES:
+                key = prime * rank_prime
+                if score < grown.get(key, LookupTable.MAX_HIGH_CARD + 1):
+                    grown[key] = score
+        return grown
+
+    def evaluate(self, cards):
+        primes = 1
+        masks = [0] * 9
+        for card in cards:
+            primes *= card & 0xFF
+            masks[(card >> 12) & 0xF] |= card >> 16
+
+        score = self.unsuited[primes]
+        flush_suit = 0
+        for suit in SUITS:
+            mask = masks[suit]
+            if mask.bit_count() >= 5:
+                flush_score = self.flush[mask]
+                if flush_score < score:
+                    score = flush_score
+                    flush_suit = suit
+
+        return score, flush_suit
+
+    def best_hand(self, cards, score, flush_suit=0):
+        # picks the earliest card of every needed rank, which is the first
+        # combination of `cards` (in itertools.combinations order) scoring `score`
+        remaining = self.score_primes[score]
+        best = []
+        for card in cards:
+            if flush_suit and (card >> 12) & 0xF != flush_suit:
+                continue
+            prime = card & 0xFF
+            if remaining % prime == 0:
+                remaining //= prime
+                best.append(card)
+                if len(best) == 5:
+                    break
+
+        return best
+
+    def score_keys(self, primes, suit_masks):
+        # best scores straight from prime products and the rank masks of each suit
+        scores = self.unsuited_scores[np.searchsorted(self.unsuited_keys, primes)]
+        for masks in suit_masks:
+            scores = np.minimum(scores, self.flush_scores[masks])
+        return scores
+
+    def batch_keys(self, cards):
+        # the prime product of every row and its rank mask in each suit, the keys score_keys takes
+        suits = (cards >> 12) & 0xF
+        rank_bits = cards >> 16
+        primes = np.prod(cards & 0xFF, axis=1)
+        return primes, [np.bitwise_or.reduce(np.where(suits == suit, rank_bits, 0), axis=1) for suit in SUITS]
+
+    def score_batch(self, cards):
+        # scores only, for callers that don't need the best five cards
+        return self.score_keys(*self.batch_keys(np.asarray(cards, dtype=np.int64)))
+
+    def evaluate_batch(self, cards):
+        cards = np.asarray(cards, dtype=np.int64)
+        if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+            raise ValueError("Cards must be an (N, 5-7) array")
+
+        order = np.argsort(cards, axis=1, kind="stable")
+        cards = np.take_along_axis(cards, order, axis=1)
+        primes = cards & 0xFF
+        suits = (cards >> 12) & 0xF
+
+        keys, suit_masks = self.batch_keys(cards)
+        scores = self.unsuited_scores[np.searchsorted(self.unsuited_keys, keys)]
+        flush_suits = np.zeros(len(cards), dtype=np.int64)
+        for suit, masks in zip(SUITS, suit_masks):
+            flush_scores = self.flush_scores[masks]
+            better = flush_scores < scores
+            scores = np.where(better, flush_scores, scores)
+            flush_suits = np.where(better, suit, flush_suits)
+
+        # same earliest-card-per-rank walk as best_hand, one column at a time
+        remaining = self.score_primes_array[scores]
+        taken = np.zeros(len(cards), dtype=np.int64)
+        selected = np.zeros(cards.shape, dtype=bool)
+        for col in range(cards.shape[1]):
+            prime = primes[:, col]
+            take = ((flush_suits == 0) | (suits[:, col] == flush_suits)) & (remaining % prime == 0) & (taken < 5)
+            remaining = np.where(take, remaining // prime, remaining)
+            taken += take
+            selected[:, col] = take
+
+        best_indices = order[selected].reshape(len(cards), 5)
+        return scores, self.score_classes[scores], best_indices
+
+
+_lookup = None
+
+def seven_card_lookup():
+    global _lookup
+    if _lookup is None:
+        _lookup = SevenCardLookup()
+    return _lookup
@@ -0,0 +1,227 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Process wide metrics in the Prometheus text format. Counters and histograms
+# keep one shard per thread, so recording never takes a lock (only a thread's
+# first record does, to register its shard) and a scrape sums the shards.
+# Nothing is recorded until REGISTRY.enable(): until then the instrumented
+# methods are the plain methods, so leaving the instrumentation in costs nothing.
+
+# seconds, from 1us to 10s
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Sharded:
+    # one list of numbers per thread, summed on read; the shards of threads
+    # that have exited are folded into one when a new thread registers
+    size: int
+
+    def __init__(self, size):
+        self.size = size
+        self.shards = []
+        self.retired = [0] * size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def shard(self) -> list:
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = [0] * self.size
+            with self.lock:
+                alive = []
+                for thread, values in self.shards:
+                    if thread.is_alive():
+                        alive.append((thread, values))
+                    else:
+                        self.retired = [a + b for a, b in zip(self.retired, values)]
+                alive.append((threading.current_thread(), shard))
+                self.shards = alive
+        return shard
+
+    def totals(self) -> list:
+        with self.lock:
+            shards = [self.retired] + [values for _, values in self.shards]
+        return [sum(values) for values in zip(*shards)]
+
+
+class Counter:
+    name: str
+    help: str
+    labels: dict
+
+    def __init__(self, name, help, labels: dict = None, registry=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.values = Sharded(1)
+        (registry or REGISTRY).register(self)
+
+    def inc(self, amount=1):
+        self.values.shard()[0] += amount
+
+    def value(self):
+        return self.values.totals()[0]
+
+    def samples(self):
+        return [(self.name + _labels(self.labels), self.value())]
+
+
+class Histogram:
+    name: str
+    help: str
+    labels: dict
+    buckets: tuple[float, ...]
+
+    def __init__(self, name, help, labels: dict = None, buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        # a count per bucket, one for +Inf, then the sum
+        self.values = Sharded(len(self.buckets) + 2)
+        (registry or REGISTRY).register(self)
+
+    def observe(self, value):
+        shard = self.values.shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def count(self):
+        return sum(self.values.totals()[:-1])
+
+    def samples(self):
+        totals = self.values.totals()
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), totals):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            samples.append((self.name + "_bucket" + _labels({**self.labels, "le": le}), cumulative))
+        samples.append((self.name + "_sum" + _labels(self.labels), totals[-1]))
+        samples.append((self.name + "_count" + _labels(self.labels), cumulative))
+        return samples
+
+
+class Gauge:
+    # read from `value` at scrape time
+    name: str
+    help: str
+    labels: dict
+
+    def __init__(self, name, help, value: Callable[[], float], labels: dict = None, registry=None):
+        self.name = name
+        self.help = help
+        self.value = value
+        self.labels = labels or {}
+        (registry or REGISTRY).register(self)
+
+    def samples(self):
+        return [(self.name + _labels(self.labels), self.value())]
+
+
+class Registry:
+    enabled: bool
+
+    TYPES = {Counter: "counter", Histogram: "histogram", Gauge: "gauge"}
+
+    def __init__(self):
+        self.enabled = False
+        self.metrics = []
+        # (class, name, plain method, recording method)
+        self.instrumented = []
+        self.lock = threading.Lock()
+
+    def enable(self):
+        for owner, name, _, wrapped in self.instrumented:
+            setattr(owner, name, wrapped)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        for owner, name, fn, _ in self.instrumented:
+            setattr(owner, name, fn)
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        # the Prometheus text exposition format, metrics sharing a name under one HELP/TYPE
+        with self.lock:
+            metrics = list(self.metrics)
+
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family[0].help}")
+            lines.append(f"# TYPE {name} {self.TYPES[type(family[0])]}")
+            for metric in family:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Instrumented:
+    # method decorator: the class keeps the plain method, the recording one is
+    # swapped in by REGISTRY.enable()
+    def __init__(self, fn, wrapped):
+        self.fn = fn
+        self.wrapped = wrapped
+
+    def __set_name__(self, owner, name):
+        setattr(owner, name, self.fn)
+        REGISTRY.instrumented.append((owner, name, self.fn, self.wrapped))
+        if REGISTRY.enabled:
+            setattr(owner, name, self.wrapped)
+
+
+def timed(histogram: Histogram):
+    # records how long every call takes
+    def decorate(fn):
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return Instrumented(fn, timed_fn)
+    return decorate
+
+
+def counted(counter: Counter):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def counted_fn(*args, **kwargs):
+            counter.inc()
+            return fn(*args, **kwargs)
+        return Instrumented(fn, counted_fn)
+    return decorate
+
+
+# the engine's hot paths, the servers add their own
+HAND_EVALUATIONS = Histogram("poker_hand_evaluation_seconds", "HandEvaluator.best_hand_rank_eval calls",
+                             {"method": "best_hand_rank_eval"})
+HAND_EVALUATIONS_MANY = Histogram("poker_hand_evaluation_seconds", "HandEvaluator.best_hand_rank_eval calls",
+                                  {"method": "best_hand_rank_eval_many"})
+PLAYER_ACTIONS = Histogram("poker_player_action_seconds", "Round.player_action calls")
+SPLIT_POTS = Counter("poker_split_pot_total", "Side pots built", {"method": "split_pot"})
+FINAL_POTS = Counter("poker_split_pot_total", "Side pots built", {"method": "final_pots"})
+# hands per second is rate(poker_hands_total[1m]) on the Prometheus side, so every scraper sees the full rate
+HANDS = Counter("poker_hands_total", "Hands paid out by Round.distribute_winnings")
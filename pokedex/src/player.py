@@ -12,6 +12,8 @@ class ActionType(Enum):
     BIG_BLIND = 6
 
 class Action:
+    __slots__ = ("action_type", "amount", "amount_to_call", "all_in")
+
     # type declarations
     FOLD = ActionType.FOLD
     CALL = ActionType.CALL
@@ -27,13 +29,15 @@ class Action:
         self.amount_to_call = amount_to_call
         self.all_in = all_in
 
-    @classmethod
-    def fold(cls):
-        return cls(Action.FOLD)
+    # fold and check return one shared Action instance each (never a
+    # subclass), so actions are never modified after construction
+    @staticmethod
+    def fold():
+        return FOLD_ACTION
 
-    @classmethod
-    def check(cls):
-        return cls(Action.CHECK)
+    @staticmethod
+    def check():
+        return CHECK_ACTION
     
     @classmethod
     def call(cls, amount_to_call=None):
@@ -56,6 +60,19 @@ class Action:
 
         return cls(action_type, amount, amount_to_call)
     
+    def to_snapshot(self):
+        return [self.action_type.value, self.amount, self.amount_to_call, self.all_in]
+
+    @classmethod
+    def from_snapshot(cls, state):
+        action_type, amount, amount_to_call, all_in = state
+        # the shared instances are Actions, a subclass gets its own
+        if cls is Action and action_type == ActionType.FOLD.value and not all_in:
+            return FOLD_ACTION
+        if cls is Action and action_type == ActionType.CHECK.value and not all_in:
+            return CHECK_ACTION
+        return cls(ActionType(action_type), amount, amount_to_call, all_in)
+
     def to_dict(self):
         return {
             "type": self.action_type.name,
@@ -84,7 +101,12 @@ class Action:
         
         return "UNKNOWN Action"
 
+FOLD_ACTION = Action(ActionType.FOLD)
+CHECK_ACTION = Action(ActionType.CHECK)
+
 class RoundProfile:
+    __slots__ = ("bet", "hand", "best_hand", "folded", "last_action", "all_in")
+
     def __init__(self):
         self.bet = 0
         self.hand = None
@@ -103,8 +125,32 @@ class RoundProfile:
         self.best_hand = None
         self.folded = False
         self.last_action = None
+        self.all_in = False
+
+    def to_snapshot(self):
+        return {
+            "bet": self.bet,
+            "hand": self.hand,
+            "bestHand": self.best_hand,
+            "folded": self.folded,
+            "lastAction": self.last_action.to_snapshot() if self.last_action else None,
+            "allIn": self.all_in,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        rp = cls()
+        rp.bet = state["bet"]
+        rp.hand = state["hand"]
+        rp.best_hand = state["bestHand"]
+        rp.folded = state["folded"]
+        rp.last_action = Action.from_snapshot(state["lastAction"]) if state["lastAction"] else None
+        rp.all_in = state["allIn"]
+        return rp
 
 class Player:
+    __slots__ = ("name", "stack", "rp")
+
     def __init__(self, name, stack=100):
         self.name = name
         self.stack = stack
@@ -146,10 +192,10 @@ class Player:
     
     def fold(self):
         self.rp.folded = True
-        self.rp.last_action = Action(Action.FOLD)
+        self.rp.last_action = FOLD_ACTION
     
     def check(self):
-        self.rp.last_action = Action(Action.CHECK)
+        self.rp.last_action = CHECK_ACTION
     
     def call(self, amount):
         current_bet = self.current_round_bet()
@@ -237,6 +283,15 @@ class Player:
             "action": self.rp.last_action.to_dict() if self.rp.last_action else None
         }
     
+    def to_snapshot(self):
+        return {"name": self.name, "stack": self.stack, "round": self.rp.to_snapshot()}
+
+    @classmethod
+    def from_snapshot(cls, state):
+        player = cls(state["name"], state["stack"])
+        player.rp = RoundProfile.from_snapshot(state["round"])
+        return player
+
     def __repr__(self):
         res = f"{self.name:<15} {self.stack:<5}"
         if self.rp.hand:
@@ -1,11 +1,14 @@
 import random
 from enum import Enum
-from treys import Card, Deck
+from treys import Card
 
+from .deck import Deck, mix_seed
 from .hand import Hand, HandEvaluator
+from .metrics import counted, timed, HANDS, PLAYER_ACTIONS
 
 from .player import Player, Action
 from .pot import Pot
+from .preflop import preflop_table
 
 
 class GameStage(Enum):
@@ -19,6 +22,8 @@ class RoundAction:
     player: Player
     action: Action
 
+    __slots__ = ("player", "action")
+
     def __init__(self, player, action):
         self.player = player
         self.action = action
@@ -26,11 +31,20 @@ class RoundAction:
     def __repr__(self):
         return f"{self.player.name}: {self.action}"
 
+def next_seat(mask, seat):
+    # the first seat after `seat`, wrapping around, whose bit is set in mask
+    later = mask >> (seat + 1)
+    if later:
+        return seat + 1 + (later & -later).bit_length() - 1
+    return (mask & -mask).bit_length() - 1
+
 class Round:
     # type definitions
     pot: Pot
-    players: list[Player]
+    seats: list[Player]
+    seat_of: dict[Player, int]
     deck: Deck
+    deck_seed: int
     board: list[int]
     small_blind: int
     big_blind: int
@@ -39,25 +53,51 @@ class Round:
     small_blind_player: Player
     big_blind_player: Player
 
+    # seat bitmasks (bit i is seats[i]): not folded, all in, done acting this betting round
+    in_hand: int
+    all_in_seats: int
+    complete: int
+    # seats whose player (cards, stack or last action) changed since take_changed
+    changed: int
+    seat_index: int
+    # bumped by every change made through the Round, keys the cached legal actions
+    version: int
+
     all_ins: list[Player]
+    # chips paid to each winner by distribute_winnings, odd chips included
+    winnings: dict[Player, int]
     round_actions: dict[GameStage, list[RoundAction]]
-    action_complete_players: set[Player]
+    showdown_cache: dict[Player, tuple[list[int], str, int]]
+    verbose: bool
 
-    def __init__(self, players: list[Player], small_blind):
+    def __init__(self, players: list[Player], small_blind, verbose=True, deck_seed=None, rng: random.Random = None):
         self.pot = Pot(small_blind*2)
-        self.deck = Deck()
+        # recorded so the deck order can be dealt again
+        self.deck_seed = deck_seed if deck_seed is not None else random.getrandbits(64)
+        self.deck = Deck(self.deck_seed, rng)
         self.board = []
         self.small_blind = small_blind
         self.big_blind = small_blind * 2
         self.stage = GameStage.PREFLOP
         self.evaluator = HandEvaluator()
 
-        self.players = players
-        self.small_blind_player = self.players[0]
-        self.big_blind_player = self.players[1]
-        self.player_index = 0
+        # everyone dealt in, in blind order; players drops those who fold
+        self.seats = list(players)
+        self.seat_of = {player: i for i, player in enumerate(self.seats)}
+        self.small_blind_player = self.seats[0]
+        self.big_blind_player = self.seats[1]
+        self.seat_index = 0
+
+        self.in_hand = (1 << len(self.seats)) - 1
+        self.all_in_seats = 0
+        self.complete = 0
+        self.changed = self.in_hand
+        self.version = 0
+        self.legal_actions = None
+        self.remaining = None
 
         self.all_ins = []
+        self.winnings = {}
         self.round_actions = {
             GameStage.PREFLOP: [],
             GameStage.FLOP: [],
@@ -65,7 +105,25 @@ class Round:
             GameStage.RIVER: []
         }
 
-        self.action_complete_players = set()
+        # best hand, rank and score per player for the current board
+        self.showdown_cache = {}
+        self.verbose = verbose
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    @property
+    def players(self) -> list[Player]:
+        # players still in the hand, in seat order, only rebuilt after a fold
+        if self.remaining is None:
+            self.remaining = [player for i, player in enumerate(self.seats) if self.in_hand >> i & 1]
+        return self.remaining
+
+    def _all_in(self, player: Player):
+        self.pot.all_in(player)
+        self.all_ins.append(player)
+        self.all_in_seats |= 1 << self.seat_of[player]
 
     def _bet(self, player: Player, amount):
         all_in = player.bet(amount)
@@ -74,45 +132,69 @@ class Round:
         self.pot.set_last_bet_raise(player, amount)
 
         if all_in:
-            self.pot.split_pot()
-            self.all_ins.append(player)
+            self._all_in(player)
 
     def post_blinds(self):
+        self.version += 1
         sb = self.small_blind_player
         bb = self.big_blind_player
 
-        sb.post_small_blind(self.small_blind)
-        bb.post_big_blind(self.big_blind)
+        # a player short of a blind posts the rest of their stack and is all in,
+        # everyone else still has to call the full big blind
+        sb_amount = min(self.small_blind, sb.stack)
+        bb_amount = min(self.big_blind, bb.stack)
+        sb.post_small_blind(sb_amount)
+        bb.post_big_blind(bb_amount)
 
         self.pot.set_last_bet_raise(bb, self.big_blind)
-
-        self.pot.add(sb, self.small_blind)
-        self.pot.add(bb, self.big_blind)
-
-        self.add_action(sb, Action(Action.SMALL_BLIND, self.small_blind))
-        self.add_action(bb, Action(Action.BIG_BLIND, self.big_blind))
-
-        self.player_index = 2 if len(self.players) > 2 else 0
+        self.changed |= 1 << self.seat_of[sb] | 1 << self.seat_of[bb]
+
+        self.pot.add(sb, sb_amount)
+        self.pot.add(bb, bb_amount)
+
+        self.add_action(sb, Action(Action.SMALL_BLIND, sb_amount))
+        self.add_action(bb, Action(Action.BIG_BLIND, bb_amount))
+
+        for player in (sb, bb):
+            if player.stack == 0:
+                player.rp.all_in = True
+                self._all_in(player)
+        self.complete = self.all_in_seats
+
+        # first to act after the big blind, the small blind heads up
+        can_act = self.in_hand & ~self.all_in_seats
+        if can_act:
+            self.seat_index = next_seat(can_act, 1)
+        # nobody left who could bet, or only one player who already matches every bet
+        if (can_act.bit_count() == 0 or
+            (can_act.bit_count() == 1 and
+             self.seats[self.seat_index].current_round_bet() >= max(sb_amount, bb_amount))):
+            self.set_stage(GameStage.ROUND_OVER)
     
     def get_current_player(self):
-        return self.players[self.player_index]
+        return self.seats[self.seat_index]
     
     def get_current_player_and_actions(self):
+        # the same lists are returned until the round changes, don't modify them
+        if self.legal_actions is not None and self.legal_actions[0] == self.version:
+            return self.legal_actions[1], self.legal_actions[2]
+
         player = self.get_current_player()
         actions = []
         amount_to_call = player.amount_to_call(self.pot.call_amount())
 
         if self.betting_round_over():
+            self.legal_actions = (self.version, player, [])
             return player, []
 
         if not self.pot.betting_started:
-            actions = [Action(Action.CHECK), Action(Action.BET, self.pot.minimum_bet)]
+            actions = [Action.check(), Action.bet(self.pot.minimum_bet)]
         else:
             if (amount_to_call == 0 
                 and player == self.big_blind_player 
                 and self.stage == GameStage.PREFLOP
                 and player.last_action_was(Action.BIG_BLIND)):
-                actions = [Action(Action.CHECK), Action.raise_bet(self.pot.get_minimum_raise())]
+                actions = [Action.check(), Action.raise_bet(self.pot.get_minimum_raise())]
             elif amount_to_call > 0:
                 actions = [Action.fold(), Action.call(amount_to_call)]
                 player_full_raised = player.current_round_bet() != self.pot.last_full_raise
@@ -126,8 +208,10 @@ class Round:
             else:
                 actions = [Action.check(), Action.bet(self.pot.minimum_bet)]
         
+        self.legal_actions = (self.version, player, actions)
         return player, actions
 
+    @timed(PLAYER_ACTIONS)
     def player_action(self, action: Action):
         if self.betting_round_over():
             raise ValueError("Betting round is over")
@@ -137,11 +221,10 @@ class Round:
         if not any([action.action_type == a.action_type for a in actions]):
             raise ValueError(f"Invalid action {action} for player {player.name}")
         
+        self.version += 1
+        self.changed |= 1 << self.seat_of[player]
         if action.action_type == Action.FOLD:
             self._fold(player)
-            # remove player from list
-            self.players = [player for player in self.players if not player.folded()]
-            self.player_index -= 1
         elif action.action_type == Action.CALL:
             self._call(player)
         elif action.action_type == Action.RAISE:
@@ -155,27 +238,30 @@ class Round:
     
         self.add_action(player, player.last_action())
 
+        in_hand = self.in_hand.bit_count()
+        all_ins = self.all_in_seats.bit_count()
+        complete = self.complete.bit_count()
+
         # move to next round if all players have folded
-        if len(self.players) == 1:
+        if in_hand == 1:
             self.stage = GameStage.ROUND_OVER
             return
         
-        print("trial")
-        print(len(self.players), len(self.all_ins), len(self.action_complete_players))
-        if (len(self.players) == len(self.all_ins) or
-            (len(self.players) == len(self.action_complete_players) and
-            len(self.players) - len(self.all_ins) == 1)):
-            print('Fuck')
+        self.log("trial")
+        self.log(in_hand, all_ins, complete)
+        if (in_hand == all_ins or
+            (in_hand == complete and
+            in_hand - all_ins == 1)):
+            self.log('Fuck')
             self.set_stage(GameStage.ROUND_OVER)
             return
 
-        if len(self.action_complete_players) == len(self.players):
+        if complete == in_hand:
             self._next_stage()
             return 
 
-        np = self._next_player()
-        while np.all_in():
-            np = self._next_player()
+        # next seat still in the hand and not all in
+        self.seat_index = next_seat(self.in_hand & ~self.all_in_seats, self.seat_index)
 
 
     def _raise(self, player: Player, amount):
@@ -187,8 +273,7 @@ class Round:
         self.pot.add(player, amount_raised)
 
         if all_in:
-            self.pot.split_pot()
-            self.all_ins.append(player)
+            self._all_in(player)
     
     def _call(self, player: Player):
         call_amount = self.pot.call_amount()
@@ -197,32 +282,30 @@ class Round:
         self.pot.add(player, amount_to_call)
 
         if all_in:
-            self.pot.split_pot()
-            self.all_ins.append(player)
+            self._all_in(player)
     
     def _fold(self, player: Player):
         player.fold()
+        self.in_hand &= ~(1 << self.seat_of[player])
+        self.remaining = None
     
     def _check(self, player: Player):
         player.check()
 
     def deal(self):
+        self.version += 1
+        self.changed |= self.in_hand
         for player in self.players:
             player.set_cards(self.deck.draw(2))
 
-    def _next_player(self):
-        self.player_index += 1
-        if self.player_index == len(self.players):
-            self.player_index = 0
-        
-        return self.players[self.player_index]
-
     def _next_stage(self):
         if self.stage == GameStage.RIVER or self.stage == GameStage.ROUND_OVER:
             self.stage = GameStage.ROUND_OVER
             return
 
+        self.version += 1
         self.stage = GameStage(self.stage.value + 1)
+        self.showdown_cache.clear()
         if self.stage == GameStage.FLOP:
             self.board += self.deck.draw(3)
         elif self.stage == GameStage.TURN:
@@ -230,16 +313,16 @@ class Round:
         elif self.stage == GameStage.RIVER:
             self.board += self.deck.draw(1)
         
-        self.player_index = 0
-        if len(self.players) != len(self.all_ins):
-            cplayer = self.get_current_player()
-            while cplayer.all_in():
-                cplayer = self._next_player()
+        # first seat still in the hand that is not all in, if there is one
+        can_act = self.in_hand & ~self.all_in_seats
+        first = can_act or self.in_hand
+        self.seat_index = (first & -first).bit_length() - 1
 
         for player in self.players:
             player.next_stage()
+        self.changed |= self.in_hand
         
-        self.action_complete_players = {player for player in self.players if player.all_in()}
+        self.complete = self.all_in_seats
         self.pot.next_stage()
 
         # remaining_players = [player for player in self.players if not player.all_in()]
@@ -247,13 +330,18 @@ class Round:
 
     def set_stage(self, stage: GameStage):
         stage_jumps = stage.value - self.stage.value
-        print(stage_jumps)
+        self.log(stage_jumps)
         if stage_jumps < 0:
             raise ValueError("Cannot go back to previous stage")
         
         for _ in range(stage_jumps):
             self._next_stage()
-        print(self.stage)
+        self.log(self.stage)
+
+    def take_changed(self):
+        # the changed seats bitmask, cleared for the next caller
+        changed, self.changed = self.changed, 0
+        return changed
 
     def betting_round_over(self):
         return self.stage == GameStage.ROUND_OVER
@@ -273,10 +361,10 @@ class Round:
 
     def add_action(self, player: Player, action: Action):
         if action.action_type == Action.BET or action.action_type == Action.RAISE:
-            all_ins = [p for p in self.players if p.all_in()]
-            self.action_complete_players = set(all_ins + [player])
+            # everyone else has to act again, except those all in
+            self.complete = self.all_in_seats | 1 << self.seat_of[player]
         elif action.action_type == Action.CALL or action.action_type == Action.CHECK:
-            self.action_complete_players.add(player)
+            self.complete |= 1 << self.seat_of[player]
 
         self.round_actions[self.stage].append(RoundAction(player, action))
 
@@ -284,9 +372,15 @@ class Round:
         return self.round_actions[self.stage]
     
     def get_hand_rankings(self):
+        missing = [player for player in self.players if player not in self.showdown_cache]
+        if missing:
+            results = self.evaluator.best_hand_rank_eval_many([player.hand() for player in missing], self.board)
+            for player, result in zip(missing, results):
+                self.showdown_cache[player] = result
+
         unique_hands: dict[int, Hand] = {}
         for player in self.players:
-            hand, rank, eval = self.evaluator.best_hand_rank_eval(player.hand(), self.board)
+            hand, rank, eval = self.showdown_cache[player]
             if eval not in unique_hands:
                 unique_hands[eval] = (Hand(hand, rank, eval), [])
             unique_hands[eval][1].append(player)
@@ -298,7 +392,7 @@ class Round:
             raise ValueError("Cannot reveal cards before the river")
     
         if len(self.board) < 5:
-            print(f"Winner\n{self.players[0]}")
+            self.log(f"Winner\n{self.players[0]}")
             return [self.players[0]], None, None
         
         winners = []
@@ -311,18 +405,26 @@ class Round:
 
         winning_rank = winning_hand.rank
         winning_cards = winning_hand.cards
-        print(f"Winner: {', '.join([player.name for player in winners])}")
+        self.log(f"Winner: {', '.join([player.name for player in winners])}")
 
         return winners, winning_cards, winning_rank
     
+    @counted(HANDS)
     def distribute_winnings(self):
         if not self.betting_round_over():
             raise ValueError("Cannot distribute winnings before the river")
+        self.version += 1
         pots = self.pot.final_pots()
-        player_rankings = [x[1] for x in self.get_hand_rankings()]
+        if len(self.players) == 1:
+            # everyone else folded, there is nothing to evaluate
+            player_rankings = [self.players]
+        else:
+            player_rankings = [x[1] for x in self.get_hand_rankings()]
         pot_winners = []
 
         for pot, eligible_players in pots:
+            # chips everyone eligible folded on, like a small blind's over a short big blind, go to the best hand left
+            eligible_players = eligible_players or set(self.players)
             pot_winner = []
             for players in player_rankings:
                 for player in players:
@@ -332,13 +434,21 @@ class Round:
                     break
             pot_winners.append(pot_winner)
         
+        paid = []
         for i, (pot, _) in enumerate(pots):
             if pot == 0:
                 continue
-            print(f"Pot {i+1} ({pot}): {', '.join([player.name for player in pot_winners[i]])}")
-            split = pot // len(pot_winners[i])
-            for player in pot_winners[i]:
-                player.win(split)
+            self.log(f"Pot {i+1} ({pot}): {', '.join([player.name for player in pot_winners[i]])}")
+            split, odd = divmod(pot, len(pot_winners[i]))
+            # odd chips go one each to the first winners after the button
+            for j, player in enumerate(sorted(pot_winners[i], key=self.seat_of.__getitem__)):
+                amount = split + (j < odd)
+                player.win(amount)
+                self.winnings[player] = self.winnings.get(player, 0) + amount
+                self.changed |= 1 << self.seat_of[player]
+            paid.append((pot, pot_winners[i]))
+
+        return paid
 
 
     def str_actions(self):
@@ -369,6 +479,10 @@ class Round:
             "actions": [action.to_dict() for action in actions],
         }
 
+        table = preflop_table()
+        if table is not None and 1 < len(self.players) <= table.max_opponents + 1:
+            turn["preflopEquity"] = table.equity(player.hand(), len(self.players) - 1)
+
         players = self.players
 
         game_state = {
@@ -383,6 +497,62 @@ class Round:
 
         return game_state
     
+    def to_snapshot(self, seats: dict[Player, int]):
+        # players are stored as their index in `seats`, the table's player list
+        return {
+            "deckSeed": self.deck_seed,
+            "dealt": self.deck.dealt(),
+            "board": self.board,
+            "smallBlind": self.small_blind,
+            "stage": self.stage.value,
+            "seats": [seats[player] for player in self.seats],
+            "smallBlindPlayer": seats[self.small_blind_player],
+            "bigBlindPlayer": seats[self.big_blind_player],
+            "seatIndex": self.seat_index,
+            "inHand": self.in_hand,
+            "allInSeats": self.all_in_seats,
+            "complete": self.complete,
+            "allIns": [seats[player] for player in self.all_ins],
+            "actions": {stage.name: [[seats[a.player], a.action.to_snapshot()] for a in actions]
+                        for stage, actions in self.round_actions.items()},
+            "pot": self.pot.to_snapshot(seats),
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, players: list[Player], verbose=True):
+        round = cls.__new__(cls)
+        round.deck_seed = state["deckSeed"]
+        # deal the same cards again to put the deck's generator where it was
+        round.deck = Deck(round.deck_seed)
+        round.deck.draw(state["dealt"])
+        round.board = list(state["board"])
+        round.small_blind = state["smallBlind"]
+        round.big_blind = round.small_blind * 2
+        round.stage = GameStage(state["stage"])
+        round.evaluator = HandEvaluator()
+        round.seats = [players[i] for i in state["seats"]]
+        round.seat_of = {player: i for i, player in enumerate(round.seats)}
+        round.small_blind_player = players[state["smallBlindPlayer"]]
+        round.big_blind_player = players[state["bigBlindPlayer"]]
+        round.seat_index = state["seatIndex"]
+        round.in_hand = state["inHand"]
+        round.all_in_seats = state["allInSeats"]
+        round.complete = state["complete"]
+        round.changed = (1 << len(round.seats)) - 1
+        round.version = 0
+        round.legal_actions = None
+        round.remaining = None
+        round.all_ins = [players[i] for i in state["allIns"]]
+        round.winnings = {}
+        round.round_actions = {
+            GameStage[stage]: [RoundAction(players[i], Action.from_snapshot(action)) for i, action in actions]
+            for stage, actions in state["actions"].items()
+        }
+        round.showdown_cache = {}
+        round.verbose = verbose
+        round.pot = Pot.from_snapshot(state["pot"], players)
+        return round
+
     def __repr__(self):
         res = f"Stage: {self.stage.name.capitalize()}\n"
         res += f"Board: {Card.ints_to_pretty_str(self.board)}\n\n"
@@ -397,13 +567,24 @@ class Poker:
     big_blind: int
     round: Round
     small_blind_index: int
+    verbose: bool
+    seed: int
+    hands: int
+    rng: random.Random
 
-    def __init__(self, players: list[Player]=[], small_blind=10):
+    def __init__(self, players: list[Player]=[], small_blind=10, verbose=True, seed=None):
         self.players = players
         self.small_blind = small_blind
         self.big_blind = 2*small_blind
         self.round = None
         self.small_blind_index = 0
+        self.verbose = verbose
+        # every round's deck order follows from the seed and the hand number,
+        # so any round can be dealt again
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.hands = 0
+        # one generator for all of this table's decks, reseeded every hand
+        self.rng = random.Random()
 
     def setup_game(self, players, small_blind):
         self.players = players
@@ -431,13 +612,38 @@ class Poker:
             player.reset()
 
         round_players = self.players[self.small_blind_index:] + self.players[:self.small_blind_index]
-        new_round =  Round(round_players, self.small_blind)
+        new_round =  Round(round_players, self.small_blind, self.verbose, self.deck_seed(self.hands), self.rng)
+        self.hands += 1
         self.round = new_round
 
         self._next_small_blind()
 
         return new_round
     
+    def deck_seed(self, hand):
+        return mix_seed(self.seed, hand)
+
+    def to_snapshot(self):
+        seats = {player: i for i, player in enumerate(self.players)}
+        return {
+            "players": [player.to_snapshot() for player in self.players],
+            "smallBlind": self.small_blind,
+            "smallBlindIndex": self.small_blind_index,
+            "seed": self.seed,
+            "hands": self.hands,
+            "round": self.round.to_snapshot(seats) if self.round else None,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, verbose=True):
+        players = [Player.from_snapshot(player) for player in state["players"]]
+        poker = cls(players=players, small_blind=state["smallBlind"], verbose=verbose, seed=state["seed"])
+        poker.small_blind_index = state["smallBlindIndex"]
+        poker.hands = state["hands"]
+        if state["round"] is not None:
+            poker.round = Round.from_snapshot(state["round"], players, verbose)
+        return poker
+
     def _next_small_blind(self):
         self.small_blind_index += 1
         if self.small_blind_index == len(self.players):
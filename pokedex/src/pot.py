@@ -1,3 +1,6 @@
+from bisect import bisect_right
+
+from .metrics import counted, FINAL_POTS, SPLIT_POTS
 from .player import Player
 
 class Pot:
@@ -11,6 +14,16 @@ class Pot:
     last_full_raise: int
     contributions: dict[Player, int]
 
+    # side pot ledger, one layer per all-in: layer i holds the chips between
+    # caps[i - 1] and caps[i] and the players who put in at least caps[i]
+    caps: list[int]
+    layer_amounts: list[int]
+    layer_players: list[set[Player]]
+
+    __slots__ = ("amount", "side_pots", "last_bet_raise", "min_raise_amount", "betting_started",
+                 "current_round_bet", "minimum_bet", "last_full_raise", "contributions",
+                 "caps", "layer_amounts", "layer_players")
+
     def __init__(self, minimum_bet=0):
         self.amount = 0
         self.side_pots = []
@@ -22,16 +35,73 @@ class Pot:
         self.last_full_raise = 0
 
         self.contributions = {}
+        self.caps = []
+        self.layer_amounts = []
+        self.layer_players = []
 
 
     def add(self, player: Player, amount):
-        if player not in self.contributions:
-            self.contributions[player] = 0
-        self.contributions[player] += amount
+        before = self.contributions.get(player, 0)
+        after = before + amount
+        self.contributions[player] = after
 
         self.amount += amount
         self.current_round_bet += amount
         self.betting_started = True
+
+        # only the layers between the old and new contribution change
+        i = bisect_right(self.caps, before)
+        low = before
+        while i < len(self.caps) and low < after:
+            cap = self.caps[i]
+            self.layer_amounts[i] += min(after, cap) - low
+            if after >= cap:
+                self.layer_players[i].add(player)
+            low = cap
+            i += 1
+
+    def all_in(self, player: Player):
+        # the player's contribution is final, it caps a new layer
+        self._add_cap(self.contributions.get(player, 0))
+        self.side_pots = self.pots()
+
+    def _add_cap(self, cap):
+        i = bisect_right(self.caps, cap)
+        low = self.caps[i - 1] if i else 0
+        amount = 0
+        players = set()
+        if cap > low:
+            # split the chips of the layer above (or the remainder) at the new cap
+            for player, contribution in self.contributions.items():
+                if contribution > low:
+                    amount += min(contribution, cap) - low
+                if contribution >= cap:
+                    players.add(player)
+            if i < len(self.caps):
+                self.layer_amounts[i] -= amount
+
+        self.caps.insert(i, cap)
+        self.layer_amounts.insert(i, amount)
+        self.layer_players.insert(i, players)
+
+    def pots(self, final=False):
+        # same pots as split_pot, read from the ledger
+        pots = []
+        low = 0
+        for cap, amount, players in zip(self.caps, self.layer_amounts, self.layer_players):
+            if cap == low:
+                # an all-in level that is already a layer: an empty pot everyone who has put chips in is part of
+                players = self.contributions.keys()
+            pots.append((amount, {player for player in players if not player.folded()}))
+            low = cap
+
+        if final:
+            remainder_pot = self.amount - sum(self.layer_amounts)
+            eligible_players = {player for player, contribution in self.contributions.items()
+                                if contribution > low and not player.folded()}
+            pots.append((remainder_pot, eligible_players))
+
+        return pots
     
     def set_last_bet_raise(self, player, amount, all_in=False):
         raise_amount = amount - self.last_bet_raise[1]
@@ -55,7 +125,10 @@ class Pot:
     def call_amount(self):
         return self.last_bet_raise[1]
     
+    @counted(SPLIT_POTS)
     def split_pot(self, final=False):
+        # rebuilds every side pot from the contributions, the ledger in add/all_in
+        # gives the same pots without the rebuild
         players = self.contributions.keys()
 
         all_in_amts = sorted([self.contributions[player] for player in players if player.all_in()])
@@ -92,8 +165,10 @@ class Pot:
 
         return pots
     
+    @counted(FINAL_POTS)
     def final_pots(self):
-        pots = self.split_pot(final=True)
+        pots = self.pots(final=True)
+        self.side_pots = pots
         return pots
 
     def next_stage(self):
@@ -105,11 +180,47 @@ class Pot:
     def reset(self):
         self.amount = 0
         self.side_pots = []
-        self.last_raise = (None, 0)
+        self.last_bet_raise = (None, 0)
         self.min_raise_amount = 0
         self.betting_started = False
         self.current_round_bet = 0
+        self.contributions = {}
+        self.caps = []
+        self.layer_amounts = []
+        self.layer_players = []
     
+    def to_snapshot(self, seats: dict[Player, int]):
+        # players are stored as their index in `seats`
+        last_player, last_amount = self.last_bet_raise
+        return {
+            "amount": self.amount,
+            "sidePots": [[amount, sorted(seats[player] for player in players)] for amount, players in self.side_pots],
+            "lastBetRaise": [seats[last_player] if last_player is not None else None, last_amount],
+            "minRaiseAmount": self.min_raise_amount,
+            "bettingStarted": self.betting_started,
+            "currentRoundBet": self.current_round_bet,
+            "minimumBet": self.minimum_bet,
+            "lastFullRaise": self.last_full_raise,
+            "contributions": [[seats[player], amount] for player, amount in self.contributions.items()],
+            "caps": self.caps,
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, players: list[Player]):
+        pot = cls(state["minimumBet"])
+        pot.amount = state["amount"]
+        pot.side_pots = [(amount, {players[i] for i in seats}) for amount, seats in state["sidePots"]]
+        last_seat, last_amount = state["lastBetRaise"]
+        pot.last_bet_raise = (players[last_seat] if last_seat is not None else None, last_amount)
+        pot.min_raise_amount = state["minRaiseAmount"]
+        pot.betting_started = state["bettingStarted"]
+        pot.current_round_bet = state["currentRoundBet"]
+        pot.last_full_raise = state["lastFullRaise"]
+        pot.contributions = {players[i]: amount for i, amount in state["contributions"]}
+        for cap in state["caps"]:
+            pot._add_cap(cap)
+        return pot
+
     def round_stats_str(self):
         return f"Current round total: {self.current_round_bet}\nPot Total: {self.amount}"
 
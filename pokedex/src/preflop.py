@@ -0,0 +1,138 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from treys import Card
+
+from .equity import random_opponents_equity
+
+MAX_OPPONENTS = 9
+CLASSES = 169
+RANKS = "AKQJT98765432"
+
+# header: magic, version, max opponents, trials per cell (thousands)
+MAGIC = b"PFEQ"
+HEADER = struct.Struct("<4sBBH")
+# one little endian uint16 per (opponents, class), equity scaled to 0-65535
+CELL = struct.Struct("<H")
+SCALE = 65535
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "preflop.bin")
+
+
+def class_index(hand):
+    # 13x13 grid with aces first: pairs on the diagonal, suited hands above it,
+    # offsuit hands below it
+    high, low = sorted((Card.get_rank_int(card) for card in hand), reverse=True)
+    row, col = 12 - high, 12 - low
+    if Card.get_suit_int(hand[0]) == Card.get_suit_int(hand[1]):
+        return row * 13 + col
+    return col * 13 + row
+
+
+def class_name(index):
+    row, col = divmod(index, 13)
+    if row == col:
+        return RANKS[row] * 2
+    if row < col:
+        return RANKS[row] + RANKS[col] + "s"
+    return RANKS[col] + RANKS[row] + "o"
+
+
+def class_hand(index):
+    # a representative pair of cards for the class
+    name = class_name(index)
+    if len(name) == 2 or name[2] == "o":
+        return [Card.new(name[0] + "s"), Card.new(name[1] + "h")]
+    return [Card.new(name[0] + "s"), Card.new(name[1] + "s")]
+
+
+class PreflopTable:
+    max_opponents: int
+    trials: int
+
+    def __init__(self, path=TABLE_PATH):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.max_opponents, trials = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a preflop equity table")
+        self.trials = trials * 1000
+
+    def class_equity(self, index, opponents):
+        if not 1 <= opponents <= self.max_opponents:
+            raise ValueError(f"Opponents must be between 1 and {self.max_opponents}")
+
+        offset = HEADER.size + ((opponents - 1) * CLASSES + index) * CELL.size
+        return CELL.unpack_from(self.data, offset)[0] / SCALE
+
+    def equity(self, hand, opponents):
+        return self.class_equity(class_index(hand), opponents)
+
+    def heatmap(self, opponents):
+        return [
+            [
+                {"hand": class_name(row * 13 + col), "equity": self.class_equity(row * 13 + col, opponents)}
+                for col in range(13)
+            ]
+            for row in range(13)
+        ]
+
+    def close(self):
+        self.data.close()
+
+
+_table = None
+# the file is looked for once, and again after build() writes it. _table is
+# set before _looked, so a caller that sees _looked also sees the table
+_looked = False
+_lock = threading.Lock()
+
+def preflop_table():
+    # None until the table has been built
+    global _table, _looked
+    if not _looked:
+        with _lock:
+            if not _looked:
+                if os.path.exists(TABLE_PATH):
+                    _table = PreflopTable()
+                _looked = True
+    return _table
+
+
+def _class_row(index, trials, seed):
+    hand = class_hand(index)
+    return [random_opponents_equity(hand, opponents, trials, seed + index) for opponents in range(1, MAX_OPPONENTS + 1)]
+
+
+def build(path=TABLE_PATH, trials=10_000, seed=0, workers=None):
+    if trials % 1000:
+        raise ValueError("Trials must be a multiple of 1000")
+
+    indices = range(CLASSES)
+    with ProcessPoolExecutor(workers) as executor:
+        rows = list(executor.map(_class_row, indices, [trials] * CLASSES, [seed] * CLASSES))
+
+    data = bytearray(HEADER.pack(MAGIC, 1, MAX_OPPONENTS, trials // 1000))
+    for opponents in range(MAX_OPPONENTS):
+        for index in indices:
+            data += CELL.pack(round(rows[index][opponents] * SCALE))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    if os.path.abspath(path) == os.path.abspath(TABLE_PATH):
+        global _table, _looked
+        with _lock:
+            _looked = False
+            _table = None
+
+
+if __name__ == "__main__":
+    # python -m src.preflop [trials]
+    build(trials=int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,153 @@
+from itertools import combinations
+
+from treys import Card
+
+from .preflop import CLASSES, RANKS, class_name, preflop_table
+
+SUITS = "shdc"
+COMBOS = 1326
+
+
+def class_combos(high, low, suited=None) -> list[tuple[int, int]]:
+    # every (card, card) for the ranks, suited None means both suited and offsuit
+    if high == low:
+        return [(Card.new(high + a), Card.new(low + b)) for a, b in combinations(SUITS, 2)]
+    return [(Card.new(high + a), Card.new(low + b)) for a in SUITS for b in SUITS
+            if suited is None or (a == b) == suited]
+
+
+def _rank(char, token):
+    if char not in RANKS:
+        raise ValueError(f"Invalid range token {token}")
+    return RANKS.index(char)
+
+
+def _hand_class(text, token):
+    # "AKs" -> (0, 1, True), "QQ" -> (2, 2, None), "AK" -> (0, 1, None)
+    if len(text) not in (2, 3) or (len(text) == 3 and text[2] not in "so"):
+        raise ValueError(f"Invalid range token {token}")
+    high, low = sorted((_rank(text[0], token), _rank(text[1], token)))
+    suited = None if len(text) == 2 else text[2] == "s"
+    if high == low and suited is not None:
+        raise ValueError(f"Invalid range token {token}")
+    return high, low, suited
+
+
+def _classes(text, token):
+    # the hand classes one token covers
+    if "-" in text:
+        first, last = (_hand_class(part, token) for part in text.split("-"))
+        if first[2] != last[2]:
+            raise ValueError(f"Invalid range token {token}")
+        if first[0] == first[1] and last[0] == last[1]:
+            top, bottom = sorted((first[0], last[0]))
+            return [(rank, rank, None) for rank in range(top, bottom + 1)]
+        if first[0] != last[0]:
+            raise ValueError(f"Invalid range token {token}")
+        top, bottom = sorted((first[1], last[1]))
+        return [(first[0], kicker, first[2]) for kicker in range(top, bottom + 1)]
+
+    if text.endswith("+"):
+        high, low, suited = _hand_class(text[:-1], token)
+        if high == low:
+            # "QQ+": QQ, KK, AA
+            return [(rank, rank, None) for rank in range(0, low + 1)]
+        # "ATs+": ATs up to AKs
+        return [(high, kicker, suited) for kicker in range(high + 1, low + 1)]
+
+    return [_hand_class(text, token)]
+
+
+def top_classes(percent) -> list[int]:
+    # the strongest hand classes by heads up preflop equity, covering `percent` of all combos
+    table = preflop_table()
+    if table is None:
+        raise ValueError("Percent ranges need the preflop table, build it with python -m src.preflop")
+
+    order = sorted(range(CLASSES), key=lambda index: table.class_equity(index, 1), reverse=True)
+    target = percent / 100 * COMBOS
+    classes = []
+    count = 0
+    for index in order:
+        if count >= target:
+            break
+        classes.append(index)
+        name = class_name(index)
+        count += 6 if len(name) == 2 else 4 if name[2] == "s" else 12
+    return classes
+
+
+class Range:
+    # Weighted hole card combos: "QQ+,AKs", "A5s-A2s", "KQo:0.5", "AhKh", "22%".
+    # A later token overrides the weight of combos an earlier one already had.
+    name: str
+    combos: list[tuple[int, int]]
+    weights: list[float]
+
+    def __init__(self, combos: dict[tuple[int, int], float], name=""):
+        self.name = name
+        self.combos = [combo for combo, weight in combos.items() if weight > 0]
+        self.weights = [combos[combo] for combo in self.combos]
+
+    @classmethod
+    def parse(cls, text) -> "Range":
+        combos = {}
+        for token in text.replace(" ", "").split(","):
+            if not token:
+                continue
+
+            hand, _, weight = token.partition(":")
+            try:
+                weight = float(weight) if weight else 1.0
+            except ValueError:
+                raise ValueError(f"Invalid range token {token}")
+
+            if len(hand) == 4 and hand[1] in SUITS and hand[3] in SUITS:
+                try:
+                    cards = (Card.new(hand[:2]), Card.new(hand[2:]))
+                except (KeyError, IndexError):
+                    raise ValueError(f"Invalid range token {token}")
+                if cards[0] == cards[1]:
+                    raise ValueError(f"Invalid range token {token}")
+                combos[tuple(sorted(cards, reverse=True))] = weight
+                continue
+
+            if hand.endswith("%"):
+                try:
+                    percent = float(hand[:-1])
+                except ValueError:
+                    raise ValueError(f"Invalid range token {token}")
+                classes = [_hand_class(class_name(index), token) for index in top_classes(percent)]
+            else:
+                classes = _classes(hand, token)
+
+            for high, low, suited in classes:
+                for combo in class_combos(RANKS[high], RANKS[low], suited):
+                    combos[tuple(sorted(combo, reverse=True))] = weight
+
+        if not combos:
+            raise ValueError(f"Empty range {text!r}")
+        return cls(combos, text)
+
+    def without(self, cards) -> "Range":
+        # the combos that don't use any of the known cards
+        cards = set(cards)
+        return Range({combo: weight for combo, weight in zip(self.combos, self.weights)
+                      if combo[0] not in cards and combo[1] not in cards}, self.name)
+
+    def __len__(self):
+        return len(self.combos)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "combos": [{"hand": [Card.int_to_str(card) for card in combo], "weight": weight}
+                       for combo, weight in zip(self.combos, self.weights)],
+        }
+
+    def __repr__(self):
+        return f"Range({self.name!r}, {len(self)} combos)"
+
+
+def parse_range(text) -> Range:
+    return Range.parse(text)
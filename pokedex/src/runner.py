@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+from .simulate import SimulationResult, Simulator, six_max
+
+# builds a fresh table from a seed, must be a module level function so workers can import it
+TableFactory = Callable[..., Simulator]
+
+
+def shard_seed(seed, index):
+    # independent, reproducible stream per shard
+    return random.Random(f"{seed}/{index}").getrandbits(64)
+
+
+def run_shard(seed, hands, table: TableFactory = six_max) -> SimulationResult:
+    # re-run any single shard on its own from the seed in its report
+    return table(seed=seed).run(hands)
+
+
+class RunReport:
+    seed: int
+    shards: list[tuple[int, int]]
+    results: list[SimulationResult]
+    total: SimulationResult
+
+    def __init__(self, seed, shards, results, seconds):
+        self.seed = seed
+        self.shards = shards
+        self.results = results
+        self.total = SimulationResult([])
+        for result in results:
+            self.total.merge(result)
+        # shards run side by side, so throughput is measured on the wall clock
+        self.total.seconds = seconds
+
+    def to_dict(self):
+        return {
+            "seed": self.seed,
+            "shards": [
+                {"seed": seed, "hands": hands, "handsPerSecond": result.hands_per_second()}
+                for (seed, hands), result in zip(self.shards, self.results)
+            ],
+            "total": self.total.to_dict(),
+        }
+
+    def __repr__(self):
+        return f"{len(self.shards)} shards: {self.total}"
+
+
+def run(hands, seed=0, shards=None, workers=None, table: TableFactory = six_max) -> RunReport:
+    workers = workers or os.cpu_count()
+    shards = shards or workers
+    sizes = [hands // shards + (1 if i < hands % shards else 0) for i in range(shards)]
+    seeds = [shard_seed(seed, i) for i in range(shards)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_shard(shard, size, table) for shard, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(run_shard, seeds, sizes, [table] * shards))
+    seconds = time.perf_counter() - start
+
+    return RunReport(seed, list(zip(seeds, sizes)), results, seconds)
+
+
+if __name__ == "__main__":
+    # python -m src.runner [hands] [seed]
+    hands = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    print(run(hands, seed))
@@ -0,0 +1,189 @@
+from typing import Callable
+
+from .equity import round_exact_equity
+from .hand import Hand
+from .history import HandHistoryWriter
+from .journal import deal_round
+from .player import Player, Action
+from .tables import Table, TableRegistry
+from . import wire
+
+# Clients that don't send a table_id play on the default table, which
+# start_game (re)creates. Any other table is only recreated when asked to.
+DEFAULT_TABLE = "default"
+
+
+class NoRound(ValueError):
+    pass
+
+
+def default_players():
+    # Define three players with preset names and stacks
+    # players = [
+    #     Player("Harry Potter", 1000),
+    #     Player("Cho Chang", 750),
+    #     Player("Luna Lovegood", 200),
+    # ]
+    return [
+        Player("Tyson the Conqueror", 1000),
+        Player("Lord Voldemort", 1000),
+        Player("Cho Chang", 250),
+        Player("Luna Lovegood", 320),
+    ]
+
+
+class TableService:
+    # The table operations behind the HTTP endpoints, shared by the Flask and
+    # ASGI servers. Every method is blocking and holds only its table's lock.
+    registry: TableRegistry
+    on_delta: Callable[[str, dict], None]
+    # whether anyone is subscribed to a table, without it every change is published
+    watched: Callable[[str], bool]
+    history: HandHistoryWriter
+
+    def __init__(self, registry: TableRegistry, on_delta=None, history: HandHistoryWriter = None, watched=None):
+        self.registry = registry
+        self.on_delta = on_delta
+        self.history = history
+        self.watched = watched
+
+    def find_table(self, table_id) -> Table:
+        # raises TableNotFound for unknown tables
+        return self.registry.get(table_id or DEFAULT_TABLE)
+
+    def current_round(self, table):
+        # call with the table lock held
+        if table.poker.round is None:
+            raise NoRound(f"No round in progress at table {table.table_id}")
+        return table.poker.round
+
+    def table_state(self, table, round):
+        game_state = round.to_dict()
+        game_state["table_id"] = table.table_id
+        return game_state
+
+    def publish(self, table, game_state):
+        # push what changed to everyone watching the table (call with the table lock held),
+        # with nobody watching the state is only held until the next sync
+        round = table.poker.round
+        seats = [round.seat_of[player] for player in round.players]
+        if self.watched is not None and not self.watched(table.table_id):
+            table.feed.hold(game_state, seats)
+            return
+
+        ops = table.feed.publish(game_state, seats, round.take_changed())
+        if ops is not None and self.on_delta is not None:
+            self.on_delta(table.table_id, {
+                "table_id": table.table_id,
+                "epoch": table.feed.epoch,
+                "base": table.feed.version - 1,
+                "version": table.feed.version,
+                "ops": ops,
+            })
+
+    def start_game(self, table_id=None, binary=False, replace=False):
+        # Initialize a poker game with small blind of 10
+        table = self.registry.create(default_players(), small_blind=10, table_id=table_id or DEFAULT_TABLE,
+                                     replace=replace or not table_id)
+
+        with table.lock:
+            # Deal cards and setup the round
+            round = deal_round(table.poker)
+            if table.journal is not None:
+                table.journal.round(table.poker)
+            table.save()
+
+            # Prepare the game state to return
+            game_state = self.table_state(table, round)
+            self.publish(table, game_state)
+            body = wire.encode_round(round, table.table_id) if binary else None
+
+        return game_state, body
+
+    def next_round(self, table_id=None, binary=False):
+        table = self.find_table(table_id)
+
+        with table.lock:
+            # Deal cards and setup the round
+            round = deal_round(table.poker)
+            if table.journal is not None:
+                table.journal.round(table.poker)
+            table.save()
+
+            # Prepare the game state to return
+            game_state = self.table_state(table, round)
+            self.publish(table, game_state)
+            body = wire.encode_round(round, table.table_id) if binary else None
+
+        return game_state, body
+
+    def next_turn(self, table_id, action: Action, player_name=None, binary=False):
+        table = self.find_table(table_id)
+
+        # player verification
+
+        with table.lock:
+            round = self.current_round(table)
+
+            # Perform the action
+            round.player_action(action)
+            if table.journal is not None:
+                table.journal.action(table.poker, action)
+
+            # Prepare the game state to return
+            game_state = self.table_state(table, round)
+
+            # exact equity is cheap enough once the flop is out
+            equity = None
+            if len(round.board) >= 3 and len(round.players) > 1:
+                equity = round_exact_equity(round)
+                game_state["equity"] = equity.to_dict(round.players)
+
+            winner = None
+            if round.betting_round_over():
+                winner = round.reveal()
+                players, hand, rank = winner
+                game_state["winner"] = {
+                    "players": [player.to_dict() for player in players],
+                    "hand": Hand.ints_to_str(hand),
+                    "rank": rank
+                }
+
+            # encoded before the payout so both formats show the same stacks
+            body = wire.encode_round(round, table.table_id, winner, equity) if binary else None
+
+            if round.betting_round_over():
+                paid = round.distribute_winnings()
+                if table.journal is not None:
+                    table.journal.payout(table.poker)
+                if self.history is not None:
+                    self.history.append(round, paid)
+                if table.store is not None:
+                    table.store.hand(table, round, paid)
+            table.save()
+
+            self.publish(table, game_state)
+
+        return game_state, body
+
+    def round_snapshot(self, table_id):
+        # hole cards, board and deck copied under the lock, for work done outside it
+        table = self.find_table(table_id)
+        with table.lock:
+            round = self.current_round(table)
+            hands = [player.hand() for player in round.players]
+            return hands, list(round.board), list(round.deck.cards), list(round.players)
+
+    def sync(self, table_id, version=None, epoch=None):
+        # (event, payload) for a client that last applied `version` of the feed's `epoch`
+        table = self.find_table(table_id)
+        with table.lock:
+            if table.feed.held is not None:
+                # changes made while nobody was watching
+                state, seats = table.feed.held
+                table.feed.publish(state, seats, table.poker.round.take_changed())
+            ops = table.feed.since(version, epoch) if version is not None else None
+            if ops is None:
+                return "snapshot", {"table_id": table.table_id, **table.feed.snapshot()}
+            return "delta", {"table_id": table.table_id, "epoch": table.feed.epoch, "base": version,
+                             "version": table.feed.version, "ops": ops}
@@ -0,0 +1,148 @@
+import random
+import time
+from typing import Callable
+
+from .history import HandHistoryWriter
+from .player import Player, Action
+from .poker import Poker, Round
+
+# a strategy picks one of the legal actions for the player to act
+Strategy = Callable[[Round, Player, list[Action]], Action]
+
+
+def passive_strategy(round: Round, player: Player, actions: list[Action]) -> Action:
+    for action in actions:
+        if action.action_type == Action.CHECK or action.action_type == Action.CALL:
+            return action
+    return actions[0]
+
+
+def affordable(player: Player, actions: list[Action]) -> list[Action]:
+    # bets and raises the player cannot cover are dropped
+    return [action for action in actions
+            if action.action_type not in (Action.BET, Action.RAISE) or action.amount <= player.stack]
+
+
+class RandomStrategy:
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, round: Round, player: Player, actions: list[Action]) -> Action:
+        return self.rng.choice(affordable(player, actions))
+
+
+class SimulationResult:
+    hands: int
+    seconds: float
+    showdowns: int
+    chip_deltas: dict[str, int]
+    pots_won: dict[str, int]
+    showdowns_seen: dict[str, int]
+
+    def __init__(self, players: list[Player]):
+        self.hands = 0
+        self.seconds = 0.0
+        self.showdowns = 0
+        self.chip_deltas = {player.name: 0 for player in players}
+        self.pots_won = {player.name: 0 for player in players}
+        self.showdowns_seen = {player.name: 0 for player in players}
+
+    def merge(self, other: "SimulationResult"):
+        self.hands += other.hands
+        self.seconds += other.seconds
+        self.showdowns += other.showdowns
+        for totals, values in ((self.chip_deltas, other.chip_deltas),
+                               (self.pots_won, other.pots_won),
+                               (self.showdowns_seen, other.showdowns_seen)):
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+
+    def showdown_frequency(self):
+        return {name: seen / self.hands if self.hands else 0.0 for name, seen in self.showdowns_seen.items()}
+
+    def hands_per_second(self):
+        return self.hands / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            "hands": self.hands,
+            "seconds": self.seconds,
+            "handsPerSecond": self.hands_per_second(),
+            "showdowns": self.showdowns,
+            "chipDeltas": self.chip_deltas,
+            "potsWon": self.pots_won,
+            "showdownsSeen": self.showdowns_seen,
+            "showdownFrequency": self.showdown_frequency(),
+        }
+
+    def __repr__(self):
+        return f"{self.hands} hands in {self.seconds:.2f}s ({self.hands_per_second():.0f} hands/s)"
+
+
+class Simulator:
+    poker: Poker
+    strategies: dict[Player, Strategy]
+    stack: int
+    history: HandHistoryWriter
+
+    def __init__(self, players: list[Player], strategies: list[Strategy], small_blind=10, stack=1000, seed=None,
+                 history: HandHistoryWriter = None):
+        if len(players) != len(strategies):
+            raise ValueError("Every player needs a strategy")
+
+        self.poker = Poker(players=players, small_blind=small_blind, verbose=False, seed=seed)
+        self.strategies = dict(zip(players, strategies))
+        self.stack = stack
+        self.history = history
+
+    def play_hand(self, result: SimulationResult = None) -> Round:
+        # every hand starts from the same stacks so results are per hand chip deltas
+        self.poker.set_stacks(self.stack)
+
+        round = self.poker.new_round()
+        round.deal()
+        round.post_blinds()
+
+        while not round.betting_round_over():
+            player, actions = round.get_current_player_and_actions()
+            round.player_action(self.strategies[player](round, player, actions))
+
+        showdown = len(round.players) > 1
+        pot_winners = round.distribute_winnings()
+        if self.history is not None:
+            self.history.append(round, pot_winners)
+
+        if result is not None:
+            result.hands += 1
+            result.showdowns += showdown
+            for player in self.poker.players:
+                result.chip_deltas[player.name] += player.stack - self.stack
+            if showdown:
+                for player in round.players:
+                    result.showdowns_seen[player.name] += 1
+            for _, winners in pot_winners:
+                for player in winners:
+                    result.pots_won[player.name] += 1
+
+        return round
+
+    def run(self, hands) -> SimulationResult:
+        result = SimulationResult(self.poker.players)
+
+        start = time.perf_counter()
+        for _ in range(hands):
+            self.play_hand(result)
+        result.seconds = time.perf_counter() - start
+
+        return result
+
+
+def six_max(strategies: list[Strategy] = None, stack=1000, seed=None) -> Simulator:
+    players = [Player(f"Seat {i + 1}", stack) for i in range(6)]
+    if strategies is None:
+        strategies = [RandomStrategy(None if seed is None else f"{seed}/{i}") for i in range(6)]
+    return Simulator(players, strategies, stack=stack, seed=seed)
+
+
+if __name__ == "__main__":
+    print(six_max().run(10_000))
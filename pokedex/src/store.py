@@ -0,0 +1,184 @@
+import json
+import sqlite3
+import threading
+import time
+
+from treys import Card
+
+from .poker import Poker, Round
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    table_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hands (
+    id INTEGER PRIMARY KEY,
+    table_id TEXT NOT NULL,
+    hand INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hands_table ON hands (table_id, hand);
+"""
+
+
+class TableStore:
+    # Latest state of every table and the result of every finished hand in a
+    # SQLite database. Callers only queue writes: a table saved several times
+    # between commits is written once, with its latest state. The background
+    # thread commits everything queued every `interval` seconds or once
+    # `batch_size` writes are waiting, serializing each saved table under its
+    # lock only then; without the thread, tables are serialized as they are
+    # saved and the write that fills the batch commits it inline.
+    path: str
+    batch_size: int
+    interval: float
+    states: dict[str, object]
+    hands: list[tuple]
+    writes: int
+    queued_at: float
+    committed: int
+    batches: int
+    commit_seconds: float
+
+    def __init__(self, path, batch_size=256, interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        # table_id -> the Table to serialize at the next flush, its state json, or None if removed
+        self.states = {}
+        self.hands = []
+        self.writes = 0
+        self.queued_at = None
+        self.committed = 0
+        self.batches = 0
+        self.commit_seconds = 0.0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+        self.closed = False
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def _queue(self, table_id=None, state=None, hand=None):
+        with self.lock:
+            if hand is not None:
+                self.hands.append(hand)
+            else:
+                self.states[table_id] = state
+            self.writes += 1
+            if self.queued_at is None:
+                self.queued_at = time.monotonic()
+            full = self.writes >= self.batch_size
+
+        if full:
+            if self.thread is None:
+                self.flush()
+            else:
+                self.ready.set()
+
+    def save(self, table):
+        # call with the table lock held; with the writer thread running the table is
+        # only marked dirty, the thread takes its snapshot when it flushes
+        if self.thread is None:
+            self._queue(table.table_id, self._serialize(table))
+        else:
+            self._queue(table.table_id, table)
+
+    def _serialize(self, table):
+        return json.dumps(table.poker.to_snapshot(), separators=(",", ":"))
+
+    def delete(self, table_id):
+        self._queue(table_id, None)
+
+    def hand(self, table, round: Round, paid):
+        # paid: the (pot, winners) list returned by Round.distribute_winnings
+        result = {
+            "deckSeed": round.deck_seed,
+            "board": [Card.int_to_str(card) for card in round.board],
+            "pots": [{"amount": amount, "winners": [player.name for player in winners]} for amount, winners in paid],
+            "stacks": {player.name: player.stack for player in round.seats},
+        }
+        self._queue(hand=(table.table_id, table.poker.hands - 1, json.dumps(result, separators=(",", ":")), time.time()))
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                states, self.states = self.states, {}
+                hands, self.hands = self.hands, []
+                writes, self.writes = self.writes, 0
+                self.queued_at = None
+            if not writes:
+                return
+
+            start = time.perf_counter()
+            for table_id, state in states.items():
+                if state is not None and not isinstance(state, str):
+                    with state.lock:
+                        states[table_id] = self._serialize(state)
+
+            now = time.time()
+            with self.db:
+                self.db.executemany("DELETE FROM tables WHERE table_id = ?",
+                                    [(table_id,) for table_id, state in states.items() if state is None])
+                self.db.executemany("INSERT OR REPLACE INTO tables VALUES (?, ?, ?)",
+                                    [(table_id, state, now) for table_id, state in states.items() if state is not None])
+                self.db.executemany("INSERT INTO hands (table_id, hand, result, finished) VALUES (?, ?, ?, ?)", hands)
+            self.commit_seconds = time.perf_counter() - start
+            self.committed += writes
+            self.batches += 1
+
+    def start(self):
+        def write():
+            while not self.closed:
+                self.ready.wait(self.interval)
+                self.ready.clear()
+                self.flush()
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=write, name="table-store", daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.closed = True
+        if self.thread is not None:
+            self.ready.set()
+            self.thread.join()
+        self.flush()
+        self.db.close()
+
+    def lag(self):
+        # how far the database is behind the tables
+        with self.lock:
+            pending = self.writes
+            queued_at = self.queued_at
+        return {
+            "pending": pending,
+            "seconds": time.monotonic() - queued_at if queued_at is not None else 0.0,
+            "committed": self.committed,
+            "batches": self.batches,
+            "commitSeconds": self.commit_seconds,
+        }
+
+    def load(self, verbose=True) -> list[tuple[str, Poker]]:
+        # every stored table as it was at the last commit
+        with self.write_lock:
+            rows = self.db.execute("SELECT table_id, state FROM tables ORDER BY table_id").fetchall()
+        return [(table_id, Poker.from_snapshot(json.loads(state), verbose)) for table_id, state in rows]
+
+    def hand_results(self, table_id) -> list[dict]:
+        with self.write_lock:
+            rows = self.db.execute("SELECT hand, result FROM hands WHERE table_id = ? ORDER BY hand",
+                                   (table_id,)).fetchall()
+        return [{"hand": hand, **json.loads(result)} for hand, result in rows]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import uuid
+
+from .feed import TableFeed
+from .journal import TableJournal
+from .poker import Poker
+from .player import Player
+from .store import TableStore
+
+MAX_SEATS = 9
+
+
+class TableExists(ValueError):
+    pass
+
+
+class TableNotFound(KeyError):
+    pass
+
+
+class Table:
+    table_id: str
+    poker: Poker
+    lock: threading.Lock
+    last_active: float
+    feed: TableFeed
+    journal: TableJournal
+    store: TableStore
+
+    def __init__(self, table_id: str, poker: Poker, journal: TableJournal = None, store: TableStore = None):
+        self.table_id = table_id
+        self.poker = poker
+        self.feed = TableFeed()
+        self.journal = journal
+        self.store = store
+        # every operation on this table's Poker/Round holds this lock, nothing else does
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def join(self, name: str, stack: int):
+        if len(self.poker.players) >= MAX_SEATS:
+            raise ValueError(f"Table {self.table_id} is full")
+        if any(player.name == name for player in self.poker.players):
+            raise ValueError(f"{name} is already seated at table {self.table_id}")
+
+        player = Player(name, stack)
+        self.poker.add_player(player)
+        if self.journal is not None:
+            self.journal.join(self.poker, player)
+        self.save()
+        return player
+
+    def save(self):
+        # queue the table's state for the store (call with the lock held)
+        if self.store is not None:
+            self.store.save(self)
+
+    def to_dict(self):
+        round = self.poker.round
+        return {
+            "table_id": self.table_id,
+            "small_blind": self.poker.small_blind,
+            "players": [{"name": player.name, "stack": player.stack} for player in self.poker.players],
+            "stage": round.stage.name if round else None,
+        }
+
+
+class TableRegistry:
+    tables: dict[str, Table]
+    journal_dir: str
+    store: TableStore
+
+    def __init__(self, journal_dir: str = None, store: TableStore = None):
+        self.tables = {}
+        # with a journal_dir every table is journaled there and can be recovered after a crash
+        self.journal_dir = journal_dir
+        # with a store every table's state is written to it and restored on boot
+        self.store = store
+        # only guards the dict itself, never held while a table is in use
+        self.lock = threading.Lock()
+        self.evictor = None
+
+    def create(self, players: list[Player] = None, small_blind=10, table_id: str = None, verbose=True,
+               replace=False) -> Table:
+        # an existing table with the same id is only dealt over with replace
+        table_id = table_id or uuid.uuid4().hex[:12]
+        poker = Poker(players=list(players or []), small_blind=small_blind, verbose=verbose)
+        table = Table(table_id, poker, None, self.store)
+
+        # the id is checked and taken in one step; the new table's lock is held
+        # until its journal is open, so nobody else plays it before then
+        with table.lock:
+            with self.lock:
+                replaced = self.tables.get(table_id)
+                if replaced is not None and not replace:
+                    raise TableExists(f"Table {table_id} already exists")
+                self.tables[table_id] = table
+
+            if self.journal_dir:
+                # a recreated table starts a fresh journal, once the table it
+                # replaces is done with the old one
+                if replaced is not None and replaced.journal is not None:
+                    with replaced.lock:
+                        replaced.journal.delete()
+                table.journal = TableJournal(self.journal_path(table_id), poker)
+            table.save()
+        return table
+
+    def journal_path(self, table_id: str):
+        return os.path.join(self.journal_dir, table_id)
+
+    def recover(self, verbose=True) -> list[str]:
+        # reload every journaled table, e.g. on startup after a crash
+        recovered = []
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(".snapshot"):
+                continue
+            table_id = name[:-len(".snapshot")]
+            poker, journal = TableJournal.recover(self.journal_path(table_id), verbose=verbose)
+            with self.lock:
+                self.tables[table_id] = Table(table_id, poker, journal, self.store)
+            recovered.append(table_id)
+        return recovered
+
+    def restore(self, verbose=True) -> list[str]:
+        # warm start: every table in the store as of its last commit. Tables
+        # with a journal are left to recover(), the others start a journal here
+        restored = []
+        for table_id, poker in self.store.load(verbose):
+            journal = None
+            if self.journal_dir and not os.path.exists(self.journal_path(table_id) + ".snapshot"):
+                journal = TableJournal(self.journal_path(table_id), poker)
+            with self.lock:
+                self.tables[table_id] = Table(table_id, poker, journal, self.store)
+            restored.append(table_id)
+        return restored
+
+    def get(self, table_id: str) -> Table:
+        table = self.tables.get(table_id)
+        if table is None:
+            raise TableNotFound(table_id)
+        table.touch()
+        return table
+
+    def remove(self, table_id: str):
+        with self.lock:
+            table = self.tables.pop(table_id, None)
+        if table is not None and table.journal is not None:
+            table.journal.delete()
+        if table is not None and self.store is not None:
+            self.store.delete(table_id)
+
+    def all(self) -> list[Table]:
+        with self.lock:
+            return list(self.tables.values())
+
+    def evict_idle(self, max_idle: float) -> list[str]:
+        cutoff = time.monotonic() - max_idle
+        with self.lock:
+            idle = [table_id for table_id, table in self.tables.items() if table.last_active < cutoff]
+            evicted = [self.tables.pop(table_id) for table_id in idle]
+        for table in evicted:
+            if table.journal is not None:
+                table.journal.delete()
+            if self.store is not None:
+                self.store.delete(table.table_id)
+        return idle
+
+    def start_evictor(self, max_idle=30 * 60, interval=60):
+        def evict():
+            while True:
+                time.sleep(interval)
+                self.evict_idle(max_idle)
+
+        if self.evictor is None:
+            self.evictor = threading.Thread(target=evict, name="table-evictor", daemon=True)
+            self.evictor.start()
+
+    def __len__(self):
+        return len(self.tables)
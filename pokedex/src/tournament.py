@@ -0,0 +1,345 @@
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+
+from .deck import mix_seed
+from .player import Player
+from .poker import Poker
+from .simulate import RandomStrategy
+
+# A multi-table tournament: the tables are spread over worker processes, each
+# playing its tables a hand at a time in turn. The coordinator only keeps the
+# number of players at every table and talks to the workers in small messages,
+# so a worker keeps dealing its other tables while players are moved.
+#
+# coordinator -> worker (every worker has its own inbox, read between hands)
+#   ("seat", table_id, name, stack)      sit a player down, opening the table on the first one
+#   ("unseat", table_id, count, close)   take `count` players off (all of them and close the table if close)
+#   ("blinds", small_blind)              from each table's next hand on
+#   ("stop",)
+# worker -> coordinator (one shared outbox)
+#   ("busted", table_id, [(name, stack at the start of the hand)])
+#   ("unseated", table_id, [(name, stack)])   the players taken off, fewer than asked if some busted first
+#   ("done", worker, hands, [(table_id, name, stack)])
+
+MAX_SEATS = 9
+
+
+def blind_levels(small_blind=10, seconds=60.0, levels=20, growth=1.5) -> list[tuple[int, float]]:
+    # (small blind, seconds) per level, rounded to 5 chips, the last level never ends
+    schedule = []
+    blind = small_blind
+    for _ in range(levels):
+        schedule.append((blind, seconds))
+        blind = max(blind + 5, int(blind * growth) // 5 * 5)
+    return schedule
+
+
+def _remove(poker: Poker, players: list[Player]):
+    # take players off a table, the small blind moves on to the next player still seated
+    order = poker.players[poker.small_blind_index:] + poker.players[:poker.small_blind_index]
+    following = next((player for player in order if player not in players), None)
+    poker.players = [player for player in poker.players if player not in players]
+    poker.small_blind_index = poker.players.index(following) if following is not None else 0
+
+
+def _play_hand(poker: Poker, strategy):
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+    while not round.betting_round_over():
+        player, actions = round.get_current_player_and_actions()
+        round.player_action(strategy(round, player, actions))
+    round.distribute_winnings()
+
+
+def _worker(index, inbox, outbox, seed):
+    tables: dict[int, Poker] = {}
+    blind = None
+    strategy = RandomStrategy(f"{seed}/{index}")
+    hands = 0
+
+    while True:
+        # block only when none of this worker's tables can deal a hand
+        playable = any(len(poker.players) > 1 for poker in tables.values())
+        messages = []
+        try:
+            messages.append(inbox.get_nowait() if playable else inbox.get())
+            while True:
+                messages.append(inbox.get_nowait())
+        except queue.Empty:
+            pass
+
+        for message in messages:
+            kind = message[0]
+            if kind == "seat":
+                _, table_id, name, stack = message
+                if table_id not in tables:
+                    tables[table_id] = Poker(players=[], small_blind=blind, verbose=False, seed=mix_seed(seed, table_id))
+                tables[table_id].add_player(Player(name, stack))
+            elif kind == "unseat":
+                _, table_id, count, close = message
+                poker = tables.pop(table_id) if close else tables[table_id]
+                # the player due to post the big blind next goes first, like a dealer moving players
+                order = poker.players[poker.small_blind_index + 1:] + poker.players[:poker.small_blind_index + 1]
+                moved = order if close else order[:count]
+                _remove(poker, moved)
+                outbox.put(("unseated", table_id, [(player.name, player.stack) for player in moved]))
+            elif kind == "blinds":
+                blind = message[1]
+                for poker in tables.values():
+                    poker.set_small_blind(blind)
+            elif kind == "stop":
+                seated = [(table_id, player.name, player.stack)
+                          for table_id, poker in tables.items() for player in poker.players]
+                outbox.put(("done", index, hands, seated))
+                return
+
+        for table_id, poker in tables.items():
+            if len(poker.players) < 2:
+                continue
+            stacks = [(player, player.stack) for player in poker.players]
+            _play_hand(poker, strategy)
+            hands += 1
+
+            busted = [player for player, _ in stacks if player.stack == 0]
+            if busted:
+                _remove(poker, busted)
+                outbox.put(("busted", table_id, [(player.name, stack) for player, stack in stacks if player.stack == 0]))
+
+
+class TournamentResult:
+    players: int
+    tables: int
+    workers: int
+    seconds: float
+    hands: int
+    # name -> finishing place, 1 is the winner
+    places: dict[str, int]
+    winner: str
+    chips: int
+    level: int
+    moves: int
+    breaks: int
+
+    def __init__(self, players, tables, workers):
+        self.players = players
+        self.tables = tables
+        self.workers = workers
+        self.seconds = 0.0
+        self.hands = 0
+        self.places = {}
+        self.winner = None
+        self.chips = 0
+        self.level = 0
+        self.moves = 0
+        self.breaks = 0
+
+    def hands_per_second(self):
+        return self.hands / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            "players": self.players,
+            "tables": self.tables,
+            "workers": self.workers,
+            "seconds": self.seconds,
+            "hands": self.hands,
+            "handsPerSecond": self.hands_per_second(),
+            "winner": self.winner,
+            "chips": self.chips,
+            "level": self.level,
+            "moves": self.moves,
+            "breaks": self.breaks,
+            "places": self.places,
+        }
+
+    def __repr__(self):
+        return (f"{self.players} players at {self.tables} tables on {self.workers} workers: {self.winner} won "
+                f"{self.chips} chips after {self.hands} hands in {self.seconds:.1f}s "
+                f"({self.hands_per_second():.0f} hands/s), level {self.level + 1}, "
+                f"{self.moves} players moved, {self.breaks} tables broken")
+
+
+class Tournament:
+    # Coordinator. `sizes` is its view of every open table: seats taken plus
+    # players on their way there, minus players it asked a worker to move
+    # and the busts reported so far.
+    players: list[str]
+    stack: int
+    seats: int
+    schedule: list[tuple[int, float]]
+    workers: int
+    seed: int
+    sizes: dict[int, int]
+    # table_id -> tables the players being moved off it will sit at
+    moving: dict[int, list[int]]
+    remaining: int
+
+    def __init__(self, players: list[str], stack=1000, seats=MAX_SEATS, schedule=None, workers=None, seed=0):
+        if len(set(players)) != len(players) or len(players) < 2:
+            raise ValueError("A tournament needs at least two players with different names")
+        self.players = players
+        self.stack = stack
+        self.seats = seats
+        self.schedule = schedule or blind_levels()
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.sizes = {}
+        self.moving = {}
+        self.remaining = len(players)
+
+    def worker_of(self, table_id):
+        return table_id % self.workers
+
+    def _send(self, table_id, message):
+        self.inboxes[self.worker_of(table_id)].put(message)
+
+    def _seat(self, name, stack, table_id=None):
+        if table_id not in self.sizes:
+            table_id = min(self.sizes, key=self.sizes.get)
+            self.sizes[table_id] += 1
+        self._send(table_id, ("seat", table_id, name, stack))
+
+    def _table_to_break(self):
+        # the smallest table, on the worker with the most open tables when sizes
+        # tie, so the last tables stay spread over the workers
+        load = [0] * self.workers
+        for table_id in self.sizes:
+            load[self.worker_of(table_id)] += 1
+        return min(self.sizes, key=lambda table_id: (self.sizes[table_id], -load[self.worker_of(table_id)]))
+
+    def _balance(self, result: TournamentResult):
+        # break the smallest table while the players fit at one table fewer
+        while len(self.sizes) > 1 and self.remaining <= (len(self.sizes) - 1) * self.seats:
+            table_id = self._table_to_break()
+            if table_id in self.moving:
+                break
+            del self.sizes[table_id]
+            self.moving[table_id] = []
+            self._send(table_id, ("unseat", table_id, 0, True))
+            result.breaks += 1
+
+        # then move one player at a time from the biggest table to the smallest
+        while len(self.sizes) > 1:
+            source = max((table_id for table_id in self.sizes if table_id not in self.moving),
+                         key=self.sizes.get, default=None)
+            target = min(self.sizes, key=self.sizes.get)
+            if source is None or self.sizes[source] - self.sizes[target] <= 1:
+                break
+            self.sizes[source] -= 1
+            self.sizes[target] += 1
+            self.moving[source] = [target]
+            self._send(source, ("unseat", source, 1, False))
+
+    def _unseated(self, table_id, players, result: TournamentResult):
+        targets = self.moving.pop(table_id)
+        # a player who busted before the move: the seat saved for them is free again
+        for target in targets[len(players):]:
+            if table_id in self.sizes:
+                self.sizes[table_id] += 1
+            if target in self.sizes:
+                self.sizes[target] -= 1
+        for i, (name, stack) in enumerate(players):
+            self._seat(name, stack, targets[i] if i < len(targets) else None)
+        result.moves += min(len(players), len(targets))
+
+    def _busted(self, table_id, busted, result: TournamentResult):
+        # busting in the same hand, whoever started it with more chips finishes higher
+        for name, _ in sorted(busted, key=lambda bust: bust[1]):
+            result.places[name] = self.remaining
+            self.remaining -= 1
+        if table_id in self.sizes:
+            self.sizes[table_id] -= len(busted)
+
+    def run(self) -> TournamentResult:
+        tables = math.ceil(len(self.players) / self.seats)
+        result = TournamentResult(len(self.players), tables, min(self.workers, tables))
+        self.workers = result.workers
+
+        context = multiprocessing.get_context()
+        self.inboxes = [context.Queue() for _ in range(self.workers)]
+        outbox = context.Queue()
+        processes = [context.Process(target=_worker, args=(i, self.inboxes[i], outbox, self.seed), daemon=True)
+                     for i in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        start = time.monotonic()
+        level = 0
+        level_ends = start + self.schedule[0][1]
+        for inbox in self.inboxes:
+            inbox.put(("blinds", self.schedule[0][0]))
+
+        # random seats, dealt round the tables so they differ by one player at most
+        seating = list(self.players)
+        random.Random(self.seed).shuffle(seating)
+        self.sizes = {table_id: 0 for table_id in range(tables)}
+        for i, name in enumerate(seating):
+            self.sizes[i % tables] += 1
+            self._send(i % tables, ("seat", i % tables, name, self.stack))
+
+        try:
+            while self.remaining > 1:
+                now = time.monotonic()
+                if now >= level_ends and level + 1 < len(self.schedule):
+                    level += 1
+                    level_ends = now + self.schedule[level][1]
+                    for inbox in self.inboxes:
+                        inbox.put(("blinds", self.schedule[level][0]))
+
+                try:
+                    message = outbox.get(timeout=0.1)
+                except queue.Empty:
+                    if not all(process.is_alive() for process in processes):
+                        raise RuntimeError("A tournament worker exited")
+                    continue
+
+                if message[0] == "busted":
+                    self._busted(message[1], message[2], result)
+                elif message[0] == "unseated":
+                    self._unseated(message[1], message[2], result)
+                self._balance(result)
+
+            for inbox in self.inboxes:
+                inbox.put(("stop",))
+            done = 0
+            while done < self.workers:
+                message = outbox.get()
+                if message[0] == "unseated":
+                    # a move still on its way when the last bust came in
+                    seated = [(message[1], name, stack) for name, stack in message[2]]
+                elif message[0] == "done":
+                    done += 1
+                    result.hands += message[2]
+                    seated = message[3]
+                else:
+                    continue
+                for _, name, stack in seated:
+                    result.winner = name
+                    result.chips += stack
+                    result.places[name] = 1
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        result.seconds = time.monotonic() - start
+        result.level = level
+        return result
+
+
+if __name__ == "__main__":
+    # python -m src.tournament [players] [workers] [level seconds] [seed]
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    tournament = Tournament([f"Player {i + 1}" for i in range(players)], schedule=blind_levels(seconds=seconds),
+                            workers=workers, seed=seed)
+    print(tournament.run())
@@ -0,0 +1,244 @@
+from treys import Card, Deck
+
+from .player import Action, ActionType, Player
+from .poker import GameStage
+from .preflop import preflop_table
+
+# Compact binary encoding of the table state, negotiated with
+# `Accept: application/x-poker`. Layout (integers are unsigned LEB128 varints,
+# strings are a varint length + utf-8, cards are one byte each):
+#
+# state:   u8 version, u8 stage, varint pot, cards board, str table_id,
+#          varint players, player*, turn, u8 flags, [winner], [equity]
+# cards:   u8 count, u8 card*
+# player:  str name, varint stack, cards hand, u8 has_action, [action]
+# action:  u8 type | all_in << 3 | has_amount << 4 | has_to_call << 5,
+#          [varint amount], [varint amount_to_call]
+# turn:    str name, varint stack, cards hand, varint actions, action*, u16 preflop equity
+# winner:  varint players, player*, cards hand, str rank
+# equity:  varint players, (str name, u16 win, u16 tie, u16 equity)*, varint trials, u16 margin
+#
+# Fractions are scaled to 0-65534, 65535 means "not present".
+MIME = "application/x-poker"
+VERSION = 1
+
+HAS_WINNER = 1
+HAS_EQUITY = 2
+
+NO_FRACTION = 0xFFFF
+FRACTION_SCALE = 0xFFFE
+
+# card codec tables: byte = rank * 4 + suit, in treys full deck order
+BYTE_TO_CARD = Deck.GetFullDeck()
+CARD_TO_BYTE = {card: i for i, card in enumerate(BYTE_TO_CARD)}
+BYTE_TO_STR = [Card.int_to_str(card) for card in BYTE_TO_CARD]
+
+ACTION_TYPES = list(ActionType)
+
+
+def write_varint(out: bytearray, value: int):
+    if value < 0:
+        raise ValueError("Varints must be non-negative")
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_str(out: bytearray, value: str):
+    data = value.encode()
+    write_varint(out, len(data))
+    out += data
+
+
+def write_cards(out: bytearray, cards):
+    cards = cards or []
+    out.append(len(cards))
+    out += bytes(CARD_TO_BYTE[card] for card in cards)
+
+
+def write_fraction(out: bytearray, value):
+    value = NO_FRACTION if value is None else round(value * FRACTION_SCALE)
+    out += value.to_bytes(2, "little")
+
+
+def write_action(out: bytearray, action: Action):
+    has_amount = action.amount is not None
+    has_to_call = action.amount_to_call is not None
+    out.append(action.action_type.value | action.all_in << 3 | has_amount << 4 | has_to_call << 5)
+    if has_amount:
+        write_varint(out, action.amount)
+    if has_to_call:
+        write_varint(out, action.amount_to_call)
+
+
+def write_player(out: bytearray, player: Player):
+    write_str(out, player.name)
+    write_varint(out, player.stack)
+    write_cards(out, player.hand())
+    action = player.last_action()
+    out.append(action is not None)
+    if action is not None:
+        write_action(out, action)
+
+
+def encode_round(round, table_id="", winner=None, equity=None) -> bytes:
+    # winner: (players, cards, rank) as returned by Round.reveal, equity: an Equity
+    out = bytearray([VERSION, round.stage.value])
+    write_varint(out, round.pot.amount)
+    write_cards(out, round.board)
+    write_str(out, table_id or "")
+
+    write_varint(out, len(round.players))
+    for player in round.players:
+        write_player(out, player)
+
+    player, actions = round.get_current_player_and_actions()
+    write_str(out, player.name)
+    write_varint(out, player.stack)
+    write_cards(out, player.hand())
+    write_varint(out, len(actions))
+    for action in actions:
+        write_action(out, action)
+    table = preflop_table()
+    if table is not None and 1 < len(round.players) <= table.max_opponents + 1:
+        write_fraction(out, table.equity(player.hand(), len(round.players) - 1))
+    else:
+        write_fraction(out, None)
+
+    out.append((HAS_WINNER if winner else 0) | (HAS_EQUITY if equity else 0))
+    if winner:
+        players, cards, rank = winner
+        write_varint(out, len(players))
+        for player in players:
+            write_player(out, player)
+        write_cards(out, cards)
+        write_str(out, rank or "")
+    if equity:
+        write_varint(out, len(round.players))
+        for i, player in enumerate(round.players):
+            write_str(out, player.name)
+            write_fraction(out, equity.wins[i])
+            write_fraction(out, equity.ties[i])
+            write_fraction(out, equity.equity[i])
+        write_varint(out, equity.trials)
+        write_fraction(out, min(equity.margin, 1.0))
+
+    return bytes(out)
+
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def u8(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self.u8()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def str(self):
+        length = self.varint()
+        value = self.data[self.pos:self.pos + length].decode()
+        self.pos += length
+        return value
+
+    def cards(self):
+        count = self.u8()
+        cards = [BYTE_TO_CARD[byte] for byte in self.data[self.pos:self.pos + count]]
+        self.pos += count
+        return cards
+
+    def card_strs(self):
+        count = self.u8()
+        cards = [BYTE_TO_STR[byte] for byte in self.data[self.pos:self.pos + count]]
+        self.pos += count
+        return cards
+
+    def fraction(self):
+        value = int.from_bytes(self.data[self.pos:self.pos + 2], "little")
+        self.pos += 2
+        return None if value == NO_FRACTION else value / FRACTION_SCALE
+
+    def action(self) -> Action:
+        flags = self.u8()
+        amount = self.varint() if flags & 0x10 else None
+        amount_to_call = self.varint() if flags & 0x20 else None
+        return Action(ACTION_TYPES[flags & 0x7], amount, amount_to_call, all_in=bool(flags & 0x08))
+
+
+def encode_action(action: Action) -> bytes:
+    out = bytearray()
+    write_action(out, action)
+    return bytes(out)
+
+
+def decode_action(data: bytes) -> Action:
+    # binary counterpart of Action.dict_to_action
+    return Reader(data).action()
+
+
+def encode_turn_request(table_id: str, player_name: str, action: Action) -> bytes:
+    out = bytearray()
+    write_str(out, table_id or "")
+    write_str(out, player_name or "")
+    write_action(out, action)
+    return bytes(out)
+
+
+def decode_turn_request(data: bytes):
+    # /next_turn body: str table_id, str player_name, action
+    reader = Reader(data)
+    return reader.str(), reader.str(), reader.action()
+
+
+def _read_player(reader: Reader):
+    player = {"name": reader.str(), "stack": reader.varint()}
+    player["hand"] = reader.card_strs()
+    player["action"] = reader.action().to_dict() if reader.u8() else None
+    return player
+
+
+def decode_state(data: bytes) -> dict:
+    # the JSON shape of Round.to_dict (plus winner/equity), mainly for tests and tools
+    reader = Reader(data)
+    if reader.u8() != VERSION:
+        raise ValueError("Unsupported wire version")
+
+    state = {"stage": GameStage(reader.u8()).name, "pot": {"amount": reader.varint()}}
+    state["community_cards"] = reader.card_strs()
+    table_id = reader.str()
+    if table_id:
+        state["table_id"] = table_id
+    state["players"] = [_read_player(reader) for _ in range(reader.varint())]
+
+    turn = {"player": {"name": reader.str(), "stack": reader.varint()}}
+    turn["player"]["hand"] = reader.card_strs()
+    turn["actions"] = [reader.action().to_dict() for _ in range(reader.varint())]
+    preflop_equity = reader.fraction()
+    if preflop_equity is not None:
+        turn["preflopEquity"] = preflop_equity
+    state["turn"] = turn
+
+    flags = reader.u8()
+    if flags & HAS_WINNER:
+        players = [_read_player(reader) for _ in range(reader.varint())]
+        cards = reader.card_strs()
+        state["winner"] = {"players": players, "hand": cards, "rank": reader.str() or None}
+    if flags & HAS_EQUITY:
+        players = []
+        for _ in range(reader.varint()):
+            players.append({"name": reader.str(), "win": reader.fraction(), "tie": reader.fraction(), "equity": reader.fraction()})
+        state["equity"] = {"players": players, "trials": reader.varint(), "margin": reader.fraction()}
+
+    return state
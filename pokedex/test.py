@@ -1,6 +1,37 @@
 
-from src.poker import Poker, GameStage
+import contextlib
+import copy
+import io
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from itertools import combinations
+
+import numpy as np
+from treys import Card, Deck
+
+import loadtest
+from src import metrics, preflop, runner, wire
+from src.batch import BatchEngine, random_strategy, passive_strategy
+from src.deck import Deck as FastDeck, draw_many
+from src.equity import EquityCalculator, enumerate_equity
+from src.feed import TableFeed
+from src.hand import HandEvaluator, hand_cache
+from src.histogram import LatencyHistogram
+from src.history import HandHistoryWriter, HandHistory
+from src.journal import replay_hand
 from src.player import Player, Action
+from src.poker import Poker, GameStage
+from src.pot import Pot
+from src.ranges import parse_range
+from src.service import TableService
+from src.simulate import six_max, RandomStrategy
+from src.store import TableStore
+from src.tables import TableRegistry, TableExists
+from src.tournament import Tournament, blind_levels
 
 def test1():
     players = [
@@ -115,4 +146,877 @@ def test4():
 
     # print(round)
     print(round.str_actions())
+
+def test5():
+    # lookup evaluator must agree with the 21 combination loop, best 5 cards included
+    evaluator = HandEvaluator()
+    rng = random.Random(5)
+    full_deck = Deck.GetFullDeck()
+
+    for _ in range(20000):
+        cards = rng.sample(full_deck, rng.choice([5, 6, 7]))
+        hand, board = cards[:2], cards[2:]
+        assert evaluator.best_hand_rank_eval(hand, board) == evaluator.best_hand_rank_eval_combinations(hand, board)
+
+    print("evaluator ok")
+
+def test6():
+    # batch scores, rank classes and best 5 indices match the single hand path
+    evaluator = HandEvaluator()
+    rng = random.Random(6)
+    full_deck = Deck.GetFullDeck()
+
+    hands = [rng.sample(full_deck, 7) for _ in range(20000)]
+    scores, rank_classes, best_indices = evaluator.best_hand_rank_eval_batch(hands)
+    for i, cards in enumerate(hands):
+        best_hand, rank, score = evaluator.best_hand_rank_eval(cards[:2], cards[2:])
+        assert score == scores[i]
+        assert rank == evaluator.evaluator.class_to_string(int(rank_classes[i]))
+        assert best_hand == [cards[j] for j in best_indices[i]]
+
+    print("batch evaluator ok")
+
+def test7():
+    # AA vs KK preflop is about 82/18, and a fixed seed gives repeatable numbers
+    aces = [Card.new("As"), Card.new("Ah")]
+    kings = [Card.new("Kd"), Card.new("Kc")]
+    deck = [card for card in Deck.GetFullDeck() if card not in aces + kings]
+
+    calculator = EquityCalculator(trials=50_000, time_budget=10, margin=0, workers=1, seed=7)
+    equity = calculator.equity([aces, kings], [], deck)
+    assert abs(equity.equity[0] - 0.82) < 0.01
+    assert equity.equity == calculator.equity([aces, kings], [], deck).equity
+
+    print(equity)
+
+def test8():
+    # enumeration matches scoring every runout with best_hand_rank_eval
+    evaluator = HandEvaluator()
+    rng = random.Random(8)
+    full_deck = Deck.GetFullDeck()
+
+    for board_size in (3, 4, 5):
+        cards = rng.sample(full_deck, 6 + board_size)
+        hands = [cards[0:2], cards[2:4], cards[4:6]]
+        board = cards[6:]
+        deck = [card for card in full_deck if card not in cards]
+
+        shares = [0.0, 0.0, 0.0]
+        runouts = list(combinations(deck, 5 - board_size))
+        for runout in runouts:
+            scores = [evaluator.best_hand_rank_eval(hand, board + list(runout))[2] for hand in hands]
+            winners = [i for i, score in enumerate(scores) if score == min(scores)]
+            for i in winners:
+                shares[i] += 1 / len(winners)
+
+        equity = enumerate_equity(hands, board, deck)
+        assert equity.trials == len(runouts)
+        for i in range(3):
+            assert abs(equity.equity[i] - shares[i] / len(runouts)) < 1e-9
+
+    print("enumeration ok")
+
+def test9():
+    # showdown hands are evaluated once per board, not once per call
+    players = [
+        Player("Harry Potter", 50),
+        Player("Cho Chang", 1000),
+        Player("Luna Lovegood", 75),
+    ]
+
+    poker = Poker(players=players, small_blind=10)
+
+    round = poker.new_round()
+    round.deal()
+    round.set_stage(GameStage.RIVER)
+
+    round.player_action(Action.bet(50))
+    round.player_action(Action.raise_bet(1000))
+    round.player_action(Action.call())
+
+    hand_cache.clear()
+    round.reveal()
+    misses = hand_cache.misses
+    round.distribute_winnings()
+    assert hand_cache.misses == misses and hand_cache.hits == 0
+    assert set(round.showdown_cache) == set(round.players)
+
+    print("showdown cache ok")
+
+def test10():
+    # headless self-play: full hands, no output, no chips created or lost
+    simulator = six_max()
+    result = simulator.run(500)
+
+    assert result.hands == 500
+    assert sum(result.chip_deltas.values()) == 0
+    assert sum(result.showdowns_seen.values()) >= 2 * result.showdowns
+
+    print(result)
+
+def test11():
+    # sharded runs are reproducible from the seed, shard by shard
+    report = runner.run(600, seed=11, shards=3, workers=2)
+    assert report.total.hands == 600
+    assert report.total.chip_deltas == runner.run(600, seed=11, shards=3, workers=1).total.chip_deltas
+
+    seed, hands = report.shards[1]
+    assert runner.run_shard(seed, hands).chip_deltas == report.results[1].chip_deltas
+
+    print(report)
+
+def test12():
+    # the binary encoding decodes to the same state as to_dict, and actions round trip
+    players = [
+        Player("Harry Potter", 1000),
+        Player("Cho Chang", 1000),
+        Player("Luna Lovegood", 75),
+    ]
+
+    poker = Poker(players=players, small_blind=10, verbose=False)
+
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+    round.player_action(Action.call())
+
+    state = round.to_dict()
+    decoded = wire.decode_state(wire.encode_round(round))
+    if "preflopEquity" in state["turn"]:
+        assert abs(state["turn"].pop("preflopEquity") - decoded["turn"].pop("preflopEquity")) < 1e-4
+    assert decoded == state
+
+    for action in [Action.fold(), Action.call(20), Action.raise_bet(300), Action(Action.BET, 1000, all_in=True)]:
+        assert wire.decode_action(wire.encode_action(action)).to_dict() == action.to_dict()
+
+    print(len(wire.encode_round(round)), "bytes")
+
+def test13():
+    # folds and checks share one action instance, slotted objects take no new attributes
+    players = [
+        Player("Harry Potter", 1000),
+        Player("Cho Chang", 1000),
+        Player("Luna Lovegood", 75),
+    ]
+
+    poker = Poker(players=players, small_blind=10, verbose=False)
+
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+    round.player_action(Action.fold())
+    round.player_action(Action.call())
+    round.player_action(Action.check())
+
+    assert players[2].last_action() is Action.fold()
+    assert round.round_actions[GameStage.PREFLOP][-1].action is Action.check()
+    assert Action.fold().to_dict() == Action(Action.FOLD).to_dict()
+
+    for obj in [players[0], players[0].rp, round.pot, round.round_actions[GameStage.PREFLOP][0], Action.call(20)]:
+        try:
+            obj.extra = True
+            assert False, f"{type(obj).__name__} has a __dict__"
+        except AttributeError:
+            pass
+
+    print(round.str_actions())
+
+def test14():
+    # every simulated hand comes back from the log with the same actions and payouts
+    path = os.path.join(tempfile.mkdtemp(), "hands.log")
+    simulator = six_max(seed=14)
+    expected = []
+
+    with HandHistoryWriter(path, batch_size=64) as history:
+        simulator.history = history
+        for _ in range(300):
+            round = simulator.play_hand()
+            pots = [pot for pot, _ in round.pot.side_pots if pot]
+            expected.append((round.str_actions(), [seat.name for seat in round.seats], list(round.board), pots))
+
+    with HandHistory(path) as log:
+        records = list(log)
+        assert len(records) == log.count() == 300
+        for record, (actions, names, board, pots) in zip(records, expected):
+            assert str(record) == actions
+            assert [seat["name"] for seat in record.seats] == names
+            assert record.board == board
+            assert all(seat["stack"] == 1000 for seat in record.seats)
+            assert [amount for amount, _ in record.pots] == pots
+
+    print(records[-1].to_dict()["pots"])
+
+def test15():
+    # a journaled table comes back from its last snapshot plus the log tail,
+    # and logged hands deal and play out again from their deck seed
+    directory = tempfile.mkdtemp()
+    registry = TableRegistry(journal_dir=directory)
+    service = TableService(registry)
+    table = registry.create([Player(f"Seat {i + 1}", 1000) for i in range(4)], table_id="t15", verbose=False)
+    table.journal.snapshot_every = 25
+    strategy = RandomStrategy(15)
+
+    service.next_round("t15")
+    for _ in range(200):
+        round = table.poker.round
+        if round.betting_round_over():
+            service.next_round("t15")
+            round = table.poker.round
+        player, actions = round.get_current_player_and_actions()
+        service.next_turn("t15", strategy(round, player, actions))
+
+    # no close: the process "crashed" here
+    recovered = TableRegistry(journal_dir=directory)
+    assert recovered.recover(verbose=False) == ["t15"]
+    poker = recovered.get("t15").poker
+    assert poker.to_snapshot() == table.poker.to_snapshot()
+    assert poker.round.to_dict() == table.poker.round.to_dict()
+    assert table.journal.events < 25
+
+    path = os.path.join(directory, "hands.log")
+    with HandHistoryWriter(path) as history:
+        simulator = six_max(seed=15)
+        simulator.history = history
+        rounds = [simulator.play_hand() for _ in range(100)]
+
+    with HandHistory(path) as log:
+        for record, round in zip(log, rounds):
+            replayed = replay_hand(record)
+            assert replayed.str_actions() == round.str_actions()
+            assert replayed.board == round.board
+            assert [player.hand() for player in replayed.seats] == [seat["hand"] for seat in record.seats]
+
+    print(poker.round)
+
+def test16():
+    # the side pot ledger gives the same pots as rebuilding them with split_pot
+    rng = random.Random(16)
+    for _ in range(2000):
+        players = [Player(f"Player {i}", rng.randint(1, 300)) for i in range(rng.randint(2, 9))]
+        pot = Pot(20)
+        for _ in range(rng.randint(1, 30)):
+            player = rng.choice(players)
+            if player.folded() or player.all_in():
+                continue
+            if rng.random() < 0.15:
+                player.fold()
+                continue
+            amount = rng.randint(0, player.stack)
+            player.make_bet(amount)
+            pot.add(player, amount)
+            if player.stack == 0:
+                player.rp.all_in = True
+                pot.all_in(player)
+                assert pot.side_pots == pot.split_pot()
+        assert pot.final_pots() == pot.split_pot(final=True)
+        assert Pot.from_snapshot(pot.to_snapshot({p: i for i, p in enumerate(players)}), players).pots(True) == pot.pots(True)
+
+    simulator = six_max(stack=120, seed=16)
+    all_ins = 0
+    for _ in range(500):
+        round = simulator.play_hand()
+        all_ins += len(round.all_ins)
+        assert round.pot.final_pots() == round.pot.split_pot(final=True)
+    assert all_ins > 0
+
+    print(all_ins, "all-ins")
+
+def test17():
+    # legal actions are cached per state version, turns skip folded and all-in seats
+    players = [
+        Player("Harry Potter", 1000),
+        Player("Cho Chang", 1000),
+        Player("Luna Lovegood", 75),
+        Player("Ron Weasley", 1000),
+        Player("Hermione Granger", 1000),
+    ]
+
+    poker = Poker(players=players, small_blind=10, verbose=False)
+
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+
+    version = round.version
+    player, actions = round.get_current_player_and_actions()
+    assert round.get_current_player_and_actions()[1] is actions
+    assert player.name == "Luna Lovegood"
+
+    round.player_action(Action.raise_bet(75)) # Luna all in
+    assert round.version > version
+    assert round.get_current_player_and_actions()[1] is not actions
+    round.player_action(Action.fold()) # Ron
+    round.player_action(Action.call()) # Hermione
+    round.player_action(Action.fold()) # Harry
+    round.player_action(Action.call()) # Cho
+
+    assert round.stage == GameStage.FLOP
+    assert [player.name for player in round.players] == ["Cho Chang", "Luna Lovegood", "Hermione Granger"]
+    assert round.get_current_player().name == "Cho Chang"
+    round.player_action(Action.check())
+    assert round.get_current_player().name == "Hermione Granger"
+
+    print(round.str_actions())
+
+def test18():
+    # seeded decks deal the same cards, never repeat a card and cover the whole deck
+    full = set(Deck.GetFullDeck())
+    counts = {card: 0 for card in full}
+    shared = random.Random()
+    for seed in range(2000):
+        deck = FastDeck(seed, shared)
+        dealt = deck.draw(2) + deck.draw(2) + deck.draw(3) + deck.draw(1) + deck.draw(1)
+        assert dealt == FastDeck(seed).draw(9)
+        assert len(set(dealt)) == 9 and set(dealt) | set(deck.cards) == full
+        counts[dealt[0]] += 1
+    # first card roughly uniform: 2000 / 52 is about 38 per card
+    assert max(counts.values()) < 80 and min(counts.values()) > 10
+
+    players = [Player("Harry Potter", 1000), Player("Cho Chang", 1000)]
+    first = Poker(players=players, small_blind=10, verbose=False, seed=18).new_round()
+    again = Poker(players=players, small_blind=10, verbose=False, seed=18).new_round()
+    assert first.deck_seed == again.deck_seed and first.deck.draw(9) == again.deck.draw(9)
+
+    draws = draw_many(np.random.default_rng(18), Deck.GetFullDeck(), 1000, 9)
+    assert draws.shape == (1000, 9)
+    assert all(len(set(row)) == 9 and set(row) <= full for row in draws.tolist())
+
+    print(sorted(counts.values())[:3], sorted(counts.values())[-3:])
+
+def test19():
+    # the batch engine plays the same hands as Round: sampled tables are replayed
+    # through Round turn by turn (cross_check raises on any difference)
+    for seats, stack in [(2, 100), (3, 60), (6, 1000), (6, 120), (9, 300)]:
+        engine = BatchEngine(300, seats=seats, stack=stack, seed=seats * stack, check=30)
+        result = engine.run(10, random_strategy(np.random.default_rng(19)))
+        assert result.hands == 3000
+        assert sum(result.chip_deltas.values()) == 0
+
+        engine = BatchEngine(300, seats=seats, stack=stack, seed=19, check=30)
+        engine.run(2, passive_strategy)
+
+    print(result)
+
+def test20():
+    # range parsing, card removal and range vs range equity
+    assert len(parse_range("QQ+,AKs")) == 22
+    assert len(parse_range("A5s-A2s")) == 16 and len(parse_range("99-66")) == 24
+    assert len(parse_range("KTo+")) == 36 and len(parse_range("AK")) == 16
+    assert len(parse_range("100%")) == 1326
+    assert 280 <= len(parse_range("22%")) <= 310
+    weighted = parse_range("AK,AKs:0.5")
+    assert sorted(weighted.weights) == [0.5] * 4 + [1.0] * 12
+
+    board = [Card.new(card) for card in ["Ah", "7d", "2c"]]
+    assert len(parse_range("AA,AKs").without(board)) == 3 + 3
+
+    calculator = EquityCalculator(workers=1, trials=20_000, time_budget=5)
+    first, second = [Card.new("Ks"), Card.new("Kd")], [Card.new("Qh"), Card.new("Jh")]
+    deck = [card for card in Deck.GetFullDeck() if card not in first + second + board]
+    exact = enumerate_equity([first, second], board, deck)
+    result = calculator.range_equity([parse_range("KsKd"), parse_range("QhJh")], board)
+    assert np.allclose(result.equity, exact.equity)
+
+    ranges = [parse_range("QQ+,AKs"), parse_range("22%")]
+    exact = calculator.range_equity(ranges, board)
+    assert abs(sum(exact.equity) - 1) < 1e-9 and exact.margin == 0
+    sampled = EquityCalculator(workers=1, trials=20_000, time_budget=5, exact_ranges=0).range_equity(ranges, board)
+    assert abs(sampled.equity[0] - exact.equity[0]) < 0.02
+    assert abs(calculator.range_equity([parse_range("22%"), parse_range("22%")], board).equity[0] - 0.5) < 1e-9
+    # preflop single combos sample instead of enumerating 1.7M runouts
+    preflop = calculator.range_equity([parse_range("AhAd"), parse_range("KsKd")])
+    assert preflop.margin > 0 and abs(preflop.equity[0] - 0.82) < 0.02
+
+    try:
+        calculator.range_equity([parse_range("AhAd"), parse_range("KK")], board)
+        assert False
+    except ValueError:
+        pass
+
+    print(exact.to_dict(ranges))
+
+def test21():
+    # tables and hand results are written to SQLite in batches and restored on a warm start
+    path = os.path.join(tempfile.mkdtemp(), "tables.db")
+    store = TableStore(path, batch_size=10_000, interval=60)
+    registry = TableRegistry(store=store)
+    service = TableService(registry)
+    tables = [registry.create([Player(f"Seat {i + 1}", 1000) for i in range(4)], table_id=f"t{n}", verbose=False)
+              for n in range(3)]
+    strategy = RandomStrategy(21)
+    registry.create([Player("Gone", 1000), Player("Soon", 1000)], table_id="gone", verbose=False)
+    registry.remove("gone")
+
+    hands = 0
+    for table in tables:
+        service.next_round(table.table_id)
+        for _ in range(100):
+            round = table.poker.round
+            if round.betting_round_over():
+                hands += 1
+                service.next_round(table.table_id)
+                round = table.poker.round
+            player, actions = round.get_current_player_and_actions()
+            service.next_turn(table.table_id, strategy(round, player, actions))
+        hands += table.poker.round.betting_round_over()
+
+    # nothing is written until the batch is committed
+    lag = store.lag()
+    assert lag["pending"] > 300 and lag["committed"] == 0
+    assert TableStore(path).load(verbose=False) == []
+    store.start()
+    store.close()
+    assert store.lag()["pending"] == 0 and store.batches == 1
+
+    store = TableStore(path)
+    restored = TableRegistry(store=store)
+    assert restored.restore(verbose=False) == ["t0", "t1", "t2"]
+    for table in tables:
+        poker = restored.get(table.table_id).poker
+        assert poker.to_snapshot() == table.poker.to_snapshot()
+        assert poker.round.to_dict() == table.poker.round.to_dict()
+    assert sum(len(store.hand_results(table.table_id)) for table in tables) == hands
+
+    results = store.hand_results("t0")
+    assert [result["hand"] for result in results] == list(range(len(results)))
+
+    # with the writer thread running, tables are serialized when it flushes
+    store.start()
+    service = TableService(restored)
+    table = restored.get("t0")
+    for _ in range(20):
+        round = table.poker.round
+        if round.betting_round_over():
+            service.next_round("t0")
+            round = table.poker.round
+        player, actions = round.get_current_player_and_actions()
+        service.next_turn("t0", strategy(round, player, actions))
+    store.close()
+    [(_, poker)] = [(table_id, poker) for table_id, poker in TableStore(path).load(verbose=False) if table_id == "t0"]
+    assert poker.to_snapshot() == table.poker.to_snapshot()
+
+    # tables only in the store start a journal when journaling is on
+    directory = tempfile.mkdtemp()
+    journaled = TableRegistry(journal_dir=directory, store=TableStore(path))
+    assert journaled.restore(verbose=False) == ["t0", "t1", "t2"]
+    assert all(journaled.get(table_id).journal is not None for table_id in ("t0", "t1", "t2"))
+    assert sorted(TableRegistry(journal_dir=directory).recover(verbose=False)) == ["t0", "t1", "t2"]
+    journaled.store.close()
+
+    print(hands, "hands", lag)
+
+def test22():
+    # latency histograms stay within a bucket of the exact percentiles, and a
+    # short in-process load test drives every endpoint
+    rng = random.Random(22)
+    samples = [rng.lognormvariate(-7, 1.5) for _ in range(20_000)]
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    samples.sort()
+    for p in (50, 99, 99.9):
+        exact = samples[math.ceil(p / 100 * len(samples)) - 1]
+        assert exact <= histogram.percentile(p) <= exact * LatencyHistogram.GROWTH ** 2
+
+    # a server that isn't there is an error for the endpoint, not a dead table thread
+    table = loadtest.VirtualTable(loadtest.HttpClient("http://127.0.0.1:9", timeout=1), "down", lambda rng: 0.0, 22)
+    table.play(time.monotonic() + 0.2)
+    assert table.errors["/start_game"] > 0
+
+    report = loadtest.run(tables=4, seconds=1.0, think="exp:0.001", seed=22)
+    endpoints = report.to_dict()["endpoints"]
+    assert set(endpoints) == {"/start_game", "/next_round", "/next_turn"}
+    assert endpoints["/next_turn"]["count"] > 100 and endpoints["/next_turn"]["errors"] == 0
+    for stats in endpoints.values():
+        assert stats["p50"] <= stats["p99"] <= stats["p999"] <= stats["max"]
+
+    print(report)
+
+def test23():
+    # instrumented methods only record between enable() and disable(), and
+    # per-thread shards add up to every observation
+    from src.hand import HandEvaluator
+    plain = HandEvaluator.best_hand_rank_eval
+    hands, actions = metrics.HANDS.value(), metrics.PLAYER_ACTIONS.count()
+
+    simulator = six_max(seed=23)
+    simulator.run(20)
+    assert metrics.HANDS.value() == hands and HandEvaluator.best_hand_rank_eval is plain
+
+    metrics.REGISTRY.enable()
+    try:
+        assert HandEvaluator.best_hand_rank_eval is not plain
+        rounds = [simulator.play_hand() for _ in range(50)]
+        text = metrics.REGISTRY.render()
+    finally:
+        metrics.REGISTRY.disable()
+    assert HandEvaluator.best_hand_rank_eval is plain
+
+    assert metrics.HANDS.value() == hands + 50
+    played = sum(len(actions) for round in rounds for actions in round.round_actions.values()) - 100
+    assert metrics.PLAYER_ACTIONS.count() == actions + played
+    assert f'poker_player_action_seconds_count {actions + played}' in text
+    assert text.count("# TYPE poker_split_pot_total counter") == 1
+
+    registry = metrics.Registry()
+    histogram = metrics.Histogram("test_seconds", "test", buckets=(0.001, 0.01), registry=registry)
+    def observe(value):
+        for _ in range(1000):
+            histogram.observe(value)
+    threads = [threading.Thread(target=observe, args=(value,)) for value in (0.0005, 0.005, 0.05, 0.005)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{le="0.001"} 1000' in lines
+    assert 'test_seconds_bucket{le="0.01"} 3000' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4000' in lines and "test_seconds_count 4000" in lines
+
+    print(text.splitlines()[-1])
+
+def test24():
+    # a player short of the big blind is all in for what they have, and a
+    # tournament keeps every chip, hands out every place once and keeps its
+    # tables within one player of each other
+    players = [Player("Short", 15), Player("Shorter", 5), Player("Deep", 1000)]
+    for player in players:
+        player.reset()
+    round = Poker(players=players, small_blind=10, verbose=False, seed=24).new_round()
+    round.deal()
+    round.post_blinds()
+    assert players[1].stack == 0 and round.all_in_seats == 0b10
+    # the big blind to call is still 20
+    assert round.get_current_player_and_actions()[0] is players[2]
+    round.player_action(Action.call(20))
+    round.player_action(Action.fold())
+    assert round.betting_round_over() and len(round.board) == 5
+    round.distribute_winnings()
+    assert sum(player.stack for player in players) == 1020
+
+    spreads = []
+    class Checked(Tournament):
+        def _balance(self, result):
+            super()._balance(result)
+            if not self.moving and len(self.sizes) > 1:
+                spreads.append(max(self.sizes.values()) - min(self.sizes.values()))
+
+    names = [f"Player {i + 1}" for i in range(60)]
+    result = Checked(names, stack=300, seats=6, schedule=blind_levels(seconds=0.2), workers=2, seed=24).run()
+    assert result.tables == 10 and result.breaks == 9
+    assert result.chips == 60 * 300 and result.places[result.winner] == 1
+    assert sorted(result.places.values()) == list(range(1, 61))
+    assert spreads and max(spreads) <= 1
+
+    # equally small tables: the one on the worker with the most tables goes first
+    tournament = Tournament(names, workers=2)
+    tournament.sizes = {0: 5, 1: 5, 2: 6, 4: 6}
+    assert tournament._table_to_break() == 0
+
+    print(result)
+
+def test25():
+    # a subscribed client never applies deltas from a recreated table to the
+    # old one's state, and players sharing a name keep their own entries
+    deltas = []
+    service = TableService(TableRegistry(), on_delta=lambda table_id, delta: deltas.append(delta))
+    service.start_game("feed")
+    event, snapshot = service.sync("feed")
+    assert event == "snapshot"
+    epoch, version = snapshot["epoch"], snapshot["version"]
+
+    service.start_game("feed", replace=True)
+    assert deltas[-1]["epoch"] != epoch and deltas[-1]["version"] <= version + 1
+    event, payload = service.sync("feed", version, epoch)
+    assert event == "snapshot" and payload["epoch"] == deltas[-1]["epoch"]
+    event, payload = service.sync("feed", payload["version"], payload["epoch"])
+    assert event == "delta" and payload["ops"] == []
+
+    players = [Player("Twin", 1000), Player("Twin", 500), Player("Other", 800)]
+    poker = Poker(players=players, small_blind=10, verbose=False, seed=25)
+    round = poker.new_round()
+    round.deal()
+    round.post_blinds()
+    feed = TableFeed()
+    feed.publish(round.to_dict(), [round.seat_of[player] for player in round.players], round.take_changed())
+    assert len(feed.state["players"]) == 3
+    assert sorted(player["stack"] for player in feed.state["players"].values()) == [480, 800, 990]
+
+def test26():
+    # the shared hand cache takes concurrent gets and puts while it evicts
+    from src.hand import HandCache
+    cache = HandCache(maxsize=64)
+    errors = []
+    def hammer(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(20_000):
+                key = rng.randrange(256)
+                if cache.get(key) is None:
+                    cache.put(key, key)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=hammer, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and len(cache) == 64
+
+def test27():
+    # tables are only dealt over when asked, endpoints answer 409 without a
+    # round and 404 for unknown tables, and one table's lock never holds up another
+    registry = TableRegistry()
+    table = registry.create([Player("Harry Potter", 1000)], table_id="lobby", verbose=False)
+    assert registry.get("lobby") is table and len(registry) == 1
+    try:
+        registry.create(table_id="lobby")
+        assert False
+    except TableExists:
+        pass
+    assert registry.create(table_id="lobby", replace=True) is not table
+    registry.remove("lobby")
+    assert len(registry) == 0
+
+    # racing creates of one id: a single winner, whose journal stays on disk
+    registry = TableRegistry(journal_dir=tempfile.mkdtemp())
+    start = threading.Barrier(8)
+    created, refused = [], []
+    def create():
+        start.wait()
+        try:
+            created.append(registry.create([Player("Harry Potter", 1000)], table_id="race", verbose=False))
+        except TableExists:
+            refused.append(True)
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and len(refused) == 7 and registry.get("race") is created[0]
+    assert os.path.exists(registry.journal_path("race") + ".snapshot")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+        client = server.app.test_client()
+        created = client.post("/tables", json={"players": [{"name": "Harry Potter"}, {"name": "Cho Chang"}]})
+        table_id = created.get_json()["table_id"]
+        turn = {"table_id": table_id, "player_name": "Harry Potter", "action": {"type": "CHECK", "amount": 0, "amountToCall": 0}}
+        assert client.post("/next_turn", json=turn).status_code == 409
+        assert client.get(f"/equity?table_id={table_id}").status_code == 409
+        assert client.post("/next_turn", json={**turn, "table_id": "missing"}).status_code == 404
+
+        assert client.get("/start_game?table_id=test27").status_code == 200
+        assert client.get("/start_game?table_id=test27").status_code == 409
+        assert client.get("/start_game?table_id=test27&replace=1").status_code == 200
+
+        client.get("/start_game?table_id=test27-other")
+        busy = server.registry.get("test27")
+        done = []
+        def play(table_id):
+            with server.app.test_client() as other:
+                done.append((table_id, other.post("/next_round", json={"table_id": table_id}).status_code))
+        with busy.lock:
+            waiting = threading.Thread(target=play, args=("test27",))
+            free = threading.Thread(target=play, args=("test27-other",))
+            waiting.start()
+            free.start()
+            free.join(timeout=5)
+            assert done == [("test27-other", 200)] and waiting.is_alive()
+        waiting.join(timeout=5)
+        assert done[-1] == ("test27", 200)
+        for table_id in (table_id, "test27", "test27-other"):
+            server.registry.remove(table_id)
+
+def test28():
+    # the ASGI app tells a missing table (404) from a malformed body (400) and
+    # refuses websockets outside socket.io
+    import asyncio
+    import json
+    with contextlib.redirect_stdout(io.StringIO()):
+        import asgi
+
+    async def call(scope, body=b""):
+        messages = [{"type": "websocket.connect"} if scope["type"] == "websocket" else
+                    {"type": "http.request", "body": body}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message)
+        await asgi.http_app({"headers": [], "query_string": b"", **scope}, receive, send)
+        return sent
+
+    def post(path, body):
+        sent = asyncio.run(call({"type": "http", "path": path, "method": "POST"}, json.dumps(body).encode()))
+        return sent[0]["status"], json.loads(sent[1]["body"])
+
+    status, body = post("/next_turn", {"table_id": "missing", "player_name": "Harry Potter",
+                                       "action": {"type": "CHECK", "amount": 0, "amountToCall": 0}})
+    assert status == 404 and body["error"] == "Table missing not found"
+    status, body = post("/next_turn", {"table_id": "missing", "action": {"type": "CHECK"}})
+    assert status == 400 and body["error"] == "Missing player_name"
+    status, body = post("/next_turn", {"table_id": "missing", "player_name": "Harry Potter", "action": {"type": "CHECK"}})
+    assert status == 400 and body["error"] == "Missing action.amount"
+    # any other KeyError is a server error, not a malformed request
+    try:
+        post("/next_turn", {"table_id": "missing", "player_name": "Harry Potter",
+                            "action": {"type": "SHOVE", "amount": 0, "amountToCall": 0}})
+        assert False
+    except KeyError:
+        pass
+
+    sent = asyncio.run(call({"type": "websocket", "path": "/elsewhere"}))
+    assert sent == [{"type": "websocket.close", "code": 1008}]
+
+    # a subscriber is in the table's room before its snapshot is taken, and
+    # leaves it again when the table doesn't exist
+    sync, in_room = asgi.service.sync, []
+    def watched_sync(table_id, *args):
+        in_room.append(asgi.watched(table_id))
+        return sync(table_id, *args)
+    async def subscribe():
+        sid = await asgi.sio.manager.connect("t28", "/")
+        asgi.service.sync = watched_sync
+        try:
+            await asgi.sync(sid, {"table_id": "missing"})
+            await asgi.sync(sid, {"table_id": "t28"})
+        finally:
+            asgi.service.sync = sync
+    with contextlib.redirect_stdout(io.StringIO()):
+        asgi.service.start_game("t28")
+        asyncio.run(subscribe())
+    assert in_room == [True, True] and not asgi.watched("missing") and asgi.watched("t28")
+
+    # deltas reach the room without lifespan events having set the loop up
+    asgi.loop = None
+    async def next_round():
+        sent = await call({"type": "http", "path": "/next_round", "method": "POST"}, b'{"table_id": "t28"}')
+        await asyncio.sleep(0.01)
+        return sent
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert asyncio.run(next_round())[0]["status"] == 200
+
+def test29():
+    # a cold calculator answers within its time budget plus one chunk, even
+    # before its worker processes are up
+    hands = [[Card.new("Ah"), Card.new("Ad")], [Card.new("Ks"), Card.new("Kd")], [Card.new("Qc"), Card.new("Jc")]]
+    deck = [card for card in Deck.GetFullDeck() if card not in hands[0] + hands[1] + hands[2]]
+    calculator = EquityCalculator(workers=2, time_budget=0.05)
+    try:
+        start = time.perf_counter()
+        result = calculator.equity(hands, [], deck)
+        assert time.perf_counter() - start < 0.5 and result.trials > 0
+    finally:
+        calculator.close()
+
+def test30():
+    # the log keeps the stack every player started the hand with, also for
+    # the winners handed an odd chip from a split pot
+    path = os.path.join(tempfile.mkdtemp(), "hands.log")
+    poker = Poker([Player(f"Seat {i + 1}", 1001) for i in range(3)], small_blind=5, verbose=False, seed=30)
+    strategy = RandomStrategy(30)
+    expected = []
+    odd_splits = 0
+
+    with HandHistoryWriter(path) as history:
+        while odd_splits < 3 and len(expected) < 5000:
+            if any(player.stack == 0 for player in poker.players):
+                poker.set_stacks(1001)
+            round = poker.new_round()
+            expected.append([player.stack for player in round.seats])
+            round.deal()
+            round.post_blinds()
+            while not round.betting_round_over():
+                player, actions = round.get_current_player_and_actions()
+                round.player_action(strategy(round, player, actions))
+            paid = round.distribute_winnings()
+            odd_splits += any(pot % len(winners) for pot, winners in paid)
+            history.append(round, paid)
+
+    assert odd_splits == 3
+    with HandHistory(path) as log:
+        assert [[seat["stack"] for seat in record.seats] for record in log] == expected
+
+    print(f"{len(expected)} hands, {odd_splits} odd split pots")
+
+def test31():
+    # deltas built from the seats the engine changed add up to the full state,
+    # and a table nobody watches builds none until someone syncs
+    def apply(state, ops):
+        for op in ops:
+            target = state
+            for key in op[1][:-1]:
+                target = target[key]
+            if op[0] == "set":
+                target[op[1][-1]] = copy.deepcopy(op[2])
+            elif op[0] == "del":
+                del target[op[1][-1]]
+            else:
+                target[op[1][-1]] += op[2]
+
+    watching = set()
+    deltas = []
+    service = TableService(TableRegistry(), on_delta=lambda table_id, delta: deltas.append(delta),
+                           watched=watching.__contains__)
+    strategy = RandomStrategy(31)
+    service.start_game("t31")
+    table = service.find_table("t31")
+    assert deltas == [] and table.feed.version == 0 and table.feed.held is not None
+
+    watching.add("t31")
+    event, snapshot = service.sync("t31")
+    assert event == "snapshot" and snapshot["version"] == 1 and table.feed.held is None
+    state = copy.deepcopy(snapshot["state"])
+
+    for hand in range(40):
+        round = table.poker.round
+        while not round.betting_round_over():
+            player, actions = round.get_current_player_and_actions()
+            game_state, _ = service.next_turn("t31", strategy(round, player, actions))
+            apply(state, deltas[-1]["ops"])
+            assert state["order"] == [str(round.seat_of[player]) for player in round.players]
+            assert [state["players"][seat] for seat in state["order"]] == game_state["players"]
+            assert {key: value for key, value in state.items() if key not in ("players", "order")} == \
+                   {key: value for key, value in game_state.items() if key != "players"}
+        if any(player.stack == 0 for player in table.poker.players):
+            table.poker.set_stacks(1000)
+
+        # nobody watching for a hand: held, then caught up in one delta
+        if hand % 10 == 9:
+            watching.discard("t31")
+            version = table.feed.version
+            game_state, _ = service.next_round("t31")
+            round = table.poker.round
+            player, actions = round.get_current_player_and_actions()
+            game_state, _ = service.next_turn("t31", strategy(round, player, actions))
+            assert table.feed.version == version and deltas[-1]["version"] == version
+            watching.add("t31")
+            event, payload = service.sync("t31", version, table.feed.epoch)
+            assert event == "delta" and payload["version"] == version + 1
+            apply(state, payload["ops"])
+            assert state == table.feed.state
+            assert [state["players"][seat] for seat in state["order"]] == game_state["players"]
+        else:
+            game_state, _ = service.next_round("t31")
+            apply(state, deltas[-1]["ops"])
+            assert [state["players"][seat] for seat in state["order"]] == game_state["players"]
+        assert state == table.feed.state
+
+    print(table.feed.version, "versions,", sum(len(delta["ops"]) for delta in deltas), "ops")
+
+def test32():
+    # threads racing for the preflop table on first use all get the table
+    preflop._table, preflop._looked = None, False
+    start = threading.Barrier(8)
+    tables = []
+    def lookup():
+        start.wait()
+        tables.append(preflop.preflop_table())
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(tables) == 8 and tables[0] is not None and all(table is tables[0] for table in tables)
 test4()
\ No newline at end of file